@@ -0,0 +1,307 @@
+import audioop
+import itertools
+import json
+import logging
+import os
+import shlex
+import struct
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import discord
+from discord.opus import Encoder as OpusEncoder
+
+
+_WORKER_PATH = os.path.abspath(__file__)
+
+# Header: write index, read index, state. Slots: 2-byte length + Opus packet.
+_HEADER = struct.Struct("<QQI")
+_LENGTH = struct.Struct("<H")
+RING_SLOTS = 150
+SLOT_SIZE = _LENGTH.size + OpusEncoder.FRAME_SIZE
+
+STATE_RUNNING = 0
+STATE_EOF = 1
+STATE_ERROR = 2
+STATE_STOPPED = 3
+
+# How long the player thread waits on an empty ring before treating it as a stall.
+READ_STALL_TIMEOUT = 5.0
+
+
+# Single-producer, single-consumer ring of Opus packets in shared memory.
+class FrameRing:
+    def __init__(self, name=None, slots=RING_SLOTS):
+        self.slots = slots
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=_HEADER.size + slots * SLOT_SIZE)
+            _HEADER.pack_into(self.shm.buf, 0, 0, 0, STATE_RUNNING)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Only the creating process may unlink the segment.
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+            self.owner = False
+        self.name = self.shm.name
+
+    def _header(self):
+        return _HEADER.unpack_from(self.shm.buf, 0)
+
+    def _slot_offset(self, index):
+        return _HEADER.size + (index % self.slots) * SLOT_SIZE
+
+    @property
+    def state(self):
+        return self._header()[2]
+
+    def set_state(self, state):
+        struct.pack_into("<I", self.shm.buf, 16, state)
+
+    def __len__(self):
+        write_index, read_index, _ = self._header()
+        return write_index - read_index
+
+    def put(self, packet):
+        write_index, read_index, _ = self._header()
+        if write_index - read_index >= self.slots:
+            return False
+        offset = self._slot_offset(write_index)
+        _LENGTH.pack_into(self.shm.buf, offset, len(packet))
+        self.shm.buf[offset + _LENGTH.size:offset + _LENGTH.size + len(packet)] = packet
+        struct.pack_into("<Q", self.shm.buf, 0, write_index + 1)
+        return True
+
+    def get(self):
+        write_index, read_index, _ = self._header()
+        if read_index >= write_index:
+            return None
+        offset = self._slot_offset(read_index)
+        (length,) = _LENGTH.unpack_from(self.shm.buf, offset)
+        packet = bytes(self.shm.buf[offset + _LENGTH.size:offset + _LENGTH.size + length])
+        struct.pack_into("<Q", self.shm.buf, 8, read_index + 1)
+        return packet
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class WorkerAudioSource(discord.AudioSource):
+    def __init__(self, pool, index, worker, stream_id, ring, volume):
+        self._pool = pool
+        self._index = index
+        self._worker = worker
+        self._stream_id = stream_id
+        self._ring = ring
+        self._volume = volume
+        self._closed = False
+
+    @property
+    def volume(self):
+        return self._volume
+
+    @volume.setter
+    def volume(self, value):
+        self._volume = max(value, 0.0)
+        self._pool.send(self._worker, {"op": "volume", "stream": self._stream_id, "volume": self._volume})
+
+    def is_opus(self):
+        return True
+
+    def read(self):
+        deadline = time.monotonic() + READ_STALL_TIMEOUT
+        while True:
+            packet = self._ring.get()
+            if packet is not None:
+                return packet
+            state = self._ring.state
+            if state != STATE_RUNNING:
+                if state == STATE_ERROR:
+                    logging.error("Audio worker stream %s failed.", self._stream_id)
+                return b""
+            if time.monotonic() > deadline or self._worker.poll() is not None:
+                logging.error("Audio worker stream %s stalled.", self._stream_id)
+                return b""
+            time.sleep(0.005)
+
+    def cleanup(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._ring.set_state(STATE_STOPPED)
+        self._pool.send(self._worker, {"op": "stop", "stream": self._stream_id})
+        self._pool.release(self._index, self._worker)
+        self._ring.close()
+
+
+class AudioWorkerPool:
+    def __init__(self, count, ffmpeg_executable):
+        self.count = count
+        self.ffmpeg_executable = ffmpeg_executable
+        self._workers = [None] * count
+        self._active = [0] * count
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _spawn(self, index):
+        worker = subprocess.Popen(
+            [sys.executable, _WORKER_PATH, self.ffmpeg_executable],
+            stdin=subprocess.PIPE,
+        )
+        logging.info("Audio worker %d started (pid %d).", index, worker.pid)
+        self._workers[index] = worker
+        self._active[index] = 0
+        return worker
+
+    def _pick(self):
+        index = min(range(self.count), key=self._active.__getitem__)
+        worker = self._workers[index]
+        if worker is None or worker.poll() is not None:
+            worker = self._spawn(index)
+        return index, worker
+
+    def send(self, worker, command):
+        with self._lock:
+            try:
+                worker.stdin.write(json.dumps(command).encode() + b"\n")
+                worker.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                logging.warning("Audio worker %d is gone; dropped %s command.", worker.pid, command["op"])
+
+    def open_stream(self, url, before_options, options, volume):
+        ring = FrameRing()
+        with self._lock:
+            index, worker = self._pick()
+            self._active[index] += 1
+        stream_id = next(self._ids)
+        self.send(
+            worker,
+            {
+                "op": "play",
+                "stream": stream_id,
+                "url": url,
+                "before_options": before_options,
+                "options": options,
+                "volume": volume,
+                "ring": ring.name,
+            },
+        )
+        return WorkerAudioSource(self, index, worker, stream_id, ring, volume)
+
+    def active_streams(self):
+        return sum(self._active)
+
+    def release(self, index, worker):
+        with self._lock:
+            if self._workers[index] is worker:
+                self._active[index] -= 1
+
+    def close(self):
+        for worker in self._workers:
+            if worker and worker.poll() is None:
+                worker.stdin.close()
+                try:
+                    worker.wait(5)
+                except subprocess.TimeoutExpired:
+                    worker.kill()
+
+
+class _Stream:
+    def __init__(self, command, ffmpeg_executable):
+        self.stream_id = command["stream"]
+        self.volume = command["volume"]
+        self.ring = FrameRing(command["ring"])
+        self.stopped = threading.Event()
+        args = [ffmpeg_executable, *shlex.split(command["before_options"]), "-i", command["url"]]
+        args += ["-f", "s16le", "-ar", "48000", "-ac", "2", "-loglevel", "warning"]
+        args += [*shlex.split(command["options"]), "pipe:1"]
+        try:
+            self.process = subprocess.Popen(
+                args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+        except Exception:
+            self.ring.close()
+            raise
+        self.thread = threading.Thread(target=self._pump, daemon=True)
+        self.thread.start()
+
+    def _pump(self):
+        state = STATE_EOF
+        try:
+            encoder = OpusEncoder()
+            while not self.stopped.is_set():
+                pcm = self.process.stdout.read(OpusEncoder.FRAME_SIZE)
+                if len(pcm) != OpusEncoder.FRAME_SIZE:
+                    if self.process.poll() not in (None, 0):
+                        state = STATE_ERROR
+                    break
+                if self.volume != 1.0:
+                    pcm = audioop.mul(pcm, 2, min(self.volume, 2.0))
+                packet = encoder.encode(pcm, OpusEncoder.SAMPLES_PER_FRAME)
+                while not self.ring.put(packet):
+                    if self.stopped.is_set() or self.ring.state == STATE_STOPPED:
+                        return
+                    time.sleep(0.01)
+        except Exception as e:
+            logging.error("Audio worker stream %s error: %s", self.stream_id, e)
+            state = STATE_ERROR
+        finally:
+            if self.ring.state == STATE_RUNNING:
+                self.ring.set_state(state)
+            self._kill()
+            # Closed here rather than in stop(), once nothing can touch the segment any more.
+            self.ring.close()
+
+    def _kill(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+
+    # Does not wait for the pump thread: killing FFmpeg ends its read and it exits by
+    # itself, while the command loop moves straight on to the next command.
+    def stop(self):
+        self.stopped.set()
+        self._kill()
+
+
+def worker_main(ffmpeg_executable):
+    streams = {}
+    for line in sys.stdin.buffer:
+        # One bad command must not take down every other stream this worker carries.
+        try:
+            command = json.loads(line)
+            op = command["op"]
+            if op == "play":
+                try:
+                    streams[command["stream"]] = _Stream(command, ffmpeg_executable)
+                except Exception as e:
+                    logging.error("Audio worker could not start stream %s: %s", command["stream"], e)
+                    try:
+                        ring = FrameRing(command["ring"])
+                    except OSError:
+                        # The consumer already gave up on the stream and unlinked its ring.
+                        continue
+                    ring.set_state(STATE_ERROR)
+                    ring.close()
+            elif op == "volume":
+                stream = streams.get(command["stream"])
+                if stream:
+                    stream.volume = command["volume"]
+            elif op == "stop":
+                stream = streams.pop(command["stream"], None)
+                if stream:
+                    stream.stop()
+        except Exception as e:
+            logging.error("Audio worker could not handle command %r: %s", line[:200], e)
+
+    for stream in streams.values():
+        stream.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    worker_main(sys.argv[1])
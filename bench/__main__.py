@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import main as core
+from cogs import extraction
+from bench.fakes import (
+    FakeExtractor,
+    FakeGuild,
+    FakeInteraction,
+    FakeTextChannel,
+    FakeVoiceChannel,
+    build_audio_library,
+    load_latency_profile,
+)
+from bench.report import add_json_argument, percentiles, write_report
+from rate_limit import AdmissionControl
+
+
+class Recorder:
+    def __init__(self):
+        self.play_requested = {}
+        self.tracks_finished = defaultdict(int)
+        self.ttfa = []
+        self.transition_gaps = []
+        self.deadline_misses = 0
+        self.command_latency = defaultdict(list)
+        self._last_end = {}
+
+    def first_frame(self, guild_id):
+        now = time.perf_counter()
+        requested = self.play_requested.pop(guild_id, None)
+        if requested is not None:
+            self.ttfa.append(now - requested)
+        elif guild_id in self._last_end:
+            self.transition_gaps.append(now - self._last_end.pop(guild_id))
+
+    def track_end(self, guild_id):
+        self._last_end[guild_id] = time.perf_counter()
+        self.tracks_finished[guild_id] += 1
+
+    def deadline_miss(self, guild_id):
+        self.deadline_misses += 1
+
+    async def timed(self, name, coro):
+        started = time.perf_counter()
+        await coro
+        self.command_latency[name].append(time.perf_counter() - started)
+
+
+async def run_guild(guild_id, args, recorder, rng):
+    music = core.bot.get_cog("Music")
+    guild = FakeGuild(guild_id)
+    voice_channel = FakeVoiceChannel(guild, recorder)
+    text_channel = FakeTextChannel(guild)
+    gid = str(guild_id)
+    # Keep the inactivity timer out of the measurements.
+    core.is_24_7[gid] = True
+
+    def interaction():
+        return FakeInteraction(guild, voice_channel, text_channel)
+
+    recorder.play_requested[guild_id] = time.perf_counter()
+    for i in range(args.tracks):
+        await recorder.timed("play", music.play.callback(music, interaction(), f"bench song {guild_id} {i}"))
+
+    while recorder.tracks_finished[guild_id] < args.tracks:
+        await asyncio.sleep(args.command_interval * rng.uniform(0.5, 1.5))
+        command = rng.choice(("queue", "nowplaying", "volume"))
+        if command == "volume":
+            await recorder.timed(command, music.volume.callback(music, interaction(), rng.randint(50, 150)))
+        elif command == "queue":
+            await recorder.timed(command, music.view_queue.callback(music, interaction()))
+        else:
+            await recorder.timed(command, music.nowplaying.callback(music, interaction()))
+
+    if guild.voice_client:
+        await guild.voice_client.disconnect()
+
+
+async def run(args):
+    core.FFMPEG_EXECUTABLE = args.ffmpeg or core.resolve_ffmpeg_executable()
+    if not core.FFMPEG_EXECUTABLE:
+        sys.exit("FFmpeg is required to decode the local stand-in audio files.")
+    core.bot.loop = asyncio.get_running_loop()
+    await core.bot.load_extension(core.EXTENSION)
+
+    audio_files = build_audio_library(args.audio_dir, max(args.tracks, 4), args.track_seconds)
+    extractor = FakeExtractor(
+        audio_files, load_latency_profile(args.latency_profile), seed=args.seed, scale=args.latency_scale
+    )
+    extraction._extract = extractor
+    # Measure the playback path itself, not the production /play rate limits.
+    core.play_admission = AdmissionControl()
+
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    cpu_started = time.process_time()
+    children_started = os.times()
+    wall_started = time.perf_counter()
+
+    await asyncio.gather(*(run_guild(1000 + i, args, recorder, rng) for i in range(args.guilds)))
+
+    wall = time.perf_counter() - wall_started
+    children = os.times()
+    cpu = (time.process_time() - cpu_started) + (
+        children.children_user - children_started.children_user
+        + children.children_system - children_started.children_system
+    )
+
+    return {
+        "schema": 1,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "params": {
+            "guilds": args.guilds,
+            "tracks": args.tracks,
+            "track_seconds": args.track_seconds,
+            "latency_scale": args.latency_scale,
+            "seed": args.seed,
+        },
+        "metrics": {
+            "time_to_first_audio_ms": percentiles(recorder.ttfa),
+            "transition_gap_ms": percentiles(recorder.transition_gaps),
+            "cpu_per_stream_pct": round(cpu / wall / args.guilds * 100, 2),
+            "frame_deadline_misses": recorder.deadline_misses,
+            "extractions": extractor.calls,
+            "command_latency_ms": {
+                name: percentiles(samples) for name, samples in sorted(recorder.command_latency.items())
+            },
+        },
+    }
+
+
+def print_report(report):
+    metrics = report["metrics"]
+    print(f"guilds={report['params']['guilds']} tracks/guild={report['params']['tracks']}")
+    for label, key in (("time to first audio", "time_to_first_audio_ms"), ("transition gap", "transition_gap_ms")):
+        stats = metrics[key]
+        if stats:
+            print(f"{label:>22}: p50 {stats['p50']} ms  p90 {stats['p90']} ms  max {stats['max']} ms")
+    print(f"{'cpu per stream':>22}: {metrics['cpu_per_stream_pct']}% of one core")
+    print(f"{'frame deadline misses':>22}: {metrics['frame_deadline_misses']}")
+    for name, stats in metrics["command_latency_ms"].items():
+        print(f"{'/' + name:>22}: p50 {stats['p50']} ms  p99 {stats['p99']} ms  (n={stats['count']})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Offline playback benchmark.")
+    parser.add_argument("--guilds", type=int, default=4)
+    parser.add_argument("--tracks", type=int, default=3, help="tracks queued per guild")
+    parser.add_argument("--track-seconds", type=int, default=3)
+    parser.add_argument("--command-interval", type=float, default=0.5)
+    parser.add_argument("--latency-profile", help="JSON file with 'search' and 'resolve' latency samples")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ffmpeg", help="FFmpeg executable (defaults to the bot's own lookup)")
+    parser.add_argument("--audio-dir", default=os.path.join(tempfile.gettempdir(), "eva_bench_audio"))
+    add_json_argument(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(run(args))
+    if args.json != "-":
+        print_report(report)
+    write_report(report, args.json)
@@ -0,0 +1,79 @@
+import argparse
+import random
+import sys
+import time
+
+from bench.report import add_json_argument, current_rss, write_report
+from rate_limit import AdmissionControl, parse_rate
+
+
+def measure(guilds, args, rng):
+    admission = AdmissionControl(
+        user=parse_rate(args.user_rate, "--user-rate"),
+        guild=parse_rate(args.guild_rate, "--guild-rate"),
+        overall=parse_rate(args.global_rate, "--global-rate"),
+        max_keys=args.max_keys,
+    )
+    population = [
+        (guild * args.users_per_guild + user, guild) for guild in range(guilds) for user in range(args.users_per_guild)
+    ]
+    requests = [rng.choice(population) for _ in range(args.calls)]
+
+    # Requests are spread over a simulated clock at --rate plays per guild per minute, so
+    # bucket refills and idle eviction behave as they would in production.
+    step = 60 / (args.rate * guilds)
+    now = 0.0
+    for user_id, guild_id in population[: args.max_keys]:
+        now += step
+        admission.admit(user_id, guild_id, now=now)
+
+    admit = admission.admit
+    rejected = admission.rejected
+    clock = [now + step * (i + 1) for i in range(args.calls)]
+    started = time.perf_counter_ns()
+    for (user_id, guild_id), at in zip(requests, clock):
+        admit(user_id, guild_id, now=at)
+    elapsed = time.perf_counter_ns() - started
+
+    return {
+        "guilds": guilds,
+        "ns_per_admit": round(elapsed / args.calls, 1),
+        "rejected_rate": round((admission.rejected - rejected) / args.calls, 3),
+        "tracked_keys": admission.tracked_keys(),
+        "rss_mb": round((current_rss() or 0) / 1048576, 1),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bench.admission", description="Admission cost of the /play token buckets vs guild count."
+    )
+    parser.add_argument(
+        "--guilds", type=lambda s: [int(n) for n in s.split(",")], default=[10, 100, 1000, 10000, 100000]
+    )
+    parser.add_argument("--users-per-guild", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--user-rate", default="3/10")
+    parser.add_argument("--guild-rate", default="10/30")
+    parser.add_argument("--global-rate", default="0", help="disabled by default: it would reject most requests")
+    parser.add_argument("--rate", type=float, default=1.0, help="plays per guild per minute")
+    parser.add_argument("--max-keys", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    add_json_argument(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    rng = random.Random(args.seed)
+    steps = []
+    for guilds in args.guilds:
+        step = measure(guilds, args, rng)
+        steps.append(step)
+        print(
+            f"guilds={guilds:>7}  {step['ns_per_admit']:>7} ns/admit  rejected {step['rejected_rate']:.1%}  "
+            f"keys {step['tracked_keys']:>6}  rss {step['rss_mb']} MB",
+            file=sys.stderr,
+        )
+    report = {"schema": 1, "timestamp": time.time(), "params": vars(args), "steps": steps}
+    write_report(report, args.json)
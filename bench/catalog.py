@@ -0,0 +1,109 @@
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+from bench.report import add_json_argument, percentiles, write_report
+from catalog import TrackCatalog, catalog_row
+
+
+# Word i is drawn with weight 1 / (i + 1) ** skew, as in real titles where a few words
+# ("official", "video", "remix") appear in a large share of them; 0 draws uniformly.
+def zipf_weights(count, skew):
+    return list(itertools.accumulate(1 / (i + 1) ** skew for i in range(count)))
+
+
+def synthetic_entries(rows, rng, vocabulary, weights):
+    for i in range(rows):
+        title = " ".join(rng.choices(vocabulary, cum_weights=weights, k=rng.randint(3, 8)))
+        yield {
+            "id": f"v{i:010d}",
+            "title": title,
+            "uploader": rng.choice(vocabulary).title() + " " + rng.choice(vocabulary).title(),
+            "duration": rng.randint(60, 900),
+            "acodec": "opus",
+        }
+
+
+def build(path, args, rng, vocabulary, weights):
+    catalog = TrackCatalog(path)
+    connection = catalog._connect()
+    started = time.perf_counter()
+    batch = []
+    titles = []
+    for entry in synthetic_entries(args.rows, rng, vocabulary, weights):
+        batch.append(catalog_row(entry))
+        if len(titles) < args.lookups:
+            titles.append(entry["title"])
+        if len(batch) >= 10000:
+            catalog.write(connection, batch)
+            batch = []
+    if batch:
+        catalog.write(connection, batch)
+    connection.close()
+    return catalog, titles, time.perf_counter() - started
+
+
+def measure(catalog, queries):
+    samples = []
+    hits = 0
+    for query in queries:
+        started = time.perf_counter()
+        hits += catalog.lookup(query) is not None
+        samples.append(time.perf_counter() - started)
+    return {"latency_ms": percentiles(samples), "hit_rate": round(hits / len(queries), 3)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bench.catalog", description="Lookup latency of the track catalog at a given size."
+    )
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--vocabulary", type=int, default=50000, help="distinct words used in titles")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of title words (0 for uniform)")
+    parser.add_argument("--path", help="database file (defaults to a temporary file, removed afterwards)")
+    parser.add_argument("--seed", type=int, default=0)
+    add_json_argument(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    rng = random.Random(args.seed)
+    vocabulary = [f"w{i}" for i in range(args.vocabulary)]
+    weights = zipf_weights(args.vocabulary, args.skew)
+    path = args.path or os.path.join(tempfile.mkdtemp(prefix="eva_catalog_"), "catalog.sqlite3")
+    catalog, titles, build_seconds = build(path, args, rng, vocabulary, weights)
+    print(f"built {args.rows} rows in {build_seconds:.1f}s ({os.path.getsize(path) / 1048576:.0f} MB)", file=sys.stderr)
+
+    # Exact titles should hit; random word pairs mostly match nothing or several rows.
+    # skewed_words draws pairs the way titles are drawn, so most of them are common words,
+    # and common_word pairs the two most common, which match a large share of the rows.
+    cases = {
+        "exact_title": titles,
+        "random_words": [" ".join(rng.choices(vocabulary, k=2)) for _ in range(args.lookups)],
+        "skewed_words": [" ".join(rng.choices(vocabulary, cum_weights=weights, k=2)) for _ in range(args.lookups)],
+        "common_word": [f"{vocabulary[0]} {vocabulary[1]}" for _ in range(args.lookups)],
+    }
+    steps = {}
+    for name, queries in cases.items():
+        steps[name] = measure(catalog, queries)
+        stats = steps[name]["latency_ms"]
+        print(
+            f"{name:>13}: p50 {stats['p50']} ms  p99 {stats['p99']} ms  max {stats['max']} ms  "
+            f"hits {steps[name]['hit_rate']:.1%}",
+            file=sys.stderr,
+        )
+    catalog.close()
+    if not args.path:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.rmdir(os.path.dirname(path))
+
+    report = {"schema": 1, "timestamp": time.time(), "params": vars(args), "build_seconds": build_seconds, "steps": steps}
+    write_report(report, args.json)
@@ -0,0 +1,244 @@
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import struct
+import threading
+import time
+import wave
+from types import SimpleNamespace
+
+
+FRAME_LENGTH = 0.02
+SAMPLE_RATE = 48000
+
+# Synthetic extraction latencies (seconds), shaped like typical ytsearch: and watch-URL
+# extraction times but not measured from production. Pass a real capture with
+# --latency-profile.
+DEFAULT_LATENCY_PROFILE = {
+    "search": [1.12, 1.31, 1.45, 1.52, 1.68, 1.74, 1.9, 2.05, 2.21, 2.48, 2.9, 3.6, 4.8],
+    "resolve": [0.71, 0.8, 0.86, 0.92, 1.01, 1.08, 1.15, 1.27, 1.4, 1.66, 2.1, 2.9],
+}
+
+
+def load_latency_profile(path=None):
+    if not path:
+        return DEFAULT_LATENCY_PROFILE
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_tone(path, seconds, frequency):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        frames = bytearray()
+        for i in range(int(seconds * SAMPLE_RATE)):
+            sample = int(8000 * math.sin(2 * math.pi * frequency * i / SAMPLE_RATE))
+            frames += struct.pack("<hh", sample, sample)
+        wav.writeframes(bytes(frames))
+
+
+def build_audio_library(directory, count, seconds):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"track_{i}_{seconds}s.wav")
+        if not os.path.isfile(path):
+            write_tone(path, seconds, 220 + 55 * i)
+        paths.append(path)
+    return paths
+
+
+class FakeExtractor:
+    def __init__(self, audio_files, profile, seed=0, scale=1.0):
+        self.audio_files = audio_files
+        self.profile = profile
+        self.scale = scale
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _sleep(self, kind):
+        with self._lock:
+            self.calls += 1
+            latency = self._rng.choice(self.profile[kind]) * self.scale
+        time.sleep(latency)
+
+    def _entry(self, query):
+        index = sum(map(ord, query)) % len(self.audio_files)
+        path = self.audio_files[index]
+        video_id = f"bench{index:06d}"
+        return {
+            "id": video_id,
+            "url": path,
+            "title": f"Bench track {index}",
+            "webpage_url": f"https://www.youtube.com/watch?v={video_id}",
+            "duration": 0,
+        }
+
+    def __call__(self, query, ydl_opts):
+        if query.startswith("ytsearch:"):
+            self._sleep("search")
+            return {"entries": [self._entry(query[len("ytsearch:"):])]}
+        self._sleep("resolve")
+        return self._entry(query)
+
+
+class FakeVoiceClient:
+    def __init__(self, channel, recorder):
+        self.channel = channel
+        self.recorder = recorder
+        self.source = None
+        self.frames = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+
+    def is_connected(self):
+        return self.channel.guild.voice_client is self
+
+    def is_playing(self):
+        return self._thread is not None and self._thread.is_alive() and self._resumed.is_set()
+
+    def is_paused(self):
+        return self._thread is not None and self._thread.is_alive() and not self._resumed.is_set()
+
+    def play(self, source, *, after=None):
+        if self._thread is not None and self._thread.is_alive():
+            raise RuntimeError("Already playing audio.")
+        self.source = source
+        self._stop.clear()
+        self._resumed.set()
+        self._thread = threading.Thread(target=self._run, args=(source, after), daemon=True)
+        self._thread.start()
+
+    # Mirrors discord.py's AudioPlayer: one read() per 20 ms, scheduled against a fixed clock.
+    def _run(self, source, after):
+        guild_id = self.channel.guild.id
+        start = time.perf_counter()
+        loops = 0
+        first_frame = True
+        error = None
+        try:
+            while not self._stop.is_set():
+                if not self._resumed.is_set():
+                    self._resumed.wait()
+                    start = time.perf_counter()
+                    loops = 0
+                    continue
+
+                data = source.read()
+                if not data:
+                    break
+                if first_frame:
+                    self.recorder.first_frame(guild_id)
+                    first_frame = False
+
+                self.frames += 1
+                loops += 1
+                next_time = start + FRAME_LENGTH * loops
+                now = time.perf_counter()
+                if now > next_time + FRAME_LENGTH:
+                    self.recorder.deadline_miss(guild_id)
+                time.sleep(max(0, next_time - now))
+        except Exception as e:
+            error = e
+        finally:
+            source.cleanup()
+            self.recorder.track_end(guild_id)
+            self.source = None
+            # discord.py marks the player finished before calling after, so after may play() again.
+            self._thread = None
+        if after:
+            after(error)
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def stop(self):
+        self._stop.set()
+        self._resumed.set()
+
+    async def move_to(self, channel):
+        self.channel = channel
+
+    async def disconnect(self, *, force=False):
+        self.stop()
+        self.channel.guild.voice_client = None
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.voice_client = None
+
+    # The bot's own member, in a voice channel exactly while it holds a voice client.
+    @property
+    def me(self):
+        return SimpleNamespace(voice=self.voice_client and SimpleNamespace(channel=self.voice_client.channel))
+
+
+class FakeVoiceChannel:
+    bitrate = 128000
+
+    def __init__(self, guild, recorder, latency=0):
+        self.guild = guild
+        self.recorder = recorder
+        self.latency = latency
+
+    async def connect(self, *, timeout=60.0, reconnect=True):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.guild.voice_client = FakeVoiceClient(self, self.recorder)
+        return self.guild.voice_client
+
+
+class FakeTextChannel:
+    def __init__(self, guild, latency=0):
+        self.guild = guild
+        self.latency = latency
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent += 1
+
+
+class _Member:
+    def __init__(self, voice_channel):
+        self.id = voice_channel.guild.id
+        self.voice = type("VoiceState", (), {"channel": voice_channel})()
+
+
+class _Response:
+    def __init__(self, channel):
+        self._channel = channel
+
+    async def defer(self, **kwargs):
+        pass
+
+    async def send_message(self, content=None, **kwargs):
+        await self._channel.send(content)
+
+
+_interaction_ids = itertools.count(1)
+
+
+class FakeInteraction:
+    def __init__(self, guild, voice_channel, text_channel):
+        self.id = next(_interaction_ids)
+        self.guild = guild
+        self.guild_id = guild.id
+        self.channel = text_channel
+        self.user = _Member(voice_channel)
+        self.response = _Response(text_channel)
+        self.followup = text_channel
@@ -0,0 +1,270 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import main as core
+from cogs import extraction
+from bench.fakes import (
+    FakeExtractor,
+    FakeGuild,
+    FakeInteraction,
+    FakeTextChannel,
+    FakeVoiceChannel,
+    build_audio_library,
+    load_latency_profile,
+)
+from bench.report import add_json_argument, current_rss, percentiles, write_report
+from rate_limit import AdmissionControl
+
+
+DEFAULT_MIX = "play=3,skip=1,queue=2,volume=1,loop=1"
+LAG_INTERVAL = 0.05
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("play", "skip", "queue", "volume", "loop"):
+            raise argparse.ArgumentTypeError(f"unknown command in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class StepRecorder:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.deadline_misses = 0
+        self.loop_lag = []
+        self.queue_depth = []
+        self.command_latency = defaultdict(list)
+        self.commands = 0
+
+    def first_frame(self, guild_id):
+        pass
+
+    def track_end(self, guild_id):
+        pass
+
+    def deadline_miss(self, guild_id):
+        self.deadline_misses += 1
+
+
+# Stands in for the Discord gateway and REST API: owns the simulated guilds and
+# dispatches each command as its own task, the way discord.py dispatches interactions.
+class SimulatedGateway:
+    def __init__(self, args, recorder):
+        self.args = args
+        self.recorder = recorder
+        self.guilds = []
+        self.rng = random.Random(args.seed)
+        self._commands = list(args.mix)
+        self._weights = [args.mix[name] for name in self._commands]
+        self._tasks = []
+
+    def add_guild(self):
+        guild = FakeGuild(5000 + len(self.guilds))
+        voice_channel = FakeVoiceChannel(guild, self.recorder, latency=self.args.voice_latency)
+        text_channel = FakeTextChannel(guild, latency=self.args.rest_latency)
+        core.is_24_7[str(guild.id)] = True
+        self.guilds.append((guild, voice_channel, text_channel))
+        self._tasks.append(asyncio.create_task(self._drive(guild, voice_channel, text_channel)))
+
+    async def _drive(self, guild, voice_channel, text_channel):
+        rate = self.args.rate / 60
+        self._dispatch("play", guild, voice_channel, text_channel)
+        while True:
+            await asyncio.sleep(self.rng.expovariate(rate))
+            command = self.rng.choices(self._commands, self._weights)[0]
+            self._dispatch(command, guild, voice_channel, text_channel)
+
+    def _dispatch(self, command, guild, voice_channel, text_channel):
+        interaction = FakeInteraction(guild, voice_channel, text_channel)
+        music = core.bot.get_cog("Music")
+        if command == "play":
+            coro = music.play.callback(music, interaction, f"load song {self.rng.randrange(10000)}")
+        elif command == "skip":
+            coro = music.skip.callback(music, interaction)
+        elif command == "queue":
+            coro = music.view_queue.callback(music, interaction)
+        elif command == "volume":
+            coro = music.volume.callback(music, interaction, self.rng.randint(50, 150))
+        else:
+            coro = music.loop.callback(music, interaction)
+        asyncio.create_task(self._timed(command, coro))
+
+    async def _timed(self, command, coro):
+        started = time.perf_counter()
+        try:
+            await coro
+        except Exception as e:
+            logging.error("Load test %s failed: %s", command, e)
+        self.recorder.command_latency[command].append(time.perf_counter() - started)
+        self.recorder.commands += 1
+
+    def frames(self):
+        return sum(guild.voice_client.frames for guild, _, _ in self.guilds if guild.voice_client)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        for guild, _, _ in self.guilds:
+            core.SONG_QUEUES.pop(str(guild.id), None)
+            if guild.voice_client:
+                await guild.voice_client.disconnect()
+        # Let the final after_play callbacks run before the loop shuts down.
+        await asyncio.sleep(0.5)
+
+
+async def sample_loop_lag(recorder):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        recorder.loop_lag.append(max(0.0, time.perf_counter() - started - LAG_INTERVAL))
+
+
+async def sample_queue_depth(recorder, depth):
+    while True:
+        recorder.queue_depth.append(depth[0])
+        await asyncio.sleep(0.1)
+
+
+def instrument_extraction(depth):
+    search = extraction.search_ytdlp_async
+
+    async def counted(query, ydl_opts):
+        depth[0] += 1
+        try:
+            return await search(query, ydl_opts)
+        finally:
+            depth[0] -= 1
+
+    extraction.search_ytdlp_async = counted
+
+
+async def run(args):
+    core.FFMPEG_EXECUTABLE = args.ffmpeg or core.resolve_ffmpeg_executable()
+    if not core.FFMPEG_EXECUTABLE:
+        sys.exit("FFmpeg is required to decode the local stand-in audio files.")
+    core.bot.loop = asyncio.get_running_loop()
+    await core.bot.load_extension(core.EXTENSION)
+
+    audio_files = build_audio_library(args.audio_dir, 8, args.track_seconds)
+    extraction._extract = FakeExtractor(
+        audio_files, load_latency_profile(args.latency_profile), seed=args.seed, scale=args.latency_scale
+    )
+    # The gateway deliberately exceeds the production /play rate limits to find saturation.
+    core.play_admission = AdmissionControl()
+    depth = [0]
+    instrument_extraction(depth)
+
+    recorder = StepRecorder()
+    gateway = SimulatedGateway(args, recorder)
+    samplers = [
+        asyncio.create_task(sample_loop_lag(recorder)),
+        asyncio.create_task(sample_queue_depth(recorder, depth)),
+    ]
+
+    steps = []
+    saturated_at = None
+    try:
+        for target in args.steps:
+            while len(gateway.guilds) < target:
+                gateway.add_guild()
+            # Let new guilds get through their first extraction before measuring.
+            await asyncio.sleep(args.warmup)
+            recorder.reset()
+            frames_started = gateway.frames()
+            await asyncio.sleep(args.step_seconds)
+
+            frames = max(gateway.frames() - frames_started, 1)
+            lag = percentiles(recorder.loop_lag)
+            step = {
+                "guilds": target,
+                "commands": recorder.commands,
+                "loop_lag_ms": lag,
+                "frame_miss_rate": round(recorder.deadline_misses / frames, 4),
+                "extraction_queue_depth": {
+                    "mean": round(sum(recorder.queue_depth) / max(len(recorder.queue_depth), 1), 2),
+                    "max": max(recorder.queue_depth, default=0),
+                },
+                "rss_mb": round((current_rss() or 0) / 1048576, 1),
+                "command_latency_ms": {
+                    name: percentiles(samples) for name, samples in sorted(recorder.command_latency.items())
+                },
+            }
+            steps.append(step)
+            print(
+                f"guilds={target:>4}  lag p99 {lag['p99'] if lag else 0:>7} ms  "
+                f"miss rate {step['frame_miss_rate']:.2%}  "
+                f"extract depth max {step['extraction_queue_depth']['max']:>3}  rss {step['rss_mb']} MB",
+                file=sys.stderr,
+            )
+            if (lag and lag["p99"] > args.max_lag_ms) or step["frame_miss_rate"] > args.max_miss_rate:
+                saturated_at = target
+                break
+    finally:
+        for task in samplers:
+            task.cancel()
+        await gateway.close()
+
+    sustained = [step["guilds"] for step in steps if step["guilds"] != saturated_at]
+    return {
+        "schema": 1,
+        "timestamp": time.time(),
+        "params": {
+            "steps": args.steps,
+            "step_seconds": args.step_seconds,
+            "rate_per_guild_per_min": args.rate,
+            "mix": args.mix,
+            "rest_latency": args.rest_latency,
+            "voice_latency": args.voice_latency,
+            "max_lag_ms": args.max_lag_ms,
+            "max_miss_rate": args.max_miss_rate,
+        },
+        "steps": steps,
+        "saturated_at_guilds": saturated_at,
+        "max_sustained_guilds": max(sustained, default=None),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bench.loadtest", description="Step up simulated guilds until playback saturates."
+    )
+    parser.add_argument("--steps", type=lambda s: [int(n) for n in s.split(",")], default=[5, 10, 20, 40, 80, 160])
+    parser.add_argument("--step-seconds", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--rate", type=float, default=6, help="commands per guild per minute")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--track-seconds", type=int, default=30)
+    parser.add_argument("--rest-latency", type=float, default=0.05)
+    parser.add_argument("--voice-latency", type=float, default=0.3)
+    parser.add_argument("--latency-profile")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--max-lag-ms", type=float, default=50)
+    parser.add_argument("--max-miss-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ffmpeg")
+    parser.add_argument("--audio-dir", default=os.path.join(tempfile.gettempdir(), "eva_bench_audio"))
+    add_json_argument(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(run(args))
+    print(
+        f"saturated at {report['saturated_at_guilds']} guilds, "
+        f"max sustained {report['max_sustained_guilds']} guilds",
+        file=sys.stderr,
+    )
+    write_report(report, args.json)
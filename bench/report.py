@@ -0,0 +1,52 @@
+import json
+import os
+import sys
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+def add_json_argument(parser):
+    parser.add_argument("--json", help="write the machine-readable report to this path ('-' for stdout)")
+
+
+# Every bench prints its human-readable results to stderr (or, for python -m bench,
+# stdout unless the report goes there) and writes the JSON report only when asked.
+def write_report(report, destination):
+    if not destination:
+        return
+    if destination == "-":
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    with open(destination, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak RSS is the best portable fallback; macOS reports bytes, Linux KiB.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
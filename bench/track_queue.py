@@ -0,0 +1,89 @@
+import argparse
+import random
+import string
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+from bench.report import add_json_argument, write_report
+from track_queue import TrackQueue
+
+
+ID_ALPHABET = string.ascii_letters + string.digits + "-_"
+
+
+def synthetic_entries(count, rng):
+    return [
+        (
+            "".join(rng.choice(ID_ALPHABET) for _ in range(11)),
+            "Artist %d - Some Song Title (Official Video) %d" % (i % 500, i),
+            rng.randint(120, 600),
+        )
+        for i in range(count)
+    ]
+
+
+def traced_bytes(build):
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    result = build()
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return result, used
+
+
+# Memory of a queue of `count` lazy YouTube entries, against the deque of tuples it replaced.
+def measure(count, rng):
+    entries = synthetic_entries(count, rng)
+
+    def build_tuples():
+        return deque(("https://www.youtube.com/watch?v=" + vid, title, dur) for vid, title, dur in entries)
+
+    def build_compact():
+        queue = TrackQueue()
+        for vid, title, dur in entries:
+            queue.append_lazy(title, dur, "https://www.youtube.com/watch?v=" + vid)
+        return queue
+
+    _, tuple_bytes = traced_bytes(build_tuples)
+    queue, compact_bytes = traced_bytes(build_compact)
+    return {
+        "entries": count,
+        "tuple_deque_bytes": tuple_bytes,
+        "track_queue_bytes": compact_bytes,
+        "track_queue_nbytes": queue.nbytes(),
+        "bytes_per_entry": {
+            "tuple_deque": round(tuple_bytes / count, 1),
+            "track_queue": round(compact_bytes / count, 1),
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bench.track_queue", description="Memory of TrackQueue vs a deque of tuples."
+    )
+    parser.add_argument(
+        "--entries", type=lambda s: [int(n) for n in s.split(",")], default=[1000, 10000, 100000]
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    add_json_argument(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    rng = random.Random(args.seed)
+    steps = []
+    for count in args.entries:
+        step = measure(count, rng)
+        steps.append(step)
+        print(
+            f"entries={count:>7}  deque of tuples {step['tuple_deque_bytes'] / 1024:>9.1f} KiB "
+            f"({step['bytes_per_entry']['tuple_deque']} B/entry)  "
+            f"TrackQueue {step['track_queue_bytes'] / 1024:>8.1f} KiB ({step['bytes_per_entry']['track_queue']} B/entry)",
+            file=sys.stderr,
+        )
+    report = {"schema": 1, "timestamp": time.time(), "params": vars(args), "steps": steps}
+    write_report(report, args.json)
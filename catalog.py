@@ -0,0 +1,198 @@
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+
+WRITE_BATCH = 500
+# A hit must score at least this many times better than the runner-up
+# before it counts as a strong match that can skip the search request.
+STRONG_MARGIN = 1.5
+MIN_QUERY_TOKENS = 2
+# ...and the query must account for at least this share of the title's words.
+MIN_COVERAGE = 0.5
+# Ranking scores every matching row, so a query made of common words is not ranked at
+# all past this many matches; that many rows would rarely leave one clear winner anyway.
+MAX_MATCHES = 1000
+
+_TOKEN = re.compile(r"\w+")
+_STOP = object()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    video_id TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    uploader TEXT,
+    duration INTEGER,
+    codec TEXT,
+    page_url TEXT,
+    resolved_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(
+    title, uploader, content='tracks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS tracks_ai AFTER INSERT ON tracks BEGIN
+    INSERT INTO tracks_fts(rowid, title, uploader) VALUES (new.id, new.title, new.uploader);
+END;
+CREATE TRIGGER IF NOT EXISTS tracks_au AFTER UPDATE OF title, uploader ON tracks BEGIN
+    INSERT INTO tracks_fts(tracks_fts, rowid, title, uploader) VALUES ('delete', old.id, old.title, old.uploader);
+    INSERT INTO tracks_fts(rowid, title, uploader) VALUES (new.id, new.title, new.uploader);
+END;
+CREATE TRIGGER IF NOT EXISTS tracks_ad AFTER DELETE ON tracks BEGIN
+    INSERT INTO tracks_fts(tracks_fts, rowid, title, uploader) VALUES ('delete', old.id, old.title, old.uploader);
+END;
+"""
+
+# Flat extractions (search pickers, playlists) carry no format info, so a NULL codec or
+# duration never overwrites one recorded by a full extraction.
+_UPSERT = """
+INSERT INTO tracks (video_id, title, uploader, duration, codec, page_url, resolved_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(video_id) DO UPDATE SET
+    title = excluded.title,
+    uploader = COALESCE(excluded.uploader, uploader),
+    duration = COALESCE(excluded.duration, duration),
+    codec = COALESCE(excluded.codec, codec),
+    page_url = COALESCE(excluded.page_url, page_url),
+    resolved_at = excluded.resolved_at
+"""
+
+# Cheap next to ranking: no scores, and it stops once it is past MAX_MATCHES.
+_COUNT = """
+SELECT COUNT(*) FROM (SELECT rowid FROM tracks_fts WHERE tracks_fts MATCH ? LIMIT ?)
+"""
+
+# FTS5's own rank column (bm25, more negative is better) lets it stop after two hits.
+_LOOKUP = """
+SELECT tracks.video_id, tracks.title, tracks.uploader, tracks.duration, tracks.page_url, hits.rank
+FROM (SELECT rowid, rank FROM tracks_fts WHERE tracks_fts MATCH ? ORDER BY rank LIMIT 2) AS hits
+JOIN tracks ON tracks.id = hits.rowid
+ORDER BY hits.rank
+"""
+
+
+def tokens(text):
+    return _TOKEN.findall((text or "").casefold())
+
+
+def catalog_row(entry, now=None):
+    # Maps a yt-dlp info dict (full or flat) to a catalog row, or None without a video id.
+    video_id = entry.get("id")
+    title = entry.get("title")
+    if not video_id or not title:
+        return None
+    page_url = entry.get("webpage_url")
+    if not page_url:
+        url = entry.get("url") or ""
+        page_url = url if url.startswith("https://www.youtube.com/") else None
+    duration = entry.get("duration")
+    return (
+        video_id,
+        title,
+        entry.get("uploader") or entry.get("channel"),
+        int(duration) if duration else None,
+        entry.get("acodec") if entry.get("acodec") not in (None, "none") else None,
+        page_url or f"https://www.youtube.com/watch?v={video_id}",
+        now or time.time(),
+    )
+
+
+# Metadata of every track the bot has extracted, with an FTS5 index over title and
+# uploader. Writes go through a queue to one writer thread that commits them in
+# batches; lookups use their own connection and are meant to run in a worker thread.
+class TrackCatalog:
+    def __init__(self, path):
+        self.path = path
+        self.written = 0
+        self.dropped = 0
+        self._pending = queue.Queue(maxsize=10000)
+        self._read_lock = threading.Lock()
+        writer = self._connect()
+        writer.executescript(_SCHEMA)
+        writer.close()
+        self._reader = self._connect()
+        self._writer = threading.Thread(target=self._run, name="catalog-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    # Safe to call from any thread; never blocks.
+    def record(self, entry):
+        row = catalog_row(entry)
+        if row is None:
+            return
+        try:
+            self._pending.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def record_many(self, entries):
+        for entry in entries:
+            if entry:
+                self.record(entry)
+
+    def _run(self):
+        connection = self._connect()
+        while True:
+            row = self._pending.get()
+            rows = []
+            while row is not _STOP:
+                rows.append(row)
+                if len(rows) >= WRITE_BATCH:
+                    break
+                try:
+                    row = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+            if rows:
+                try:
+                    self.write(connection, rows)
+                except sqlite3.Error as e:
+                    logging.warning("Could not write %d catalog rows: %s", len(rows), e)
+            if row is _STOP:
+                connection.close()
+                return
+
+    def write(self, connection, rows):
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(_UPSERT, rows)
+        self.written += len(rows)
+
+    # Returns the catalog entry for a query only when it is unambiguous: every query
+    # token appears in the title or uploader, they make up a good part of the title, and
+    # the hit clearly outranks the next one.
+    def lookup(self, query):
+        words = tokens(query)
+        if len(words) < MIN_QUERY_TOKENS:
+            return None
+        match = " ".join('"' + word.replace('"', '""') + '"' for word in words)
+        with self._read_lock:
+            try:
+                if self._reader.execute(_COUNT, (match, MAX_MATCHES + 1)).fetchone()[0] > MAX_MATCHES:
+                    return None
+                rows = self._reader.execute(_LOOKUP, (match,)).fetchall()
+            except sqlite3.Error as e:
+                logging.warning("Catalog lookup failed for %r: %s", query, e)
+                return None
+        if not rows:
+            return None
+        video_id, title, uploader, duration, page_url, rank = rows[0]
+        if len(rows) > 1 and rank > rows[1][5] * STRONG_MARGIN:
+            return None
+        if len(set(words) & set(tokens(title))) < MIN_COVERAGE * len(set(tokens(title))):
+            return None
+        return {"id": video_id, "title": title, "uploader": uploader, "duration": duration, "webpage_url": page_url}
+
+    def close(self):
+        self._pending.put(_STOP)
+        self._writer.join(timeout=5)
+        with self._read_lock:
+            self._reader.close()
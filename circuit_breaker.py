@@ -0,0 +1,129 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+# Substrings of yt-dlp error messages. Only upstream health problems count against the
+# breaker; a private or removed video says nothing about whether YouTube is throttling us.
+_ERROR_CLASSES = (
+    ("throttled", ("http error 429", "too many requests", "rate-limit", "rate limit")),
+    ("bot_check", ("not a bot", "sign in to confirm", "captcha")),
+    ("unavailable", ("video unavailable", "private video", "has been removed", "not available", "age-restricted")),
+    ("network", ("timed out", "timeout", "connection reset", "connection refused", "name resolution", "urlopen")),
+)
+UPSTREAM_FAILURES = ("throttled", "bot_check", "network", "other")
+PROBE_TIMEOUT = 60.0
+
+
+def classify_error(exc):
+    message = str(exc).lower()
+    for name, needles in _ERROR_CLASSES:
+        if any(needle in message for needle in needles):
+            return name
+    return "other"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"extraction circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+# Closed: calls pass and outcomes go into a sliding window. Open: calls fail fast until
+# the jittered backoff expires. Half-open: a single probe call decides whether to close
+# again or reopen with a doubled backoff. Called from the event loop and executor threads.
+class CircuitBreaker:
+    def __init__(self, failure_rate=0.5, min_calls=8, window=60.0, base_delay=15.0, max_delay=600.0):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state = CLOSED
+        self.opened = 0
+        # Wall-clock time the breaker last opened, for /stats and the metrics.
+        self.opened_at = None
+        self.rejected = 0
+        self.last_error = None
+        self._outcomes = deque()
+        self._retry_at = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == OPEN and now >= self._retry_at:
+                self.state = HALF_OPEN
+                logging.info("Extraction circuit half-open, sending a probe")
+            # A probe whose caller was cancelled never reports back; let another through.
+            if self.state == HALF_OPEN and (self._probe_started is None or now - self._probe_started > PROBE_TIMEOUT):
+                self._probe_started = now
+                return
+            self.rejected += 1
+            raise CircuitOpenError(max(self._retry_at - now, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                logging.info("Extraction circuit closed after a successful probe")
+                self.state = CLOSED
+                self.opened = 0
+                self._probe_started = None
+                self._outcomes.clear()
+            self._add(True)
+
+    def record_error(self, exc):
+        error_class = classify_error(exc)
+        with self._lock:
+            if error_class not in UPSTREAM_FAILURES:
+                if self.state == HALF_OPEN:
+                    self._probe_started = None
+                return error_class
+            self.last_error = error_class
+            if self.state == HALF_OPEN:
+                self._open()
+            elif self.state == CLOSED:
+                self._add(False)
+                failures = sum(1 for _, ok in self._outcomes if not ok)
+                if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                    self._open()
+        return error_class
+
+    def _add(self, ok):
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        while self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def _open(self):
+        delay = min(self.base_delay * 2 ** self.opened, self.max_delay) * random.uniform(0.5, 1.0)
+        self.opened += 1
+        self.opened_at = time.time()
+        self.state = OPEN
+        self._probe_started = None
+        self._retry_at = time.monotonic() + delay
+        logging.warning("Extraction circuit open for %.0fs (last error: %s)", delay, self.last_error)
+
+    def retry_after(self):
+        return max(self._retry_at - time.monotonic(), 0.0) if self.state != CLOSED else 0.0
+
+    def snapshot(self):
+        with self._lock:
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                "state": self.state,
+                "window_calls": len(self._outcomes),
+                "window_failures": failures,
+                "retry_after": round(self.retry_after(), 1),
+                "consecutive_opens": self.opened,
+                "opened_at": self.opened_at,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+            }
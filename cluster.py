@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import urllib.request
+
+from dotenv import load_dotenv
+
+from ipc import IPCServer, IPC_HOST, parse_address
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+
+load_dotenv()
+TOKEN = os.getenv("DISCORD_TOKEN")
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_MAIN_PATH = os.path.join(_BASE_DIR, "main.py")
+
+RESTART_BASE_DELAY = 5
+RESTART_MAX_DELAY = 300
+# A cluster that stayed up this long is considered healthy again.
+RESTART_RESET_AFTER = 600
+# Discord allows one IDENTIFY per this many seconds in each max_concurrency bucket.
+IDENTIFY_INTERVAL = 5
+
+
+# Returns (recommended shards, max_concurrency).
+def fetch_gateway():
+    request = urllib.request.Request(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {TOKEN}", "User-Agent": "eva-music-bot cluster"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        gateway = json.load(response)
+    return gateway["shards"], gateway.get("session_start_limit", {}).get("max_concurrency", 1)
+
+
+def split_shards(shard_count, cluster_count):
+    cluster_count = max(1, min(cluster_count, shard_count))
+    per_cluster, extra = divmod(shard_count, cluster_count)
+    ranges = []
+    start = 0
+    for cluster_id in range(cluster_count):
+        end = start + per_cluster + (1 if cluster_id < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def run_cluster(cluster_id, shard_ids, shard_count, ipc_address, stopping, hub, start_delay=0):
+    delay = RESTART_BASE_DELAY
+    env = dict(os.environ)
+    env.update(
+        EVA_CLUSTER_ID=str(cluster_id),
+        EVA_SHARD_IDS=",".join(map(str, shard_ids)),
+        EVA_SHARD_COUNT=str(shard_count),
+        EVA_IPC_ADDRESS=ipc_address,
+        EVA_IPC_SECRET=hub.secret,
+    )
+
+    try:
+        await asyncio.wait_for(stopping.wait(), start_delay)
+    except asyncio.TimeoutError:
+        pass
+    while not stopping.is_set():
+        started = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(sys.executable, _MAIN_PATH, env=env)
+        logging.info("Cluster %d started (pid %d, shards %s).", cluster_id, proc.pid, shard_ids)
+
+        wait_task = asyncio.ensure_future(proc.wait())
+        stop_task = asyncio.ensure_future(stopping.wait())
+        await asyncio.wait((wait_task, stop_task), return_when=asyncio.FIRST_COMPLETED)
+        hub.forget_cluster(cluster_id)
+
+        if stop_task.done():
+            wait_task.cancel()
+            if proc.returncode is None:
+                proc.terminate()
+                try:
+                    await asyncio.wait_for(proc.wait(), 15)
+                except asyncio.TimeoutError:
+                    proc.kill()
+            return
+        stop_task.cancel()
+
+        if time.monotonic() - started > RESTART_RESET_AFTER:
+            delay = RESTART_BASE_DELAY
+        logging.error(
+            "Cluster %d exited with code %s; restarting in %ds.", cluster_id, proc.returncode, delay
+        )
+        try:
+            await asyncio.wait_for(stopping.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        delay = min(delay * 2, RESTART_MAX_DELAY)
+
+
+async def supervise():
+    shard_count = int(os.getenv("SHARD_COUNT", "0"))
+    max_concurrency = int(os.getenv("IDENTIFY_CONCURRENCY", "1"))
+    if not shard_count:
+        shard_count, max_concurrency = fetch_gateway()
+    cluster_count = int(os.getenv("CLUSTER_COUNT", "0")) or os.cpu_count() or 1
+    # By default the hub listens on a socket in a directory only this user can enter.
+    socket_dir = None
+    ipc_address = os.getenv("IPC_ADDRESS")
+    if not ipc_address and os.name != "nt":
+        socket_dir = tempfile.mkdtemp(prefix="eva-ipc-")
+        ipc_address = os.path.join(socket_dir, "hub.sock")
+    host, port = parse_address(ipc_address or IPC_HOST)
+
+    hub = IPCServer(host, port, secrets.token_hex(16))
+    await hub.start()
+    ipc_address = host if port is None else f"{host}:{port}"
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:
+            signal.signal(sig, lambda *_: loop.call_soon_threadsafe(stopping.set))
+
+    shard_ranges = split_shards(shard_count, cluster_count)
+    logging.info("Launching %d clusters for %d shards.", len(shard_ranges), shard_count)
+    # Each cluster starts once the shards of the clusters before it have had their
+    # IDENTIFY slots, instead of all of them identifying at the same moment.
+    start_delays = []
+    shards_before = 0
+    for shard_ids in shard_ranges:
+        start_delays.append(shards_before * IDENTIFY_INTERVAL / max_concurrency)
+        shards_before += len(shard_ids)
+    await asyncio.gather(
+        *(
+            run_cluster(cluster_id, shard_ids, shard_count, ipc_address, stopping, hub, start_delays[cluster_id])
+            for cluster_id, shard_ids in enumerate(shard_ranges)
+        )
+    )
+    await hub.close()
+    if socket_dir:
+        shutil.rmtree(socket_dir, ignore_errors=True)
+    logging.info("All clusters stopped.")
+
+
+if __name__ == "__main__":
+    if not TOKEN:
+        logging.error(
+            "DISCORD_TOKEN is missing. Set it in .env (same folder as main.py) or in the environment."
+        )
+        sys.exit(1)
+    asyncio.run(supervise())
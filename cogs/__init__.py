@@ -0,0 +1,11 @@
+from cogs.admin import Admin
+from cogs.music import Music
+
+
+# The package is loaded as a single extension, so reload_extension re-imports every
+# cogs.* module together and puts all of the old ones back if any of them fails.
+# Whatever has to outlive a reload (queues, voice clients, caches) belongs in main,
+# which these modules import but which is never reloaded itself.
+async def setup(bot):
+    await bot.add_cog(Music())
+    await bot.add_cog(Admin())
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from typing import Literal
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+import main as core
+from main import bot, collect_local_stats, ipc_client, loop_watchdog, memory_profile_step, memory_profiler
+
+
+def describe_breaker(snapshot):
+    text = f"{snapshot['state'].replace('_', '-')} ({snapshot['window_failures']}/{snapshot['window_calls']} failed"
+    if snapshot["state"] != "closed":
+        opened = time.strftime("%H:%M:%S", time.localtime(snapshot["opened_at"]))
+        text += f", opened {opened} on {snapshot['last_error']}, retry in {snapshot['retry_after']:.0f}s"
+    if snapshot["rejected"]:
+        text += f", {snapshot['rejected']} rejected"
+    return text + ")"
+
+
+class Admin(commands.Cog):
+    @app_commands.command(name="stats", description="Show playback stats across all shards.")
+    async def stats(self, interaction: discord.Interaction):
+        clusters = await ipc_client.cluster_stats() if ipc_client else None
+        if not clusters:
+            clusters = [collect_local_stats()]
+
+        lines = [
+            f"Cluster {c['cluster_id']} (shards {', '.join(map(str, c['shard_ids']))}): "
+            f"{c['guilds']} guilds, {c['playing']}/{c['voice_clients']} playing, {c['queued_songs']} queued, "
+            f"extraction {describe_breaker(c['extraction'])}"
+            for c in sorted(clusters, key=lambda c: c["cluster_id"])
+        ]
+        lines.append(
+            f"Total: {sum(c['guilds'] for c in clusters)} guilds, "
+            f"{sum(c['voice_clients'] for c in clusters)} voice clients, "
+            f"{sum(c['queued_songs'] for c in clusters)} queued"
+        )
+        await interaction.response.send_message("📊 Stats:\n" + "\n".join(lines))
+
+    @app_commands.command(name="loopstats", description="Show event loop lag and the slowest blocking handlers.")
+    @app_commands.describe(stack="Include the stack sample of the slowest handler")
+    @app_commands.default_permissions(administrator=True)
+    async def loopstats(self, interaction: discord.Interaction, stack: bool = False):
+        if not await bot.is_owner(interaction.user) and not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("❌ This command is for administrators only.", ephemeral=True)
+            return
+        if loop_watchdog is None:
+            await interaction.response.send_message("⚠️ The loop watchdog is disabled.", ephemeral=True)
+            return
+        report = loop_watchdog.report(with_stack=stack)
+        if len(report) > 1900:
+            report = report[:1900] + "\n..."
+        await interaction.response.send_message(f"```\n{report}\n```", ephemeral=True)
+
+    @app_commands.command(name="memprofile", description="Take tracemalloc snapshots and show what grew since the baseline.")
+    @app_commands.describe(action="start: take a baseline, snapshot: diff against it, stop: turn tracing off")
+    @app_commands.default_permissions(administrator=True)
+    async def memprofile(
+        self, interaction: discord.Interaction, action: Literal["start", "snapshot", "stop"] = "snapshot"
+    ):
+        if not await bot.is_owner(interaction.user) and not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("❌ This command is for administrators only.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+        if action == "stop":
+            memory_profiler.stop()
+            return await interaction.followup.send("tracemalloc stopped.", ephemeral=True)
+        if action == "start" and memory_profiler.active:
+            await asyncio.to_thread(memory_profiler.start)
+            return await interaction.followup.send("Baseline retaken.", ephemeral=True)
+        report = await memory_profile_step()
+        if len(report) > 1900:
+            report = report[:1900] + "\n..."
+        await interaction.followup.send(f"```\n{report}\n```", ephemeral=True)
+
+    @app_commands.command(name="reload", description="Reload the command, extraction and playback code in place.")
+    @app_commands.default_permissions(administrator=True)
+    async def reload(self, interaction: discord.Interaction):
+        # Reloads code for every guild this process serves, so guild admins do not get it.
+        if not await bot.is_owner(interaction.user):
+            await interaction.response.send_message("❌ This command is for the bot owner only.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+        try:
+            elapsed, synced = await core.reload_commands()
+        except commands.ExtensionError as e:
+            error = str(e.__cause__ or e)[:1800]
+            return await interaction.followup.send(
+                f"❌ Reload failed, the previous code is still running:\n```\n{error}\n```", ephemeral=True
+            )
+        await interaction.followup.send(
+            f"🔄 Reloaded in {elapsed * 1000:.0f} ms" + (", command tree synced." if synced else "."), ephemeral=True
+        )
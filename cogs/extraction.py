@@ -0,0 +1,190 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+
+import main as core
+import metrics
+import tracing
+from main import extraction_breaker, ipc_client, radio_slot, search_cache
+
+# main assigns YTDLP_JS_RUNTIMES and track_catalog during startup, so they are read off core.
+
+
+_COOKIES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cookies.txt")
+PLAYLIST_LIMIT = int(os.getenv("PLAYLIST_LIMIT", "1000"))
+PLAYLIST_BATCH = 25
+PLAYLIST_OPTS = {"noplaylist": False, "extract_flat": "in_playlist", "lazy_playlist": True}
+RADIO_OPTS = {"noplaylist": False, "extract_flat": "in_playlist", "playlistend": 25}
+# How often background radio extractions re-check whether user extractions are done.
+RADIO_YIELD_SECONDS = 0.5
+SEARCH_CACHE_TTL = 1800
+
+
+def _ytdlp_opts(extra=None):
+    opts = {
+        "format": "bestaudio[acodec=opus]/bestaudio[acodec=aac]/bestaudio/best",
+        "quiet": True,
+        "no_warnings": True,
+        "default_search": "auto",
+        "noplaylist": True,
+        "source_address": "0.0.0.0",
+        "youtube_include_dash_manifest": False,
+        "youtube_include_hls_manifest": False,
+        "geo_bypass": True,
+    }
+    if core.YTDLP_JS_RUNTIMES:
+        opts["js_runtimes"] = core.YTDLP_JS_RUNTIMES
+    if extra:
+        opts.update(extra)
+    if os.path.isfile(_COOKIES_PATH):
+        opts["cookiefile"] = _COOKIES_PATH
+    return opts
+
+
+def _extract(query, ydl_opts):
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        return ydl.extract_info(query, download=False)
+
+
+async def search_ytdlp_async(query, ydl_opts):
+    # Raises CircuitOpenError while YouTube is throttling us instead of queueing more doomed extractions.
+    extraction_breaker.check()
+    core.extractions_in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        with tracing.span("ytdlp.extract", query=query):
+            results = await loop.run_in_executor(None, lambda: _extract(query, ydl_opts))
+        metrics.EXTRACTION_SECONDS.observe(time.perf_counter() - started)
+        extraction_breaker.record_success()
+        if core.track_catalog and results:
+            core.track_catalog.record_many(results["entries"] if "entries" in results else (results,))
+        return results
+    except Exception as e:
+        error_class = extraction_breaker.record_error(e)
+        metrics.EXTRACTION_FAILURES.inc(error_class)
+        logging.error("yt_dlp error (%s): %s", error_class, e)
+        return None
+    finally:
+        core.extractions_in_flight -= 1
+
+
+async def search_shared_cache(query, ydl_opts):
+    key = f"search:{query}"
+    cached = search_cache.get(key)
+    if cached is None and ipc_client is not None:
+        cached = await ipc_client.cache_get(key)
+    if cached:
+        return cached
+
+    # A query that clearly names a track we extracted before only needs that video resolved.
+    if core.track_catalog and query.startswith("ytsearch:"):
+        hit = await asyncio.to_thread(core.track_catalog.lookup, query[len("ytsearch:"):])
+        metrics.CATALOG_LOOKUPS.inc("hit" if hit else "miss")
+        if hit:
+            query = hit["webpage_url"]
+
+    results = await search_ytdlp_async(query, ydl_opts)
+    if results:
+        first = (results.get("entries") or [None])[0] if "entries" in results else results
+        if first:
+            cached = {
+                "url": first["url"],
+                "title": first.get("title", "Untitled"),
+                "webpage_url": first.get("webpage_url"),
+                "duration": first.get("duration"),
+            }
+            search_cache.set(key, cached, ttl=SEARCH_CACHE_TTL)
+            if ipc_client is not None:
+                await ipc_client.cache_set(key, cached, ttl=SEARCH_CACHE_TTL)
+    return results
+
+
+def search_target(query):
+    if "youtube.com/watch" in query or "youtu.be/" in query:
+        return query
+    return "ytsearch:" + query
+
+
+async def resolve_query(query):
+    results = await search_shared_cache(search_target(query), _ytdlp_opts())
+    if results and "entries" in results:
+        return (results.get("entries") or [None])[0]
+    return results
+
+
+# Flat search: one request for N result titles, no format resolution for any of them.
+async def search_candidates_for(query, count):
+    results = await search_ytdlp_async(f"ytsearch{count}:{query}", _ytdlp_opts({"extract_flat": True}))
+    return flat_candidates(results)
+
+
+def flat_candidates(results):
+    candidates = []
+    for entry in (results or {}).get("entries") or ():
+        page_url = entry.get("url") or entry.get("webpage_url")
+        if page_url and not page_url.startswith("http"):
+            page_url = f"https://www.youtube.com/watch?v={entry.get('id') or page_url}"
+        if page_url:
+            title = entry.get("title") or "Untitled"
+            candidates.append((title, entry.get("duration") or 0, page_url, entry.get("channel")))
+    return candidates
+
+
+def is_playlist_url(query):
+    return "list=" in query and ("youtube.com/" in query or "youtu.be/" in query)
+
+
+def _stream_playlist(url, loop, batches):
+    import yt_dlp
+
+    playlist_title = None
+    try:
+        with yt_dlp.YoutubeDL(_ytdlp_opts(PLAYLIST_OPTS)) as ydl:
+            info = ydl.extract_info(url, download=False, process=False)
+            # Watch URLs with a list= parameter come back as a redirect to the playlist extractor.
+            for _ in range(3):
+                if info.get("_type") not in ("url", "url_transparent"):
+                    break
+                info = ydl.extract_info(info["url"], download=False, process=False, ie_key=info.get("ie_key"))
+            playlist_title = info.get("title")
+            batch = []
+            for entry in itertools.islice(info.get("entries") or (), PLAYLIST_LIMIT):
+                if not entry or not entry.get("url"):
+                    continue
+                batch.append((entry.get("title"), entry.get("duration"), entry["url"]))
+                if core.track_catalog:
+                    core.track_catalog.record(entry)
+                if len(batch) >= PLAYLIST_BATCH:
+                    loop.call_soon_threadsafe(batches.put_nowait, batch)
+                    batch = []
+            if batch:
+                loop.call_soon_threadsafe(batches.put_nowait, batch)
+        extraction_breaker.record_success()
+    except Exception as e:
+        error_class = extraction_breaker.record_error(e)
+        metrics.EXTRACTION_FAILURES.inc(error_class)
+        logging.error("Playlist extraction error (%s): %s", error_class, e)
+    finally:
+        loop.call_soon_threadsafe(batches.put_nowait, None)
+    return playlist_title
+
+
+# Radio extractions wait for a moment when no user-facing extraction is running and the
+# breaker is closed, so autoplay never competes with /play or spends a half-open probe.
+async def background_extract(query, ydl_opts):
+    async with radio_slot:
+        while core.extractions_in_flight or extraction_breaker.state != "closed":
+            await asyncio.sleep(RADIO_YIELD_SECONDS)
+        return await search_ytdlp_async(query, ydl_opts)
+
+
+async def resolve_track(track):
+    if track.url:
+        return track.url
+    results = await search_ytdlp_async(track.page_url, _ytdlp_opts())
+    return results.get("url") if results else None
@@ -0,0 +1,850 @@
+import logging
+import math
+from typing import Optional
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+import log_pipeline
+import main as core
+import tracing
+from circuit_breaker import CircuitOpenError
+from ffmpeg_supervisor import SupervisedSource
+from library import describe
+from main import (
+    SONG_QUEUES,
+    bot,
+    current_songs,
+    extraction_breaker,
+    is_24_7,
+    loop_mode,
+    message_cleanup,
+    queue_pages,
+    radio_stations,
+    resolving_guilds,
+    search_candidates,
+    volume_settings,
+)
+from track_queue import TrackQueue
+from cogs.extraction import _ytdlp_opts, is_playlist_url, search_candidates_for, search_shared_cache, search_target
+from cogs.playback import (
+    check_for_inactivity,
+    connect_to_voice,
+    current_position,
+    enqueue_batch,
+    format_duration,
+    import_playlist,
+    play_next_song,
+    seek_current,
+    throttled_message,
+    toggle_autoplay,
+)
+
+
+BATCH_LIMIT = 25
+QUERY_FILE_MAX_BYTES = 16384
+SEARCH_RESULTS = 5
+SEARCH_PICK_TTL = 300
+QUEUE_PAGE_SIZE = 10
+QUEUE_PAGE_TTL = 30
+QUEUE_VIEW_TIMEOUT = 180
+FORWARD_SECONDS = 30
+
+
+def slow_down_message(retry_after):
+    return f"⏳ Slow down! You can queue another song in {math.ceil(retry_after)}s."
+
+
+# The first query of a batch was charged on the way in; the rest are charged here, so a
+# batch costs one token per extraction like the same songs queued one at a time.
+def admit_batch(user_id, guild_id, count):
+    max_cost = core.play_admission.max_cost
+    if max_cost is not None and count > max_cost:
+        return f"⏳ You can queue at most {int(max_cost)} songs at once."
+    retry_after = core.play_admission.admit(user_id, guild_id, cost=count - 1)
+    return slow_down_message(retry_after) if retry_after else None
+
+
+def split_queries(text):
+    return [query.strip() for line in (text or "").splitlines() for query in line.split(";") if query.strip()]
+
+
+async def collect_queries(text, attachments):
+    queries = split_queries(text)
+    for attachment in attachments:
+        if attachment.size <= QUERY_FILE_MAX_BYTES and (
+            attachment.filename.endswith(".txt") or (attachment.content_type or "").startswith("text/")
+        ):
+            queries.extend(split_queries((await attachment.read()).decode("utf-8", errors="replace")))
+    return queries
+
+
+def batch_summary(added, failed, total):
+    lines = [f"➕ Added {len(added)} of {total} songs to the queue:"]
+    lines.extend(f"{i}. {title}" for i, title in enumerate(added, start=1))
+    if failed:
+        lines.append("⚠️ Could not load: " + ", ".join(failed))
+    summary = "\n".join(lines)
+    return summary if len(summary) <= 2000 else summary[:1996] + "\n..."
+
+
+def parse_timestamp(text):
+    # "95", "1:35" or "1:01:35" to seconds; None if it is none of those.
+    try:
+        parts = [float(part) for part in text.strip().split(":")]
+    except ValueError:
+        return None
+    if not 1 <= len(parts) <= 3 or any(part < 0 for part in parts):
+        return None
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds
+
+
+class SearchPicker(discord.ui.View):
+    def __init__(self, key, user_id, candidates):
+        super().__init__(timeout=SEARCH_PICK_TTL)
+        self.key = key
+        self.user_id = user_id
+        options = []
+        for i, (title, duration, _, channel) in enumerate(candidates):
+            details = " · ".join(filter(None, (duration and format_duration(duration), channel)))
+            options.append(discord.SelectOption(label=title[:100], description=details[:100] or None, value=str(i)))
+        self.select = discord.ui.Select(placeholder="Pick a song to queue", options=options)
+        self.select.callback = self.pick
+        self.add_item(self.select)
+
+    async def pick(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            return await interaction.response.send_message("Only the person who searched can pick.", ephemeral=True)
+        candidates = search_candidates.get(self.key)
+        if candidates is None:
+            return await interaction.response.send_message("This search expired. Run /search again.", ephemeral=True)
+        if not (interaction.user.voice and interaction.user.voice.channel):
+            return await interaction.response.send_message("You must be in a voice channel.", ephemeral=True)
+
+        title, duration, page_url, _ = candidates[int(self.select.values[0])]
+        await interaction.response.edit_message(content=f"Picked **{title}**.", view=None)
+        self.stop()
+        try:
+            voice_client = await connect_to_voice(interaction.user.voice.channel, interaction.guild.voice_client)
+        except Exception as e:
+            logging.error("Failed to connect: %s", e)
+            return await interaction.followup.send("Unable to connect to your voice channel.")
+
+        # Only the picked entry gets a full format extraction, and only once it is due to play.
+        guild_id = str(interaction.guild_id)
+        SONG_QUEUES.setdefault(guild_id, TrackQueue()).append_lazy(title, duration, page_url)
+        if voice_client.is_playing() or voice_client.is_paused() or guild_id in resolving_guilds:
+            await interaction.followup.send(f"Added to queue: **{title}**")
+        else:
+            await interaction.followup.send(f"🎵 Starting playback: **{title}**")
+            await play_next_song(voice_client, guild_id, interaction.channel)
+
+
+def queue_page_count(queue):
+    return max(1, math.ceil(len(queue) / QUEUE_PAGE_SIZE))
+
+
+# Decodes only the page's slice of the queue; the header uses the queue's running duration sum.
+def render_queue_page(guild_id, queue, page):
+    key = (guild_id, queue.version, page)
+    text = queue_pages.get(key)
+    if text is None:
+        start = page * QUEUE_PAGE_SIZE
+        lines = [
+            f"🎶 Queue: {len(queue)} songs, {format_duration(queue.total_duration)} total"
+            f" (page {page + 1}/{queue_page_count(queue)})"
+        ]
+        for i, track in enumerate(queue[start:start + QUEUE_PAGE_SIZE], start=start + 1):
+            title = track.title if len(track.title) <= 100 else track.title[:99] + "…"
+            lines.append(f"{i}. {title}" + (f" ({format_duration(track.duration)})" if track.duration else ""))
+        text = "\n".join(lines)
+        queue_pages.set(key, text, ttl=QUEUE_PAGE_TTL)
+    return text
+
+
+class QueuePager(discord.ui.View):
+    def __init__(self, guild_id):
+        super().__init__(timeout=QUEUE_VIEW_TIMEOUT)
+        self.guild_id = guild_id
+        self.page = 0
+        self.update_buttons()
+
+    def update_buttons(self):
+        queue = SONG_QUEUES.get(self.guild_id) or TrackQueue()
+        self.previous.disabled = self.page <= 0
+        self.next.disabled = self.page >= queue_page_count(queue) - 1
+
+    async def show(self, interaction, page):
+        queue = SONG_QUEUES.get(self.guild_id)
+        if not queue:
+            self.stop()
+            return await interaction.response.edit_message(content="📭 The queue is currently empty.", view=None)
+        # The queue may have shrunk since the last page was shown.
+        self.page = min(max(page, 0), queue_page_count(queue) - 1)
+        self.update_buttons()
+        await interaction.response.edit_message(content=render_queue_page(self.guild_id, queue, self.page), view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page + 1)
+
+
+def queue_message(guild_id, queue):
+    if queue_page_count(queue) == 1:
+        return {"content": render_queue_page(guild_id, queue, 0)}
+    return {"content": render_queue_page(guild_id, queue, 0), "view": QueuePager(guild_id)}
+
+
+# Slash commands, plus the ` prefix commands dispatched from on_message.
+class Music(commands.Cog):
+    @app_commands.command(name="play", description="Play a song from YouTube link or search query.")
+    @app_commands.describe(
+        song_query="YouTube link or search term; separate several with ;",
+        file="Text file with one song per line",
+    )
+    async def play(
+        self,
+        interaction: discord.Interaction,
+        song_query: Optional[str] = None,
+        file: Optional[discord.Attachment] = None,
+    ):
+        with tracing.start_trace("play", interaction.guild_id, interaction.id, command="/play"):
+            retry_after = core.play_admission.admit(interaction.user.id, interaction.guild_id)
+            if retry_after:
+                return await interaction.response.send_message(slow_down_message(retry_after), ephemeral=True)
+
+            with tracing.span("interaction.defer"):
+                await interaction.response.defer()
+
+            if not (interaction.user.voice and interaction.user.voice.channel):
+                return await interaction.followup.send("You must be in a voice channel.")
+
+            voice_channel = interaction.user.voice.channel
+            voice_client = interaction.guild.voice_client
+
+            try:
+                voice_client = await connect_to_voice(voice_channel, voice_client)
+                volume_settings[str(interaction.guild_id)] = 1.0
+            except Exception as e:
+                logging.error("Failed to connect: %s", e)
+                return await interaction.followup.send("Unable to connect to your voice channel.")
+
+            guild_id = str(interaction.guild_id)
+            queries = await collect_queries(song_query, [file] if file else [])
+            if not queries:
+                return await interaction.followup.send("Give me a song to play, or attach a text file with one per line.")
+            if len(queries) > 1:
+                queries = queries[:BATCH_LIMIT]
+                rejected = admit_batch(interaction.user.id, interaction.guild_id, len(queries))
+                if rejected:
+                    return await interaction.followup.send(rejected)
+                added, failed = await enqueue_batch(queries, guild_id, voice_client, interaction.channel)
+                return await interaction.followup.send(batch_summary(added, failed, len(queries)))
+            song_query = queries[0]
+
+            if is_playlist_url(song_query):
+                try:
+                    extraction_breaker.check()
+                except CircuitOpenError as e:
+                    return await interaction.followup.send(throttled_message(e))
+                await interaction.followup.send("📜 Importing playlist...")
+                added, playlist_title = await import_playlist(song_query, guild_id, voice_client, interaction.channel)
+                if not added:
+                    return await interaction.followup.send("No playable entries found in that playlist.")
+                return await interaction.followup.send(f"Added {added} tracks from **{playlist_title}**.")
+
+            query = search_target(song_query)
+
+            ydl_options = _ytdlp_opts()
+
+            try:
+                results = await search_shared_cache(query, ydl_options)
+                if not results:
+                    return await interaction.followup.send("Failed to fetch song data.")
+            except CircuitOpenError as e:
+                return await interaction.followup.send(throttled_message(e))
+            except Exception as e:
+                logging.error("yt_dlp error: %s", e)
+                return await interaction.followup.send("Failed to fetch song data.")
+
+            if "entries" in results:
+                tracks = results.get("entries") or []
+                if not tracks:
+                    return await interaction.followup.send("No results found for your query.")
+                first = tracks[0]
+            else:
+                first = results
+
+            audio_url = first["url"]
+            title = first.get("title", "Untitled")
+
+            if SONG_QUEUES.get(guild_id) is None:
+                SONG_QUEUES[guild_id] = TrackQueue()
+            SONG_QUEUES[guild_id].append(audio_url, title, first.get("webpage_url"), first.get("duration"))
+
+            if voice_client.is_playing() or voice_client.is_paused() or guild_id in resolving_guilds:
+                await interaction.followup.send(f"Added to queue: **{title}**")
+            else:
+                await interaction.followup.send(f"🎵 Starting playback: **{title}**")
+                await play_next_song(voice_client, guild_id, interaction.channel)
+
+    @play.autocomplete("song_query")
+    async def play_autocomplete(self, interaction: discord.Interaction, current: str):
+        # Local titles only: autocomplete must answer within 3 seconds, so no network calls.
+        return [
+            app_commands.Choice(name=entry["title"][:100], value=(entry["page_url"] or entry["title"])[:100])
+            for entry in core.title_index.search(current)
+        ]
+
+    @app_commands.command(name="search", description="Search YouTube and pick which result to play.")
+    @app_commands.describe(query="Search term", results="How many results to show (1-10)")
+    async def search(
+        self, interaction: discord.Interaction, query: str, results: app_commands.Range[int, 1, 10] = SEARCH_RESULTS
+    ):
+        retry_after = core.play_admission.admit(interaction.user.id, interaction.guild_id)
+        if retry_after:
+            return await interaction.response.send_message(slow_down_message(retry_after), ephemeral=True)
+        await interaction.response.defer(ephemeral=True)
+
+        try:
+            candidates = await search_candidates_for(query, results)
+        except CircuitOpenError as e:
+            return await interaction.followup.send(throttled_message(e))
+        if not candidates:
+            return await interaction.followup.send("No results found for your query.")
+
+        key = str(interaction.id)
+        search_candidates.set(key, candidates, ttl=SEARCH_PICK_TTL)
+        lines = [
+            f"{i}. {title}" + (f" ({format_duration(duration)})" if duration else "")
+            for i, (title, duration, _, _) in enumerate(candidates, start=1)
+        ]
+        await interaction.followup.send(
+            "🔎 Results:\n" + "\n".join(lines), view=SearchPicker(key, interaction.user.id, candidates)
+        )
+
+    @app_commands.command(name="local", description="Play a file from the local music library.")
+    @app_commands.describe(query="Title, artist or album")
+    async def local(self, interaction: discord.Interaction, query: str):
+        if not core.media_library:
+            return await interaction.response.send_message("No local music library is configured.", ephemeral=True)
+        if not (interaction.user.voice and interaction.user.voice.channel):
+            return await interaction.response.send_message("You must be in a voice channel.", ephemeral=True)
+        matches = core.media_library.search(query, limit=1)
+        if not matches:
+            return await interaction.response.send_message("Nothing in the library matches that.", ephemeral=True)
+        await interaction.response.defer()
+
+        try:
+            voice_client = await connect_to_voice(interaction.user.voice.channel, interaction.guild.voice_client)
+        except Exception as e:
+            logging.error("Failed to connect: %s", e)
+            return await interaction.followup.send("Unable to connect to your voice channel.")
+
+        # Library files need no resolving, so they are queued with their path as the stream URL.
+        guild_id = str(interaction.guild_id)
+        file = matches[0]
+        title = describe(file)
+        SONG_QUEUES.setdefault(guild_id, TrackQueue()).append(file.path, title, None, file.duration)
+        if voice_client.is_playing() or voice_client.is_paused() or guild_id in resolving_guilds:
+            await interaction.followup.send(f"Added to queue: **{title}**")
+        else:
+            await interaction.followup.send(f"🎵 Starting playback: **{title}**")
+            await play_next_song(voice_client, guild_id, interaction.channel)
+
+    @local.autocomplete("query")
+    async def local_autocomplete(self, interaction: discord.Interaction, current: str):
+        if not core.media_library:
+            return []
+        return [
+            app_commands.Choice(name=describe(file)[:100], value=describe(file)[:100])
+            for file in core.media_library.search(current, limit=25)
+        ]
+
+    @app_commands.command(name="pause", description="Pause the currently playing song.")
+    async def pause(self, interaction: discord.Interaction):
+        vc = interaction.guild.voice_client
+        if vc and vc.is_playing():
+            vc.pause()
+            await interaction.response.send_message("⏸️ Playback paused.")
+            if not SONG_QUEUES.get(str(interaction.guild_id)):
+                await check_for_inactivity(interaction.channel, bot, is_24_7.get(str(interaction.guild_id), False))
+        else:
+            await interaction.response.send_message("Nothing is currently playing.")
+
+    @app_commands.command(name="resume", description="Resume the currently paused song.")
+    async def resume(self, interaction: discord.Interaction):
+        vc = interaction.guild.voice_client
+        if vc and vc.is_paused():
+            vc.resume()
+            await interaction.response.send_message("▶️ Playback resumed.")
+        else:
+            await interaction.response.send_message("I’m not paused right now.")
+            if vc and not vc.is_playing() and not SONG_QUEUES.get(str(interaction.guild_id)):
+                await check_for_inactivity(interaction.channel, bot, is_24_7.get(str(interaction.guild_id), False))
+
+    @app_commands.command(name="skip", description="Skips the current playing song.")
+    async def skip(self, interaction: discord.Interaction):
+        vc = interaction.guild.voice_client
+        if vc and (vc.is_playing() or vc.is_paused()):
+            vc.stop()
+            await interaction.response.send_message("⏭️ Skipped the current song.")
+        else:
+            await interaction.response.send_message("Not playing anything to skip.")
+            if vc and not vc.is_playing() and not SONG_QUEUES.get(str(interaction.guild_id)):
+                await check_for_inactivity(interaction.channel, bot, is_24_7.get(str(interaction.guild_id), False))
+
+    @app_commands.command(name="disconnect", description="Stop playback and disconnect.")
+    async def disconnect(self, interaction: discord.Interaction):
+        vc = interaction.guild.voice_client
+        if vc:
+            guild_id = str(interaction.guild_id)
+            SONG_QUEUES[guild_id] = TrackQueue()
+            volume_settings.pop(guild_id, None)
+            is_24_7.pop(guild_id, None)
+            current_songs.pop(guild_id, None)
+            radio_stations.pop(guild_id, None)
+            await vc.disconnect()
+            await interaction.response.send_message("👋 Disconnected and cleared the queue.")
+        else:
+            await interaction.response.send_message("I'm not connected to any voice channel.")
+
+    @app_commands.command(name="join", description="Make the bot join your voice channel.")
+    async def join(self, interaction: discord.Interaction):
+        if not (interaction.user.voice and interaction.user.voice.channel):
+            await interaction.response.send_message("❌ You must be in a voice channel.")
+            return
+
+        try:
+            vc = await connect_to_voice(interaction.user.voice.channel, interaction.guild.voice_client)
+            volume_settings[str(interaction.guild_id)] = 1.0
+            bitrate = interaction.user.voice.channel.bitrate // 1000
+            if bitrate < 128:
+                await interaction.response.send_message(
+                    f"✅ Joined your voice channel. ⚠️ Low bitrate ({bitrate} kbps) detected. Boost server for better audio (128+ kbps)."
+                )
+            else:
+                await interaction.response.send_message("✅ Joined your voice channel.")
+            if not vc.is_playing() and not SONG_QUEUES.get(str(interaction.guild_id)):
+                await check_for_inactivity(interaction.channel, bot, is_24_7.get(str(interaction.guild_id), False))
+        except Exception as e:
+            logging.error("Join command error: %s", e)
+            await interaction.response.send_message("❌ Failed to join voice channel.")
+
+    @app_commands.command(name="queue", description="View current song queue.")
+    async def view_queue(self, interaction: discord.Interaction):
+        guild_id = str(interaction.guild_id)
+        q = SONG_QUEUES.get(guild_id)
+        if not q:
+            await interaction.response.send_message("📭 The queue is currently empty.")
+            vc = interaction.guild.voice_client
+            if vc and not vc.is_playing():
+                await check_for_inactivity(interaction.channel, bot, is_24_7.get(guild_id, False))
+        else:
+            await interaction.response.send_message(**queue_message(guild_id, q))
+
+    @app_commands.command(name="cleanqueue", description="Clear the entire queue.")
+    async def cleanqueue(self, interaction: discord.Interaction):
+        gid = str(interaction.guild_id)
+        if gid in SONG_QUEUES:
+            SONG_QUEUES[gid].clear()
+        await interaction.response.send_message("🧹 Queue has been cleared!")
+        vc = interaction.guild.voice_client
+        if vc and not vc.is_playing():
+            await check_for_inactivity(interaction.channel, bot, is_24_7.get(gid, False))
+
+    @app_commands.command(name="volume", description="Set volume between 0 and 200.")
+    @app_commands.describe(amount="Volume percentage 0-200")
+    async def volume(self, interaction: discord.Interaction, amount: int):
+        if not (0 <= amount <= 200):
+            return await interaction.response.send_message("❌ Volume must be between 0 and 200.")
+        vid = str(interaction.guild_id)
+        volume_settings[vid] = min(amount / 100, 2.0)
+        vc = interaction.guild.voice_client
+        if vc and isinstance(vc.source, SupervisedSource):
+            if vc.source.passthrough:
+                return await interaction.response.send_message(f"🔊 Volume set to {amount}% from the next track.")
+            vc.source.volume = volume_settings[vid]
+        await interaction.response.send_message(f"🔊 Volume set to {amount}%.")
+        if vc and not vc.is_playing() and not SONG_QUEUES.get(vid):
+            await check_for_inactivity(interaction.channel, bot, is_24_7.get(vid, False))
+
+    @app_commands.command(name="loop", description="Toggle loop (repeat current song).")
+    async def loop(self, interaction: discord.Interaction):
+        gid = str(interaction.guild_id)
+        loop_mode[gid] = not loop_mode.get(gid, False)
+        await interaction.response.send_message("🔁 Loop enabled." if loop_mode[gid] else "➡️ Loop disabled.")
+        vc = interaction.guild.voice_client
+        if vc and not vc.is_playing() and not SONG_QUEUES.get(gid):
+            await check_for_inactivity(interaction.channel, bot, is_24_7.get(gid, False))
+
+    @app_commands.command(name="autoplay", description="Toggle autoplay of related songs when the queue runs out.")
+    async def autoplay(self, interaction: discord.Interaction):
+        await interaction.response.send_message(toggle_autoplay(str(interaction.guild_id)))
+
+    @app_commands.command(name="seek", description="Jump to a position in the current song.")
+    @app_commands.describe(position="Timestamp such as 1:30, or seconds")
+    async def seek(self, interaction: discord.Interaction, position: str):
+        target = parse_timestamp(position)
+        if target is None:
+            return await interaction.response.send_message("❌ Give a timestamp like 1:30 or 90.", ephemeral=True)
+        await interaction.response.defer()
+        await interaction.followup.send(await seek_current(interaction.guild, target))
+
+    @app_commands.command(name="forward", description="Skip ahead within the current song.")
+    @app_commands.describe(seconds="How far to skip ahead (default 30)")
+    async def forward(
+        self, interaction: discord.Interaction, seconds: app_commands.Range[int, 1, 3600] = FORWARD_SECONDS
+    ):
+        await interaction.response.defer()
+        target = current_position(interaction.guild) + seconds
+        await interaction.followup.send(await seek_current(interaction.guild, target))
+
+    @app_commands.command(name="nowplaying", description="Show current playing song.")
+    async def nowplaying(self, interaction: discord.Interaction):
+        vc = interaction.guild.voice_client
+        guild_id = str(interaction.guild_id)
+        if not vc or not vc.is_playing():
+            await interaction.response.send_message("Nothing is currently playing.")
+            if vc and not SONG_QUEUES.get(guild_id):
+                await check_for_inactivity(interaction.channel, bot, is_24_7.get(guild_id, False))
+        else:
+            title = current_songs.get(guild_id, {}).get("title", "Unknown")
+            await interaction.response.send_message(f"🎵 Currently playing: **{title}**")
+
+    @app_commands.command(name="247", description="Toggle 24/7 mode to keep bot in VC.")
+    async def toggle_247(self, interaction: discord.Interaction):
+        gid = str(interaction.guild_id)
+        is_24_7[gid] = not is_24_7.get(gid, False)
+        await interaction.response.send_message(
+            "🔄 24/7 mode enabled." if is_24_7[gid] else "🔄 24/7 mode disabled."
+        )
+        if not is_24_7.get(gid) and not SONG_QUEUES.get(gid) and interaction.guild.voice_client:
+            await check_for_inactivity(interaction.channel, bot, is_24_7.get(gid, False))
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.author.bot or not message.content.startswith("`"):
+            return
+
+        log_pipeline.set_guild(message.guild.id if message.guild else None)
+        ctx = await bot.get_context(message)
+        parts = message.content[1:].strip().split(maxsplit=1)
+        command = parts[0].lower()
+        arg = parts[1] if len(parts) > 1 else ""
+
+        if command == "play":
+            await play_prefix(ctx, arg)
+        elif command == "local":
+            await local_prefix(ctx, arg)
+        elif command == "pause":
+            await pause_prefix(ctx)
+        elif command == "resume":
+            await resume_prefix(ctx)
+        elif command == "skip":
+            await skip_prefix(ctx)
+        elif command == "disconnect":
+            await disconnect_prefix(ctx)
+        elif command == "join":
+            await join_prefix(ctx)
+        elif command == "queue":
+            await queue_prefix(ctx)
+        elif command == "cleanqueue":
+            await cleanqueue_prefix(ctx)
+        elif command == "volume":
+            try:
+                await volume_prefix(ctx, int(arg))
+            except:
+                await ctx.send("❌ Provide a number between 0 and 200.")
+        elif command == "nowplaying":
+            await nowplaying_prefix(ctx)
+        elif command == "seek":
+            await seek_prefix(ctx, arg)
+        elif command == "forward":
+            await forward_prefix(ctx, arg)
+        elif command == "loop":
+            await loop_prefix(ctx)
+        elif command == "autoplay":
+            await autoplay_prefix(ctx)
+        elif command == "247":
+            await toggle_247_prefix(ctx)
+
+
+async def volume_prefix(ctx, amount: int):
+    message_cleanup.queue(ctx.message)
+    if not (0 <= amount <= 200):
+        return await ctx.send("❌ Volume must be between 0 and 200.")
+    vid = str(ctx.guild.id)
+    volume_settings[vid] = min(amount / 100, 2.0)
+    vc = ctx.voice_client
+    if vc and isinstance(vc.source, SupervisedSource):
+        if vc.source.passthrough:
+            return await ctx.send(f"🔊 Volume set to {amount}% from the next track.")
+        vc.source.volume = volume_settings[vid]
+    await ctx.send(f"🔊 Volume set to {amount}%.")
+    if vc and not vc.is_playing() and not SONG_QUEUES.get(vid):
+        await check_for_inactivity(ctx.channel, bot, is_24_7.get(vid, False))
+
+
+async def play_prefix(ctx, query):
+    with tracing.start_trace("play", ctx.guild.id, ctx.message.id, command="`play"):
+        message_cleanup.queue(ctx.message)
+        retry_after = core.play_admission.admit(ctx.author.id, ctx.guild.id)
+        if retry_after:
+            return await ctx.send(slow_down_message(retry_after), delete_after=5)
+        if not ctx.author.voice or not ctx.author.voice.channel:
+            return await ctx.send("You must be in a voice channel.")
+
+        voice_channel = ctx.author.voice.channel
+        voice_client = ctx.voice_client
+
+        try:
+            voice_client = await connect_to_voice(voice_channel, voice_client)
+            volume_settings[str(ctx.guild.id)] = 1.0
+        except Exception as e:
+            logging.error("Failed to connect: %s", e)
+            return await ctx.send("Unable to connect to your voice channel.")
+
+        gid = str(ctx.guild.id)
+        queries = await collect_queries(query, ctx.message.attachments)
+        if not queries:
+            return await ctx.send("Give me a song to play, or attach a text file with one per line.")
+        if len(queries) > 1:
+            queries = queries[:BATCH_LIMIT]
+            rejected = admit_batch(ctx.author.id, ctx.guild.id, len(queries))
+            if rejected:
+                return await ctx.send(rejected, delete_after=5)
+            added, failed = await enqueue_batch(queries, gid, voice_client, ctx.channel)
+            return await ctx.send(batch_summary(added, failed, len(queries)))
+        query = queries[0]
+
+        if is_playlist_url(query):
+            try:
+                extraction_breaker.check()
+            except CircuitOpenError as e:
+                return await ctx.send(throttled_message(e))
+            await ctx.send("📜 Importing playlist...")
+            added, playlist_title = await import_playlist(query, gid, voice_client, ctx.channel)
+            if not added:
+                return await ctx.send("No playable entries found in that playlist.")
+            return await ctx.send(f"Added {added} tracks from **{playlist_title}**.")
+
+        search = search_target(query)
+
+        ydl_options = _ytdlp_opts()
+
+        try:
+            results = await search_shared_cache(search, ydl_options)
+            if not results:
+                return await ctx.send("Failed to fetch song data.")
+        except CircuitOpenError as e:
+            return await ctx.send(throttled_message(e))
+        except Exception as e:
+            logging.error("yt_dlp error: %s", e)
+            return await ctx.send("Failed to fetch song data.")
+
+        if "entries" in results:
+            tracks = results.get("entries") or []
+            if not tracks:
+                return await ctx.send("No results found.")
+            first = tracks[0]
+        else:
+            first = results
+
+        audio_url = first["url"]
+        title = first.get("title", "Untitled")
+        if SONG_QUEUES.get(gid) is None:
+            SONG_QUEUES[gid] = TrackQueue()
+        SONG_QUEUES[gid].append(audio_url, title, first.get("webpage_url"), first.get("duration"))
+
+        if voice_client.is_playing() or voice_client.is_paused() or gid in resolving_guilds:
+            await ctx.send(f"Added to queue: **{title}**")
+        else:
+            await play_next_song(voice_client, gid, ctx.channel)
+
+
+async def local_prefix(ctx, query):
+    message_cleanup.queue(ctx.message)
+    if not core.media_library:
+        return await ctx.send("No local music library is configured.")
+    if not ctx.author.voice or not ctx.author.voice.channel:
+        return await ctx.send("You must be in a voice channel.")
+    matches = core.media_library.search(query, limit=1)
+    if not matches:
+        return await ctx.send("Nothing in the library matches that.")
+
+    try:
+        voice_client = await connect_to_voice(ctx.author.voice.channel, ctx.voice_client)
+    except Exception as e:
+        logging.error("Failed to connect: %s", e)
+        return await ctx.send("Unable to connect to your voice channel.")
+
+    gid = str(ctx.guild.id)
+    file = matches[0]
+    title = describe(file)
+    SONG_QUEUES.setdefault(gid, TrackQueue()).append(file.path, title, None, file.duration)
+    if voice_client.is_playing() or voice_client.is_paused() or gid in resolving_guilds:
+        await ctx.send(f"Added to queue: **{title}**")
+    else:
+        await play_next_song(voice_client, gid, ctx.channel)
+
+
+async def pause_prefix(ctx):
+    message_cleanup.queue(ctx.message)
+    vc = ctx.voice_client
+    if vc and vc.is_playing():
+        vc.pause()
+        await ctx.send("⏸️ Playback paused.")
+        if not SONG_QUEUES.get(str(ctx.guild.id)):
+            await check_for_inactivity(ctx.channel, bot, is_24_7.get(str(ctx.guild.id), False))
+    else:
+        await ctx.send("Nothing is currently playing.")
+
+
+async def resume_prefix(ctx):
+    message_cleanup.queue(ctx.message)
+    vc = ctx.voice_client
+    if vc and vc.is_paused():
+        vc.resume()
+        await ctx.send("▶️ Playback resumed.")
+    else:
+        await ctx.send("I’m not paused right now.")
+        if vc and not vc.is_playing() and not SONG_QUEUES.get(str(ctx.guild.id)):
+            await check_for_inactivity(ctx.channel, bot, is_24_7.get(str(ctx.guild.id), False))
+
+
+async def skip_prefix(ctx):
+    message_cleanup.queue(ctx.message)
+    vc = ctx.voice_client
+    if vc and (vc.is_playing() or vc.is_paused()):
+        vc.stop()
+        await ctx.send("⏭️ Skipped the current song.")
+    else:
+        await ctx.send("Not playing anything to skip.")
+        if vc and not vc.is_playing() and not SONG_QUEUES.get(str(ctx.guild.id)):
+            await check_for_inactivity(ctx.channel, bot, is_24_7.get(str(ctx.guild.id), False))
+
+
+async def disconnect_prefix(ctx):
+    message_cleanup.queue(ctx.message)
+    vc = ctx.voice_client
+    if vc:
+        guild_id = str(ctx.guild.id)
+        SONG_QUEUES[guild_id] = TrackQueue()
+        volume_settings.pop(guild_id, None)
+        is_24_7.pop(guild_id, None)
+        current_songs.pop(guild_id, None)
+        radio_stations.pop(guild_id, None)
+        await vc.disconnect()
+        await ctx.send("👋 Disconnected and cleared the queue.")
+    else:
+        await ctx.send("I'm not connected to any voice channel.")
+
+
+async def join_prefix(ctx):
+    message_cleanup.queue(ctx.message)
+    if not ctx.author.voice or not ctx.author.voice.channel:
+        return await ctx.send("You must be in a voice channel.")
+    try:
+        vc = await connect_to_voice(ctx.author.voice.channel, ctx.voice_client)
+        volume_settings[str(ctx.guild.id)] = 1.0
+        bitrate = ctx.author.voice.channel.bitrate // 1000
+        if bitrate < 128:
+            await ctx.send(
+                f"✅ Joined your voice channel. ⚠️ Low bitrate ({bitrate} kbps) detected. Boost server for better audio (128+ kbps)."
+            )
+        else:
+            await ctx.send("✅ Joined your voice channel.")
+        if not vc.is_playing() and not SONG_QUEUES.get(str(ctx.guild.id)):
+            await check_for_inactivity(ctx.channel, bot, is_24_7.get(str(ctx.guild.id), False))
+    except Exception as e:
+        logging.error("Join command error: %s", e)
+        await ctx.send("❌ Failed to join voice channel.")
+
+
+async def queue_prefix(ctx):
+    message_cleanup.queue(ctx.message)
+    gid = str(ctx.guild.id)
+    q = SONG_QUEUES.get(gid)
+    if not q:
+        await ctx.send("📭 The queue is currently empty.")
+        vc = ctx.voice_client
+        if vc and not vc.is_playing():
+            await check_for_inactivity(ctx.channel, bot, is_24_7.get(str(ctx.guild.id), False))
+    else:
+        await ctx.send(**queue_message(gid, q))
+
+
+async def cleanqueue_prefix(ctx):
+    message_cleanup.queue(ctx.message)
+    gid = str(ctx.guild.id)
+    if gid in SONG_QUEUES:
+        SONG_QUEUES[gid].clear()
+    await ctx.send("🧹 Queue has been cleared!")
+    vc = ctx.voice_client
+    if vc and not vc.is_playing():
+        await check_for_inactivity(ctx.channel, bot, is_24_7.get(gid, False))
+
+
+async def seek_prefix(ctx, position):
+    message_cleanup.queue(ctx.message)
+    target = parse_timestamp(position)
+    if target is None:
+        return await ctx.send("❌ Give a timestamp like 1:30 or 90.")
+    await ctx.send(await seek_current(ctx.guild, target))
+
+
+async def forward_prefix(ctx, seconds):
+    message_cleanup.queue(ctx.message)
+    try:
+        seconds = int(seconds) if seconds else FORWARD_SECONDS
+    except ValueError:
+        return await ctx.send("❌ Provide a number of seconds.")
+    if not 1 <= seconds <= 3600:
+        return await ctx.send("❌ Provide a number of seconds between 1 and 3600.")
+    await ctx.send(await seek_current(ctx.guild, current_position(ctx.guild) + seconds))
+
+
+async def nowplaying_prefix(ctx):
+    message_cleanup.queue(ctx.message)
+    vc = ctx.voice_client
+    guild_id = str(ctx.guild.id)
+    if not vc or not vc.is_playing():
+        await ctx.send("Nothing is currently playing.")
+        if vc and not SONG_QUEUES.get(guild_id):
+            await check_for_inactivity(ctx.channel, bot, is_24_7.get(guild_id, False))
+    else:
+        title = current_songs.get(guild_id, {}).get("title", "Unknown")
+        await ctx.send(f"🎵 Currently playing: **{title}**")
+
+
+async def autoplay_prefix(ctx):
+    message_cleanup.queue(ctx.message)
+    await ctx.send(toggle_autoplay(str(ctx.guild.id)))
+
+
+async def loop_prefix(ctx):
+    message_cleanup.queue(ctx.message)
+    gid = str(ctx.guild.id)
+    loop_mode[gid] = not loop_mode.get(gid, False)
+    await ctx.send("🔁 Loop enabled." if loop_mode[gid] else "➡️ Loop disabled.")
+    vc = ctx.voice_client
+    if vc and not vc.is_playing() and not SONG_QUEUES.get(gid):
+        await check_for_inactivity(ctx.channel, bot, is_24_7.get(gid, False))
+
+
+async def toggle_247_prefix(ctx):
+    message_cleanup.queue(ctx.message)
+    gid = str(ctx.guild.id)
+    is_24_7[gid] = not is_24_7.get(gid, False)
+    await ctx.send("🔄 24/7 mode enabled." if is_24_7[gid] else "🔄 24/7 mode disabled.")
+    if not is_24_7.get(gid) and not SONG_QUEUES.get(gid) and ctx.voice_client:
+        await check_for_inactivity(ctx.channel, bot, is_24_7.get(gid, False))
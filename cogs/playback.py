@@ -0,0 +1,467 @@
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+import discord
+
+import log_pipeline
+import main as core
+import metrics
+import tracing
+from circuit_breaker import CircuitOpenError
+from ffmpeg_supervisor import SupervisedSource
+from library import MediaLibrary
+from main import (
+    FFMPEG_STDERR,
+    SONG_QUEUES,
+    autoplay_mode,
+    bot,
+    current_songs,
+    ffmpeg_supervisor,
+    is_24_7,
+    loop_mode,
+    radio_stations,
+    radio_tasks,
+    resolving_guilds,
+    volume_settings,
+)
+from radio import RadioStation, related_query
+from track_queue import TrackQueue
+from cogs.extraction import (
+    RADIO_OPTS,
+    _stream_playlist,
+    _ytdlp_opts,
+    background_extract,
+    flat_candidates,
+    is_playlist_url,
+    resolve_query,
+    resolve_track,
+    search_ytdlp_async,
+)
+
+
+FFMPEG_MAX_RESTARTS = 2
+BATCH_PARALLELISM = 4
+SEEK_PRIME_TIMEOUT = 15
+# Bounds how long the player waits on discord.py's own reconnect before giving up the track.
+VOICE_CONNECT_TIMEOUT = float(os.getenv("VOICE_CONNECT_TIMEOUT", "20"))
+VOICE_RETRY_ATTEMPTS = 6
+VOICE_RETRY_BASE_DELAY = 0.5
+VOICE_RETRY_MAX_DELAY = 8
+
+
+def _engine(name):
+    # The player thread resolves the next step here instead of closing over it, so a
+    # track that was playing during a reload hands over to the reloaded code. While the
+    # reload is under way the module can be missing from sys.modules; then this copy runs.
+    return getattr(sys.modules.get(__name__), name, None) or globals()[name]
+
+
+async def check_for_inactivity(channel, bot, is_24_7_mode):
+    try:
+        if is_24_7_mode:
+            return
+        await asyncio.sleep(300) 
+        if (
+            channel.guild.voice_client
+            and not channel.guild.voice_client.is_playing()
+            and not channel.guild.voice_client.is_paused()
+            and not SONG_QUEUES.get(str(channel.guild.id))
+        ):
+            await channel.guild.voice_client.disconnect()
+            await channel.send("Disconnected due to inactivity.")
+    except Exception as e:
+        logging.error("Error in check_for_inactivity: %s", e)
+
+
+def throttled_message(error):
+    return f"⏳ YouTube is throttling requests right now. Try again in {error.retry_after:.0f}s."
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds or 0), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+# Resolves up to BATCH_PARALLELISM queries at once but appends strictly in the given
+# order: each track joins the queue as soon as it and everything before it resolved.
+async def enqueue_batch(queries, guild_id, voice_client, channel):
+    semaphore = asyncio.Semaphore(BATCH_PARALLELISM)
+
+    async def resolve(query):
+        if is_playlist_url(query):
+            return None
+        async with semaphore:
+            try:
+                return await resolve_query(query)
+            except CircuitOpenError:
+                return None
+
+    tasks = [asyncio.create_task(resolve(query)) for query in queries]
+    queue = SONG_QUEUES.setdefault(guild_id, TrackQueue())
+    added, failed = [], []
+    try:
+        for query, task in zip(queries, tasks):
+            entry = await task
+            if not entry:
+                failed.append(query)
+                continue
+            title = entry.get("title", "Untitled")
+            queue.append(entry["url"], title, entry.get("webpage_url"), entry.get("duration"))
+            added.append(title)
+            if not (voice_client.is_playing() or voice_client.is_paused()) and guild_id not in resolving_guilds:
+                await play_next_song(voice_client, guild_id, channel)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return added, failed
+
+
+async def import_playlist(url, guild_id, voice_client, channel):
+    loop = asyncio.get_running_loop()
+    batches = asyncio.Queue()
+    producer = loop.run_in_executor(None, _stream_playlist, url, loop, batches)
+    queue = SONG_QUEUES.setdefault(guild_id, TrackQueue())
+
+    added = 0
+    while True:
+        batch = await batches.get()
+        if batch is None:
+            break
+        for title, duration, page_url in batch:
+            queue.append_lazy(title, duration, page_url)
+        added += len(batch)
+        if not (voice_client.is_playing() or voice_client.is_paused()) and guild_id not in resolving_guilds:
+            await play_next_song(voice_client, guild_id, channel)
+
+    playlist_title = await producer
+    logging.info(
+        "Imported %d playlist entries into guild %s (queue %d entries, ~%d KiB)",
+        added,
+        guild_id,
+        len(queue),
+        queue.nbytes() // 1024,
+    )
+    return added, playlist_title or "playlist"
+
+
+async def refill_radio(guild_id, extract=background_extract):
+    station = radio_stations.get(guild_id)
+    if station is None or not station.seed:
+        return
+    page_url, title = station.seed
+    results = await extract(related_query(page_url, title), _ytdlp_opts(RADIO_OPTS))
+    added = station.offer((title, duration, url) for title, duration, url, _ in flat_candidates(results))
+    logging.info("Autoplay buffered %d related tracks (%d ready)", added, len(station))
+
+
+async def radio_worker(guild_id):
+    try:
+        # Autoplay may have been turned off, or the bot disconnected, before this ran.
+        station = radio_stations.get(guild_id)
+        if station is None:
+            return
+        if station.needs_refill():
+            await refill_radio(guild_id)
+        # The user queue is empty, so the head of the buffer plays next: resolve it now.
+        track = station.peek()
+        if track and not track.url and not SONG_QUEUES.get(guild_id):
+            results = await background_extract(track.page_url, _ytdlp_opts())
+            if results and results.get("url"):
+                station.prefetched(track, results["url"])
+    except CircuitOpenError:
+        pass
+    except Exception as e:
+        logging.error("Autoplay prefetch failed: %s", e)
+    finally:
+        if radio_tasks.get(guild_id) is asyncio.current_task():
+            del radio_tasks[guild_id]
+
+
+def schedule_radio(guild_id):
+    task = radio_tasks.get(guild_id)
+    if task is None or task.done():
+        radio_tasks[guild_id] = asyncio.create_task(radio_worker(guild_id))
+
+
+async def next_radio_track(guild_id):
+    station = radio_stations.get(guild_id)
+    if station is None:
+        return None
+    if not station.buffer:
+        # The prefetch fell behind and playback is waiting, so this one runs at normal priority.
+        try:
+            await refill_radio(guild_id, extract=search_ytdlp_async)
+        except CircuitOpenError:
+            return None
+    return station.pop()
+
+
+def toggle_autoplay(gid):
+    autoplay_mode[gid] = not autoplay_mode.get(gid, False)
+    if not autoplay_mode[gid]:
+        radio_stations.pop(gid, None)
+        return "➡️ Autoplay disabled."
+    # Seed from the song already playing so the buffer is ready before the queue ends.
+    current = current_songs.get(gid)
+    if current:
+        radio_stations.setdefault(gid, RadioStation()).played(current.get("page_url"), current["title"])
+        schedule_radio(gid)
+        return "📻 Autoplay enabled: related songs will play when the queue runs out."
+    return "📻 Autoplay enabled: related songs will follow the next song you play."
+
+
+async def pop_playable_track(guild_id, channel):
+    queue = SONG_QUEUES.get(guild_id)
+    notified = False
+    while True:
+        if queue:
+            track = queue.popleft()
+        elif autoplay_mode.get(guild_id):
+            track = await next_radio_track(guild_id)
+            if track is None:
+                return None
+        else:
+            return None
+        while True:
+            try:
+                audio_url = await resolve_track(track)
+                break
+            except CircuitOpenError as e:
+                if not notified:
+                    await channel.send(throttled_message(e))
+                    notified = True
+                await asyncio.sleep(e.retry_after)
+        if audio_url:
+            return audio_url, track.title, track.page_url, track.duration
+        await channel.send(f"⚠️ Skipping **{track.title}**: could not load it.")
+
+
+# Returns (source, process) for a stream URL or library file, seeking on the input side
+# so FFmpeg skips straight to start_at instead of decoding everything before it.
+def open_source(audio_url, volume, start_at=0.0):
+    local_file = core.media_library.files.get(audio_url) if core.media_library else None
+    if local_file:
+        before_options = "-nostdin -hide_banner"
+    else:
+        before_options = "-nostdin -hide_banner -reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 20"
+    if start_at:
+        before_options += f" -ss {start_at:.2f}"
+    ffmpeg_options = {"before_options": before_options, "options": "-vn"}
+    if core.audio_pool:
+        return core.audio_pool.open_stream(audio_url, volume=volume, **ffmpeg_options), None
+    if local_file and volume == 1.0 and MediaLibrary.passthrough(local_file):
+        # Opus files are remuxed, not decoded and re-encoded; volume then
+        # only takes effect from the next track.
+        base_audio = discord.FFmpegOpusAudio(
+            audio_url,
+            codec="copy",
+            **ffmpeg_options,
+            executable=core.FFMPEG_EXECUTABLE,
+            stderr=FFMPEG_STDERR,
+        )
+        return base_audio, base_audio._process
+    base_audio = discord.FFmpegPCMAudio(
+        audio_url,
+        **ffmpeg_options,
+        executable=core.FFMPEG_EXECUTABLE,
+        stderr=FFMPEG_STDERR,
+    )
+    return discord.PCMVolumeTransformer(base_audio, volume=volume), base_audio._process
+
+
+# resolving_guilds holds a guild from the moment its next track is due until the player
+# has it, so /play never starts a second play_next_song across the awaits in between.
+async def play_next_song(voice_client, guild_id, channel, resume_at=0.0, voice_resume=False):
+    log_pipeline.set_guild(guild_id)
+    resolving_guilds.add(guild_id)
+    with tracing.span_or_trace("play_next_song", guild_id) as span:
+        source = None
+        try:
+            current = current_songs.get(guild_id)
+            # Voice reconnects are not the pipe's fault and do not count against its restarts.
+            if resume_at and current and (voice_resume or current.get("restarts", 0) < FFMPEG_MAX_RESTARTS):
+                if not voice_resume:
+                    current["restarts"] = current.get("restarts", 0) + 1
+                audio_url, title = current["url"], current["title"]
+            elif loop_mode.get(guild_id, False) and current:
+                resume_at = 0.0
+                audio_url, title = current["url"], current["title"]
+            else:
+                next_track = await pop_playable_track(guild_id, channel)
+                if next_track is None:
+                    current_songs.pop(guild_id, None)
+                    resolving_guilds.discard(guild_id)
+                    await check_for_inactivity(channel, bot, is_24_7.get(guild_id, False))
+                    return
+                resume_at = 0.0
+                audio_url, title, page_url, duration = next_track
+                current_songs[guild_id] = {"url": audio_url, "title": title, "page_url": page_url, "duration": duration}
+                if page_url:
+                    core.title_index.record(title, page_url)
+                if autoplay_mode.get(guild_id):
+                    radio_stations.setdefault(guild_id, RadioStation()).played(page_url, title)
+                    schedule_radio(guild_id)
+
+            with tracing.span("ffmpeg.admit", waiting=ffmpeg_supervisor.waiting):
+                await ffmpeg_supervisor.admit()
+            if not voice_client.is_connected():
+                ffmpeg_supervisor.release_slot()
+                return
+            try:
+                with tracing.span("ffmpeg.spawn", workers=bool(core.audio_pool)):
+                    inner, process = open_source(audio_url, volume_settings.get(guild_id, 1.0), resume_at)
+            except Exception:
+                ffmpeg_supervisor.release_slot()
+                raise
+            source = ffmpeg_supervisor.track(guild_id, voice_client, inner, process, start_at=resume_at)
+
+            def after_play(error):
+                if error:
+                    logging.error("Error playing %s: %s", title, error, extra={"guild_id": guild_id})
+                metrics.TRACK_TRANSITIONS.record()
+                # Claimed here on the player thread: is_playing() is already False.
+                resolving_guilds.add(guild_id)
+                # discord.py gave up on a dropped connection. A skip leaves us connected, and
+                # /disconnect or a kick clears current_songs or our voice state first.
+                if (
+                    not voice_client.is_connected()
+                    and guild_id in current_songs
+                    and channel.guild.me.voice is not None
+                ):
+                    asyncio.run_coroutine_threadsafe(
+                        _engine("recover_voice")(voice_client, guild_id, channel, source.position), bot.loop
+                    )
+                    return
+                # A pipe restarted before its first frame still resumes rather than skipping.
+                resume = max(source.position, 0.01) if source.restart_reason else 0.0
+                asyncio.run_coroutine_threadsafe(
+                    _engine("play_next_song")(voice_client, guild_id, channel, resume), bot.loop
+                )
+
+            tracing.trace_first_read(source, span)
+            voice_client.play(source, after=after_play)
+            if not resume_at:
+                await channel.send(f"🎶 Now playing: **{title}**")
+        except asyncio.CancelledError:
+            logging.info("Playback task cancelled.")
+            return
+        except Exception as e:
+            logging.error("Error in play_next_song: %s", e)
+            if source is not None and voice_client.source is not source:
+                source.cleanup()
+            await channel.send("An error occurred while playing the next song.")
+        finally:
+            resolving_guilds.discard(guild_id)
+
+
+# Rejoins after a voice connection discord.py could not recover, then restarts the
+# same track from the frame it stopped at. The guild stays in resolving_guilds
+# throughout, so /play queues behind the reconnect instead of starting playback.
+async def recover_voice(voice_client, guild_id, channel, position):
+    log_pipeline.set_guild(guild_id)
+    voice_channel = voice_client.channel
+    started = time.perf_counter()
+    logging.warning("Voice connection lost at %s, reconnecting", format_duration(position))
+    new_client = None
+    for attempt in range(VOICE_RETRY_ATTEMPTS):
+        await asyncio.sleep(voice_retry_delay(attempt))
+        if guild_id not in current_songs:
+            resolving_guilds.discard(guild_id)
+            return
+        existing = voice_channel.guild.voice_client
+        try:
+            if existing is not None and existing.is_connected():
+                new_client = existing
+            else:
+                if existing is not None:
+                    await existing.disconnect(force=True)
+                new_client = await voice_channel.connect(timeout=VOICE_CONNECT_TIMEOUT, reconnect=True)
+            break
+        except (discord.errors.ConnectionClosed, discord.ClientException, asyncio.TimeoutError) as e:
+            logging.warning("Voice reconnect attempt %d/%d failed: %r", attempt + 1, VOICE_RETRY_ATTEMPTS, e)
+
+    elapsed = time.perf_counter() - started
+    if new_client is None:
+        metrics.VOICE_RECONNECTS.inc("failed")
+        current_songs.pop(guild_id, None)
+        resolving_guilds.discard(guild_id)
+        logging.error("Gave up reconnecting to voice after %.1fs", elapsed)
+        return await channel.send("⚠️ Lost the voice connection and could not get it back. Use /play to start again.")
+
+    metrics.VOICE_RECONNECTS.inc("resumed")
+    metrics.VOICE_RECONNECT_SECONDS.observe(elapsed)
+    logging.info("Voice reconnected in %.1fs, resuming at %s", elapsed, format_duration(position))
+    await play_next_song(new_client, guild_id, channel, resume_at=max(position, 0.01), voice_resume=True)
+
+
+def voice_retry_delay(attempt):
+    return min(VOICE_RETRY_MAX_DELAY, VOICE_RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+async def connect_to_voice(voice_channel, voice_client):
+    with tracing.span("voice.connect") as span:
+        max_retries = VOICE_RETRY_ATTEMPTS
+        for attempt in range(max_retries):
+            span.set("attempts", attempt + 1)
+            try:
+                if voice_client is None:
+                    voice_client = await voice_channel.connect(timeout=VOICE_CONNECT_TIMEOUT, reconnect=True)
+                elif voice_channel != voice_client.channel:
+                    await voice_client.move_to(voice_channel)
+                return voice_client
+            except (discord.errors.ConnectionClosed, asyncio.TimeoutError) as e:
+                logging.error("Voice connect failed (attempt %s/%s): %r", attempt + 1, max_retries, e)
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(voice_retry_delay(attempt))
+                else:
+                    raise
+            except Exception as e:
+                logging.error("Join error (attempt %s/%s): %s", attempt + 1, max_retries, e)
+                raise
+
+
+# Opens a second pipe on the same resolved URL (or library file) with input-side -ss and
+# reads its first frame before handing it to the playing source, which switches over on
+# its next read. The old pipe plays until that moment, so there is no gap, and nothing
+# is extracted again.
+async def seek_current(guild, target):
+    guild_id = str(guild.id)
+    vc = guild.voice_client
+    current = current_songs.get(guild_id)
+    if not vc or not (vc.is_playing() or vc.is_paused()) or not current or not isinstance(vc.source, SupervisedSource):
+        return "Nothing is currently playing."
+    source = vc.source
+    duration = current.get("duration")
+    target = max(0.0, target)
+    if duration and target >= duration:
+        return f"That is past the end of the track ({format_duration(duration)})."
+
+    # The seek pipe runs alongside the playing one until it takes over, so it needs a slot
+    # of its own; the source gives one back when the old pipe is gone.
+    await ffmpeg_supervisor.admit()
+    try:
+        inner, process = open_source(current["url"], volume_settings.get(guild_id, 1.0), target)
+    except Exception as e:
+        ffmpeg_supervisor.release_slot()
+        logging.error("Could not open a seek pipe: %s", e)
+        return "❌ Could not seek in this track."
+    try:
+        first_frame = await asyncio.wait_for(asyncio.to_thread(inner.read), SEEK_PRIME_TIMEOUT)
+    except asyncio.TimeoutError:
+        first_frame = None
+    if not first_frame or not source.swap(inner, process, target, first_frame):
+        # Cleanup also unblocks a read still waiting after the timeout.
+        inner.cleanup()
+        ffmpeg_supervisor.release_slot()
+        return "❌ Could not seek in this track."
+    return f"⏩ Jumped to {format_duration(target)}" + (f" of {format_duration(duration)}." if duration else ".")
+
+
+def current_position(guild):
+    source = guild.voice_client.source if guild.voice_client else None
+    return source.position if isinstance(source, SupervisedSource) else 0.0
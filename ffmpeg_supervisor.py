@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import discord
+
+import metrics
+
+
+FRAME_LENGTH = 0.02
+CPU_STRIKES = 3
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def read_proc_usage(pid):
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            fields = f.read().rpartition(b")")[2].split()
+        with open(f"/proc/{pid}/statm", "rb") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None, None
+    return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS, rss_pages * _PAGE_SIZE
+
+
+# Outermost source handed to voice_client.play(). read() runs on the player thread
+# and only bumps two attributes; all checks happen in the supervisor's sampling task.
+class SupervisedSource(discord.AudioSource):
+    def __init__(self, supervisor, guild_id, voice_client, source, process=None, start_at=0.0):
+        self.guild_id = guild_id
+        self.voice_client = voice_client
+        self.source = source
+        self.process = process
+        self.start_at = start_at
+        self.frames = 0
+        self.last_frame = time.monotonic()
+        self.restart_reason = None
+        self.cpu_percent = None
+        self.rss = None
+        self._supervisor = supervisor
+        self._cpu_sample = None
+        self._cpu_strikes = 0
+        self._released = False
+        self._swap = None
+        self._swap_lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def volume(self):
+        return self.source.volume
+
+    @volume.setter
+    def volume(self, value):
+        self.source.volume = value
+
+    @property
+    def position(self):
+        return self.start_at + self.frames * FRAME_LENGTH
+
+    def is_opus(self):
+        return self.source.is_opus()
+
+    # Copied Opus straight from the file, so there is no PCM stage to apply volume to.
+    # Worker streams are Opus too but scale volume before they encode.
+    @property
+    def passthrough(self):
+        return isinstance(self.source, discord.FFmpegOpusAudio)
+
+    # Queues a primed replacement pipe (its first frame already read) that takes over on
+    # the player thread's next read(), so the old pipe keeps playing until then.
+    # Returns False if the track already ended.
+    def swap(self, source, process, start_at, first_frame):
+        with self._swap_lock:
+            if self._closed:
+                return False
+            replaced, self._swap = self._swap, (source, process, start_at, first_frame)
+        # A second seek before the first took over: the first pipe never plays.
+        if replaced:
+            self._retire(replaced[0])
+        return True
+
+    # Every pipe but the one a source ends on was admitted for a seek, and gives its
+    # slot back once it is gone.
+    def _retire(self, source):
+        source.cleanup()
+        self._supervisor.release_seek_slot()
+
+    def read(self):
+        if self._swap is not None:
+            with self._swap_lock:
+                old = self.source
+                self.source, self.process, self.start_at, data = self._swap
+                self._swap = None
+                self.frames = 0
+                self._cpu_sample = None
+                self._cpu_strikes = 0
+            # Killing and reaping the old FFmpeg can take a while; keep it off the 20 ms clock.
+            threading.Thread(target=self._retire, args=(old,), name="ffmpeg-swap-cleanup", daemon=True).start()
+        else:
+            data = self.source.read()
+        if data:
+            self.frames += 1
+            self.last_frame = time.monotonic()
+        return data
+
+    def cleanup(self):
+        with self._swap_lock:
+            self._closed = True
+            pending, self._swap = self._swap, None
+        if pending:
+            self._retire(pending[0])
+        self.source.cleanup()
+        self._supervisor.release(self)
+
+
+class FFmpegSupervisor:
+    def __init__(self, max_processes=0, cpu_limit=0, rss_limit=0, stall_timeout=30, interval=5):
+        self.max_processes = max_processes
+        self.cpu_limit = cpu_limit
+        self.rss_limit = rss_limit
+        self.stall_timeout = stall_timeout
+        self.interval = interval
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(max_processes) if max_processes else None
+        self._active = set()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._task = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run())
+
+    async def admit(self):
+        self._loop = self._loop or asyncio.get_running_loop()
+        if self._slots is None:
+            return
+        if self._slots.locked():
+            self.waiting += 1
+            started = time.perf_counter()
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+            logging.info(
+                "Waited %.1fs for an FFmpeg slot (%d allowed)", time.perf_counter() - started, self.max_processes
+            )
+        else:
+            await self._slots.acquire()
+
+    def release_slot(self):
+        # Only for an admitted spawn that never produced a SupervisedSource.
+        if self._slots is not None:
+            self._slots.release()
+
+    # Safe from any thread, like release().
+    def release_seek_slot(self):
+        if self._slots is not None:
+            self._loop.call_soon_threadsafe(self._slots.release)
+
+    def track(self, guild_id, voice_client, source, process=None, start_at=0.0):
+        supervised = SupervisedSource(self, guild_id, voice_client, source, process, start_at)
+        with self._lock:
+            self._active.add(supervised)
+        return supervised
+
+    def release(self, supervised):
+        with self._lock:
+            if supervised._released:
+                return
+            supervised._released = True
+            self._active.discard(supervised)
+        if self._slots is not None:
+            self._loop.call_soon_threadsafe(self._slots.release)
+
+    def active_count(self):
+        return len(self._active)
+
+    def usage(self):
+        per_guild = {}
+        for supervised in list(self._active):
+            entry = per_guild.setdefault(supervised.guild_id, {"processes": 0, "cpu_percent": 0.0, "rss": 0})
+            entry["processes"] += 1
+            entry["cpu_percent"] += supervised.cpu_percent or 0.0
+            entry["rss"] += supervised.rss or 0
+        return per_guild
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                active = list(self._active)
+                samples = await asyncio.to_thread(self._sample, active)
+                self._enforce(samples)
+            except Exception as e:
+                logging.error("FFmpeg supervisor sampling failed: %s", e)
+
+    @staticmethod
+    def _sample(active):
+        now = time.monotonic()
+        return [
+            (supervised, now, *read_proc_usage(supervised.process.pid))
+            if supervised.process is not None
+            else (supervised, now, None, None)
+            for supervised in active
+        ]
+
+    def _enforce(self, samples):
+        for supervised, now, cpu_seconds, rss in samples:
+            if supervised._released or supervised.restart_reason:
+                continue
+            if cpu_seconds is not None:
+                if supervised._cpu_sample is not None:
+                    previous_cpu, previous_at = supervised._cpu_sample
+                    supervised.cpu_percent = 100 * (cpu_seconds - previous_cpu) / max(now - previous_at, 1e-6)
+                supervised._cpu_sample = (cpu_seconds, now)
+                supervised.rss = rss
+
+            if supervised.voice_client.is_paused():
+                supervised.last_frame = now
+            elif now - supervised.last_frame > self.stall_timeout:
+                self.restart(supervised, "stalled")
+                continue
+
+            if self.rss_limit and rss is not None and rss > self.rss_limit:
+                self.restart(supervised, "rss")
+                continue
+            if self.cpu_limit and supervised.cpu_percent is not None:
+                if supervised.cpu_percent > self.cpu_limit:
+                    supervised._cpu_strikes += 1
+                else:
+                    supervised._cpu_strikes = 0
+                if supervised._cpu_strikes >= CPU_STRIKES:
+                    self.restart(supervised, "cpu")
+
+    def restart(self, supervised, reason):
+        logging.warning(
+            "Restarting FFmpeg for guild %s (%s): cpu %s%%, rss %s MB, %.0fs since last frame",
+            supervised.guild_id,
+            reason,
+            None if supervised.cpu_percent is None else round(supervised.cpu_percent),
+            None if supervised.rss is None else round(supervised.rss / 1048576, 1),
+            time.monotonic() - supervised.last_frame,
+        )
+        metrics.FFMPEG_RESTARTS.inc(reason)
+        supervised.restart_reason = reason
+        # Killing the process unblocks a read() stuck on its stdout; the player then
+        # ends the track and the after callback resumes it from supervised.position.
+        if supervised.process is not None:
+            try:
+                supervised.process.kill()
+            except OSError:
+                pass
+        elif supervised.voice_client.source is supervised:
+            supervised.voice_client.stop()
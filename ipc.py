@@ -0,0 +1,178 @@
+import asyncio
+import hmac
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+
+IPC_HOST = "127.0.0.1"
+IPC_DEFAULT_PORT = 28512
+CACHE_MAX_ENTRIES = 10000
+REQUEST_TIMEOUT = 1.0
+
+
+# Where Unix domain sockets exist, an address with a "/" is a socket path and the port
+# is None; anything else is host:port over loopback TCP.
+def parse_address(address):
+    if os.name != "nt" and "/" in (address or ""):
+        return address, None
+    host, _, port = (address or "").rpartition(":")
+    return host or IPC_HOST, int(port or IPC_DEFAULT_PORT)
+
+
+class TTLCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        return value
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set(self, key, value, ttl=3600):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# Every connection must open with the secret the supervisor hands to its clusters, so
+# no other local process can read or poison the shared cache.
+class IPCServer:
+    def __init__(self, host=IPC_HOST, port=IPC_DEFAULT_PORT, secret=""):
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.cluster_stats = {}
+        self._cache = TTLCache()
+        self._server = None
+
+    async def start(self):
+        if self.port is None:
+            self._server = await asyncio.start_unix_server(self._handle_client, self.host)
+            os.chmod(self.host, 0o600)
+            logging.info("IPC hub listening on %s", self.host)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+            logging.info("IPC hub listening on %s:%d", self.host, self.port)
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def forget_cluster(self, cluster_id):
+        self.cluster_stats.pop(str(cluster_id), None)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            try:
+                hello = json.loads(await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT))
+            except (asyncio.TimeoutError, ValueError):
+                hello = None
+            if not isinstance(hello, dict) or not hmac.compare_digest(str(hello.get("secret", "")), self.secret):
+                logging.warning("IPC hub rejected a connection without the cluster secret.")
+                return
+            writer.write(b'{"ok": true}\n')
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    response = self._dispatch(request)
+                except Exception as e:
+                    request, response = {}, {"error": f"{type(e).__name__}: {e}"}
+                response["id"] = request.get("id")
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _dispatch(self, request):
+        op = request.get("op")
+        if op == "push_stats":
+            stats = request["stats"]
+            stats["updated"] = time.time()
+            self.cluster_stats[str(stats["cluster_id"])] = stats
+            return {"ok": True}
+        if op == "stats":
+            return {"clusters": list(self.cluster_stats.values())}
+        if op == "cache_get":
+            return {"value": self._cache.get(request["key"])}
+        if op == "cache_set":
+            self._cache.set(request["key"], request["value"], ttl=request.get("ttl", 3600))
+            return {"ok": True}
+        return {"error": f"unknown op: {op}"}
+
+
+class IPCClient:
+    def __init__(self, address, secret=""):
+        self.host, self.port = parse_address(address)
+        self.secret = secret
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+        self._next_id = 0
+
+    async def request(self, op, **payload):
+        async with self._lock:
+            try:
+                if self._writer is None or self._writer.is_closing():
+                    await self._connect()
+                self._next_id += 1
+                payload.update(op=op, id=self._next_id)
+                self._writer.write(json.dumps(payload).encode() + b"\n")
+                await self._writer.drain()
+                line = await asyncio.wait_for(self._reader.readline(), REQUEST_TIMEOUT)
+                if not line:
+                    raise ConnectionError("IPC hub closed the connection")
+                return json.loads(line)
+            except (OSError, asyncio.TimeoutError, ValueError) as e:
+                logging.warning("IPC request %s failed: %s", op, e)
+                self._close()
+                return None
+
+    async def _connect(self):
+        if self.port is None:
+            connecting = asyncio.open_unix_connection(self.host)
+        else:
+            connecting = asyncio.open_connection(self.host, self.port)
+        self._reader, self._writer = await asyncio.wait_for(connecting, REQUEST_TIMEOUT)
+        self._writer.write(json.dumps({"secret": self.secret}).encode() + b"\n")
+        await self._writer.drain()
+        if not await asyncio.wait_for(self._reader.readline(), REQUEST_TIMEOUT):
+            raise ConnectionError("IPC hub rejected the cluster secret")
+
+    def _close(self):
+        if self._writer:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def push_stats(self, stats):
+        await self.request("push_stats", stats=stats)
+
+    async def cluster_stats(self):
+        response = await self.request("stats")
+        return response["clusters"] if response else None
+
+    async def cache_get(self, key):
+        response = await self.request("cache_get", key=key)
+        return response.get("value") if response else None
+
+    async def cache_set(self, key, value, ttl=3600):
+        await self.request("cache_set", key=key, value=value, ttl=ttl)
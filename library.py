@@ -0,0 +1,237 @@
+import bisect
+import heapq
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from title_index import save_snapshot
+
+
+AUDIO_EXTENSIONS = frozenset((".mp3", ".flac", ".ogg", ".opus", ".oga", ".m4a", ".aac", ".wav", ".webm", ".mka", ".wma"))
+# Containers FFmpeg can copy an Opus stream out of into the Ogg pages discord.py sends.
+PASSTHROUGH_EXTENSIONS = frozenset((".ogg", ".opus", ".oga", ".webm", ".mka"))
+PROBE_WORKERS = 4
+PROBE_TIMEOUT = 15
+INDEX_VERSION = 1
+# Files one query word may match; a one-letter prefix can otherwise match the whole library.
+MATCH_LIMIT = 2000
+
+LibraryFile = namedtuple("LibraryFile", ("path", "mtime_ns", "size", "duration", "codec", "title", "artist", "album"))
+# files: path -> LibraryFile; words: sorted keys of postings (word -> paths);
+# tokens: path -> (title and artist words, every word).
+_Index = namedtuple("_Index", ("files", "words", "postings", "tokens"))
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokens(text):
+    return _TOKEN.findall((text or "").casefold())
+
+
+def resolve_ffprobe(ffmpeg_executable=None):
+    if ffmpeg_executable:
+        sibling = os.path.join(os.path.dirname(ffmpeg_executable), "ffprobe" + (".exe" if os.name == "nt" else ""))
+        if os.path.isfile(sibling):
+            return sibling
+    return shutil.which("ffprobe")
+
+
+def probe(ffprobe, path):
+    # Returns (duration, codec, tags); a file ffprobe cannot read still gets indexed by name.
+    if not ffprobe:
+        return 0, None, {}
+    try:
+        completed = subprocess.run(
+            [
+                ffprobe, "-v", "error", "-select_streams", "a:0",
+                "-show_entries", "format=duration:format_tags:stream=codec_name:stream_tags",
+                "-of", "json", path,
+            ],
+            capture_output=True,
+            timeout=PROBE_TIMEOUT,
+            check=False,
+        )
+        info = json.loads(completed.stdout or b"{}")
+    except (OSError, subprocess.TimeoutExpired, ValueError) as e:
+        logging.warning("Could not probe %s: %s", path, e)
+        return 0, None, {}
+    streams = info.get("streams") or [{}]
+    fmt = info.get("format") or {}
+    # Ogg/Opus keeps its tags on the stream, most other containers on the format.
+    tags = {key.casefold(): value for key, value in {**(streams[0].get("tags") or {}), **(fmt.get("tags") or {})}.items()}
+    try:
+        duration = int(float(fmt.get("duration") or 0))
+    except ValueError:
+        duration = 0
+    return duration, streams[0].get("codec_name"), tags
+
+
+def describe(file):
+    return f"{file.artist} - {file.title}" if file.artist else file.title
+
+
+# Audio files under the configured directories. A scan only probes files whose mtime
+# or size changed since the last one; the result is kept on disk as one JSON document
+# with paths grouped by directory, and in memory as an inverted index over the words
+# of each file's title, artist and album.
+class MediaLibrary:
+    def __init__(self, roots, index_path, ffprobe=None):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.index_path = index_path
+        self.ffprobe = ffprobe
+        self._index = _Index({}, [], {}, {})
+
+    @property
+    def files(self):
+        return self._index.files
+
+    def __len__(self):
+        return len(self.files)
+
+    def load(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning("Could not load media index from %s: %s", self.index_path, e)
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        dirs = data["dirs"]
+        files = {}
+        for dir_index, name, mtime_ns, size, duration, codec, title, artist, album in data["files"]:
+            path = os.path.join(dirs[dir_index], name)
+            files[path] = LibraryFile(path, mtime_ns, size, duration, codec, title, artist, album)
+        self._rebuild(files)
+
+    def save(self):
+        dirs = {}
+        rows = []
+        for file in self.files.values():
+            directory, name = os.path.split(file.path)
+            dir_index = dirs.setdefault(directory, len(dirs))
+            rows.append([dir_index, name, *file[1:]])
+        save_snapshot(self.index_path, {"version": INDEX_VERSION, "dirs": list(dirs), "files": rows})
+
+    # Blocking: walks every root and probes new or changed files. Returns
+    # (probed, removed) and swaps in the new index only when the walk is done.
+    def scan(self):
+        started = time.perf_counter()
+        seen = {}
+        changed = []
+        for root in self.roots:
+            for path, stat in self._walk(root):
+                known = self.files.get(path)
+                if known and known.mtime_ns == stat.st_mtime_ns and known.size == stat.st_size:
+                    seen[path] = known
+                else:
+                    changed.append((path, stat))
+
+        with ThreadPoolExecutor(PROBE_WORKERS, thread_name_prefix="library-probe") as pool:
+            for (path, stat), (duration, codec, tags) in zip(
+                changed, pool.map(lambda item: probe(self.ffprobe, item[0]), changed)
+            ):
+                seen[path] = LibraryFile(
+                    path,
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                    duration,
+                    codec,
+                    tags.get("title") or os.path.splitext(os.path.basename(path))[0],
+                    tags.get("artist") or tags.get("album_artist"),
+                    tags.get("album"),
+                )
+
+        removed = len(self.files.keys() - seen.keys())
+        if changed or removed:
+            self._rebuild(seen)
+            self.save()
+        logging.info(
+            "Scanned media library: %d files, %d probed, %d removed in %.1fs",
+            len(seen),
+            len(changed),
+            removed,
+            time.perf_counter() - started,
+        )
+        return len(changed), removed
+
+    def _walk(self, root):
+        try:
+            entries = list(os.scandir(root))
+        except OSError as e:
+            logging.warning("Cannot read media directory %s: %s", root, e)
+            return
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self._walk(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in AUDIO_EXTENSIONS:
+                    yield entry.path, entry.stat()
+            except OSError:
+                continue
+
+    def _rebuild(self, files):
+        postings = {}
+        file_tokens = {}
+        for path, file in files.items():
+            named = frozenset(tokens(f"{file.title} {file.artist or ''}"))
+            every = named.union(tokens(file.album))
+            file_tokens[path] = (named, every)
+            for word in every:
+                postings.setdefault(word, []).append(path)
+        # One attribute store, so a search in another thread sees either the old index or
+        # the new one, never parts of both.
+        self._index = _Index(files, sorted(postings), postings, file_tokens)
+
+    # The exact word sorts first, so its files are always taken before longer words'.
+    def _matching(self, words, postings, word):
+        matched = set()
+        position = bisect.bisect_left(words, word)
+        while position < len(words) and words[position].startswith(word) and len(matched) < MATCH_LIMIT:
+            matched.update(postings[words[position]][:MATCH_LIMIT - len(matched)])
+            position += 1
+        return matched
+
+    # Every query word must be a prefix of some word in the title, artist or album.
+    # Files whose title and artist account for more of the query come first.
+    # Candidates are the smallest word's matches; words that hit MATCH_LIMIT are checked
+    # against each candidate's words instead of intersected. Only when every word hits
+    # the limit can a match outside those candidates be missed.
+    def search(self, query, limit=10):
+        query_words = set(tokens(query))
+        if not query_words:
+            return []
+        files, words, postings, file_tokens = self._index
+        matches = sorted(
+            ((self._matching(words, postings, word), word) for word in query_words),
+            key=lambda match: len(match[0]),
+        )
+        matched, rest = matches[0][0], []
+        for other, word in matches[1:]:
+            if len(other) < MATCH_LIMIT:
+                matched &= other
+            else:
+                rest.append(word)
+        if rest:
+            matched = [
+                path for path in matched
+                if all(any(word.startswith(prefix) for word in file_tokens[path][1]) for prefix in rest)
+            ]
+
+        def rank(path):
+            named = file_tokens[path][0]
+            return (-len(query_words & named), len(named), path)
+
+        return [files[path] for path in heapq.nsmallest(limit, matched, key=rank)]
+
+    @staticmethod
+    def passthrough(file):
+        return file.codec == "opus" and os.path.splitext(file.path)[1].lower() in PASSTHROUGH_EXTENSIONS
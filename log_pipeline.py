@@ -0,0 +1,196 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+QUEUE_SIZE = 10000
+RATE_WINDOW = 30.0
+RATE_BURST = 5
+
+guild_context = contextvars.ContextVar("eva_log_guild_id", default=None)
+_STOP = object()
+
+
+def set_guild(guild_id):
+    guild_context.set(None if guild_id is None else str(guild_id))
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.guild_id is not None:
+            entry["guild_id"] = str(record.guild_id)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        if record.guild_id is not None:
+            line += f" [guild {record.guild_id}]"
+        return line
+
+
+# Keyed by call site and unformatted %-style template rather than rendered text, so
+# messages that differ only in their arguments count as repeats of one another, while
+# different messages logged from one shared call site are limited separately.
+class RateLimiter:
+    def __init__(self, window=RATE_WINDOW, burst=RATE_BURST):
+        self.window = window
+        self.burst = burst
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def allow(self, record):
+        key = (record.pathname, record.lineno, record.msg if isinstance(record.msg, str) else None)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                self._sites[key] = [record.created, 1, 0, record]
+                return True
+            site[1] += 1
+            if site[1] <= self.burst:
+                return True
+            site[2] += 1
+            site[3] = record
+            return False
+
+    def expire(self, now):
+        expired = []
+        with self._lock:
+            for key, site in list(self._sites.items()):
+                if now - site[0] >= self.window:
+                    del self._sites[key]
+                    if site[2]:
+                        expired.append((site[2], site[3]))
+        return expired
+
+
+# Runs on whatever thread logged. Does no formatting; it tags the record with the
+# guild from the current context and hands it to the writer thread.
+class QueueHandler(logging.Handler):
+    def __init__(self, records, limiter):
+        super().__init__()
+        self.records = records
+        self.limiter = limiter
+        self.dropped = 0
+
+    def handle(self, record):
+        if not self.filter(record):
+            return False
+        if not hasattr(record, "guild_id"):
+            record.guild_id = guild_context.get()
+        if record.levelno >= logging.WARNING and not self.limiter.allow(record):
+            return False
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        return True
+
+    def emit(self, record):
+        self.handle(record)
+
+
+class LogWriter(threading.Thread):
+    def __init__(self, records, handler, formatter, stream):
+        super().__init__(name="log-writer", daemon=True)
+        self.records = records
+        self.handler = handler
+        self.formatter = formatter
+        self.stream = stream
+
+    def run(self):
+        next_sweep = time.time() + self.handler.limiter.window
+        while True:
+            try:
+                record = self.records.get(timeout=1.0)
+            except queue.Empty:
+                record = None
+            if record is _STOP:
+                self._sweep(float("inf"))
+                self.stream.flush()
+                return
+            if record is not None:
+                self._write(record)
+
+            now = time.time()
+            if now >= next_sweep:
+                self._sweep(now)
+                next_sweep = now + self.handler.limiter.window
+            if self.records.empty():
+                self.stream.flush()
+
+    def _sweep(self, now):
+        for count, record in self.handler.limiter.expire(now):
+            summary = logging.makeLogRecord(
+                {
+                    "name": record.name,
+                    "levelno": record.levelno,
+                    "levelname": record.levelname,
+                    "msg": "Suppressed %d repeats of: %s",
+                    "args": (count, record.getMessage()),
+                    "guild_id": record.guild_id,
+                }
+            )
+            self._write(summary)
+        if self.handler.dropped:
+            dropped, self.handler.dropped = self.handler.dropped, 0
+            self._write(
+                logging.makeLogRecord(
+                    {
+                        "levelno": logging.WARNING,
+                        "levelname": "WARNING",
+                        "msg": "Log queue full, dropped %d records",
+                        "args": (dropped,),
+                        "guild_id": None,
+                    }
+                )
+            )
+
+    def _write(self, record):
+        try:
+            self.stream.write(self.formatter.format(record) + "\n")
+        except Exception:
+            pass
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    records = queue.Queue(QUEUE_SIZE)
+    handler = QueueHandler(records, RateLimiter())
+    formatter = JSONFormatter() if fmt == "json" else TextFormatter()
+    writer = LogWriter(records, handler, formatter, stream or sys.stderr)
+    writer.start()
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    def stop():
+        records.put(_STOP)
+        writer.join(2)
+
+    atexit.register(stop)
+    return handler
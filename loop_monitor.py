@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STACK_DEPTH = 12
+
+
+# Heartbeat callback on the event loop plus a watcher thread. When the heartbeat stops
+# for longer than the threshold, the watcher samples the loop thread's stack while it
+# is still blocked and charges the stall to the innermost bot function on that stack.
+# Every heartbeat's lag is also passed to on_lag, so other consumers (the metrics
+# histogram) share this sampler instead of running their own.
+class LoopWatchdog:
+    def __init__(self, threshold=0.1, interval=0.05, top_n=10, on_lag=None):
+        self.threshold = threshold
+        self.interval = interval
+        self.top_n = top_n
+        self.on_lag = on_lag
+        self.lags = deque(maxlen=int(60 / interval))
+        self.stalls = 0
+        self.slowest = {}
+        self._loop = None
+        self._loop_thread = None
+        self._beat = 0.0
+        self._expected = 0.0
+        self._stopped = threading.Event()
+
+    def start(self, loop):
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._beat = self._expected = time.perf_counter()
+        loop.call_soon(self._tick)
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _tick(self):
+        now = time.perf_counter()
+        lag = max(0.0, now - self._expected)
+        self.lags.append(lag)
+        if self.on_lag:
+            self.on_lag(lag)
+        self._beat = now
+        self._expected = now + self.interval
+        if not self._stopped.is_set():
+            self._loop.call_later(self.interval, self._tick)
+
+    def _watch(self):
+        stalled_beat = None
+        sample = None
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            if stalled_beat is None:
+                if time.perf_counter() - beat >= self.threshold:
+                    stalled_beat = beat
+                    sample = self._sample()
+            elif beat != stalled_beat:
+                self._record(sample, beat - stalled_beat - self.interval)
+                stalled_beat = sample = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return "<unknown>", []
+        stack = traceback.extract_stack(frame)[-STACK_DEPTH:]
+        for entry in reversed(stack):
+            if entry.filename.startswith(_BASE_DIR) and not entry.filename.endswith("loop_monitor.py"):
+                return f"{entry.name} ({os.path.relpath(entry.filename, _BASE_DIR)}:{entry.lineno})", stack
+
+        task = asyncio.current_task(self._loop)
+        if task is not None:
+            return task.get_coro().__qualname__, stack
+        return f"{stack[-1].name} ({stack[-1].filename}:{stack[-1].lineno})", stack
+
+    def _record(self, sample, duration):
+        label, stack = sample
+        self.stalls += 1
+        entry = self.slowest.get(label)
+        if entry is None:
+            entry = self.slowest[label] = {"count": 0, "total": 0.0, "max": 0.0, "stack": stack}
+        entry["count"] += 1
+        entry["total"] += duration
+        if duration >= entry["max"]:
+            entry["max"] = duration
+            entry["stack"] = stack
+        logging.warning("Event loop blocked for %.0f ms in %s", duration * 1000, label)
+
+        if len(self.slowest) > self.top_n * 4:
+            keep = sorted(self.slowest.items(), key=lambda item: item[1]["max"], reverse=True)[: self.top_n]
+            self.slowest = dict(keep)
+
+    def top(self):
+        ranked = sorted(self.slowest.items(), key=lambda item: item[1]["max"], reverse=True)
+        return ranked[: self.top_n]
+
+    def report(self, with_stack=False):
+        lags = sorted(self.lags)
+        lines = []
+        if lags:
+            p50 = lags[len(lags) // 2] * 1000
+            p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000
+            lines.append(
+                f"Loop lag over last {len(lags) * self.interval:.0f}s: p50 {p50:.1f} ms, "
+                f"p99 {p99:.1f} ms, max {lags[-1] * 1000:.1f} ms"
+            )
+        lines.append(f"Stalls over {self.threshold * 1000:.0f} ms: {self.stalls}")
+        for rank, (label, entry) in enumerate(self.top(), start=1):
+            lines.append(
+                f"{rank}. {entry['max'] * 1000:.0f} ms max, {entry['count']}x, "
+                f"{entry['total'] * 1000:.0f} ms total: {label}"
+            )
+        if with_stack and self.slowest:
+            label, entry = self.top()[0]
+            lines.append(f"Stack for {label}:")
+            lines.extend(f"  {frame.filename}:{frame.lineno} {frame.name}" for frame in entry["stack"])
+        return "\n".join(lines)
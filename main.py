@@ -1,27 +1,56 @@
+import time
+
+_STARTED_AT = time.perf_counter()
+
 import os
 import discord
 from discord.ext import commands
 from discord import app_commands
 from dotenv import load_dotenv
-import yt_dlp
-from collections import deque
+from message_cleanup import MessageCleanup
+from ipc import IPCClient, TTLCache
+from circuit_breaker import CircuitBreaker
+from rate_limit import AdmissionControl, parse_rate
+from audio_worker import AudioWorkerPool
+from ffmpeg_supervisor import FFmpegSupervisor, read_proc_usage
+from title_index import TitleIndex, save_snapshot
+from catalog import TrackCatalog
+from library import MediaLibrary, resolve_ffprobe
+from loop_monitor import LoopWatchdog
+from mem_profile import MemoryProfiler
+import metrics
+import log_pipeline
 import asyncio
+import hashlib
+import importlib
 import importlib.util
+import json
 import shutil
 import subprocess
 import logging
+import math
 import signal
 import sys
 
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+# Extensions in cogs/ import this module as "main"; when it runs as a script that name
+# has to resolve to the running module, not load a second copy with a second bot.
+sys.modules.setdefault("main", sys.modules[__name__])
+log_pipeline.setup_logging()
 
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
 
 _BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-_COOKIES_PATH = os.path.join(_BASE_DIR, "cookies.txt")
+_TREE_HASH_PATH = os.path.join(_BASE_DIR, ".tree_sync_hash")
+# Empty disables the catalog.
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(_BASE_DIR, "catalog.sqlite3"))
+MEDIA_LIBRARY_DIRS = [path for path in os.getenv("MEDIA_LIBRARY_DIRS", "").split(os.pathsep) if path]
+MEDIA_LIBRARY_RESCAN = float(os.getenv("MEDIA_LIBRARY_RESCAN", "900"))
+_MEDIA_INDEX_PATH = os.path.join(_BASE_DIR, ".media_index.json")
+MEMPROFILE_DIR = os.getenv("MEMPROFILE_DIR", os.path.join(_BASE_DIR, "memprofiles"))
+TITLE_INDEX_FLUSH_INTERVAL = 60
 
 
 def resolve_ytdlp_js_runtimes():
@@ -34,33 +63,19 @@ def resolve_ytdlp_js_runtimes():
     return runtimes
 
 
-YTDLP_JS_RUNTIMES = resolve_ytdlp_js_runtimes()
-
-
-def _ytdlp_opts(extra=None):
-    opts = {
-        "format": "bestaudio[acodec=opus]/bestaudio[acodec=aac]/bestaudio/best",
-        "quiet": True,
-        "no_warnings": True,
-        "default_search": "auto",
-        "noplaylist": True,
-        "source_address": "0.0.0.0",
-        "youtube_include_dash_manifest": False,
-        "youtube_include_hls_manifest": False,
-        "geo_bypass": True,
-    }
-    if YTDLP_JS_RUNTIMES:
-        opts["js_runtimes"] = YTDLP_JS_RUNTIMES
-    if extra:
-        opts.update(extra)
-    if os.path.isfile(_COOKIES_PATH):
-        opts["cookiefile"] = _COOKIES_PATH
-    return opts
+YTDLP_JS_RUNTIMES = {}
 
 
 SONG_QUEUES = {}
+resolving_guilds = set()
 volume_settings = {}
 loop_mode = {}
+autoplay_mode = {}
+radio_stations = {}
+radio_tasks = {}
+# One background radio extraction at a time, bot-wide.
+radio_slot = asyncio.Semaphore(1)
+extractions_in_flight = 0
 is_24_7 = {}
 current_songs = {}
 
@@ -68,7 +83,45 @@ current_songs = {}
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(command_prefix="`", intents=intents)
+CLUSTER_ID = int(os.getenv("EVA_CLUSTER_ID", "0"))
+# One file per cluster: each records different plays, and a shared file would only keep
+# whichever cluster wrote it last.
+_TITLE_INDEX_PATH = os.path.join(_BASE_DIR, f".title_index.{CLUSTER_ID}.json" if CLUSTER_ID else ".title_index.json")
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv("EVA_SHARD_IDS", "").split(",") if shard_id]
+SHARD_COUNT = int(os.getenv("EVA_SHARD_COUNT", "0")) or None
+IPC_ADDRESS = os.getenv("EVA_IPC_ADDRESS")
+STATS_PUSH_INTERVAL = 10
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+WATCHDOG_THRESHOLD_MS = float(os.getenv("WATCHDOG_THRESHOLD_MS", "100"))
+
+
+class CommandTree(app_commands.CommandTree):
+    # Runs in the same task as the command callback, so every log record the
+    # command produces is tagged with its guild.
+    async def interaction_check(self, interaction):
+        log_pipeline.set_guild(interaction.guild_id)
+        return True
+
+
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(
+        command_prefix="`",
+        intents=intents,
+        shard_ids=SHARD_IDS or None,
+        shard_count=SHARD_COUNT,
+        tree_cls=CommandTree,
+    )
+else:
+    bot = commands.Bot(command_prefix="`", intents=intents, tree_cls=CommandTree)
+ipc_client = IPCClient(IPC_ADDRESS, os.getenv("EVA_IPC_SECRET", "")) if IPC_ADDRESS else None
+message_cleanup = MessageCleanup(interval=float(os.getenv("MESSAGE_CLEANUP_INTERVAL", "2.0")))
+memory_profiler = MemoryProfiler(MEMPROFILE_DIR)
+loop_watchdog = (
+    LoopWatchdog(threshold=WATCHDOG_THRESHOLD_MS / 1000, on_lag=metrics.EVENT_LOOP_LAG.observe)
+    if WATCHDOG_THRESHOLD_MS > 0
+    else None
+)
 
 
 def validate_voice_dependencies():
@@ -105,7 +158,7 @@ def resolve_ffmpeg_executable():
     return None
 
 
-def validate_ffmpeg_dependency():
+async def validate_ffmpeg_dependency():
     if not FFMPEG_EXECUTABLE:
         if os.name == "nt":
             install_hint = "Install FFmpeg or place ffmpeg.exe in bin\\ffmpeg."
@@ -116,17 +169,19 @@ def validate_ffmpeg_dependency():
         sys.exit(1)
 
     try:
-        subprocess.run(
-            [FFMPEG_EXECUTABLE, "-version"],
+        proc = await asyncio.create_subprocess_exec(
+            FFMPEG_EXECUTABLE,
+            "-version",
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
-            check=True,
-            timeout=10,
         )
+        returncode = await asyncio.wait_for(proc.wait(), 10)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, [FFMPEG_EXECUTABLE, "-version"])
     except PermissionError:
         logging.error("FFmpeg is not executable: %s", FFMPEG_EXECUTABLE)
         sys.exit(1)
-    except (OSError, subprocess.SubprocessError) as e:
+    except (OSError, subprocess.SubprocessError, asyncio.TimeoutError) as e:
         logging.error("FFmpeg could not be started from %s: %s", FFMPEG_EXECUTABLE, e)
         sys.exit(1)
 
@@ -143,571 +198,392 @@ def validate_ytdlp_js_runtime():
     )
 
 
+async def shutdown():
+    await message_cleanup.close()
+    if track_catalog:
+        await asyncio.to_thread(track_catalog.close)
+    # Before the file has loaded, the index only holds this session's plays.
+    if title_index.loaded and title_index.dirty:
+        save_snapshot(title_index.path, title_index.snapshot())
+    await bot.close()
+    if audio_pool:
+        audio_pool.close()
+
+
 def signal_handler(sig, frame):
     logging.info("Shutting down bot...")
     loop = bot.loop
     if loop and loop.is_running():
-        asyncio.run_coroutine_threadsafe(bot.close(), loop)
+        asyncio.run_coroutine_threadsafe(shutdown(), loop)
     else:
-        asyncio.run(bot.close())
+        asyncio.run(shutdown())
     sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
-FFMPEG_EXECUTABLE = resolve_ffmpeg_executable()
-
-
-async def check_for_inactivity(channel, bot, is_24_7_mode):
-    try:
-        if is_24_7_mode:
-            return
-        await asyncio.sleep(300) 
-        if (
-            channel.guild.voice_client
-            and not channel.guild.voice_client.is_playing()
-            and not channel.guild.voice_client.is_paused()
-            and not SONG_QUEUES.get(str(channel.guild.id))
-        ):
-            await channel.guild.voice_client.disconnect()
-            await channel.send("Disconnected due to inactivity.")
-    except Exception as e:
-        logging.error(f"Error in check_for_inactivity: {e}")
-
-
-async def search_ytdlp_async(query, ydl_opts):
-    try:
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, lambda: _extract(query, ydl_opts))
-    except Exception as e:
-        logging.error(f"yt_dlp error: {e}")
-        return None
-
-def _extract(query, ydl_opts):
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        return ydl.extract_info(query, download=False)
-
-
-async def play_next_song(voice_client, guild_id, channel):
-    try:
-        if loop_mode.get(guild_id, False) and current_songs.get(guild_id):
-            audio_url, title = current_songs[guild_id]["url"], current_songs[guild_id]["title"]
-        elif SONG_QUEUES.get(guild_id) and SONG_QUEUES[guild_id]:
-            audio_url, title = SONG_QUEUES[guild_id].popleft()
-            current_songs[guild_id] = {"url": audio_url, "title": title}
-        else:
-            current_songs.pop(guild_id, None)
-            await check_for_inactivity(channel, bot, is_24_7.get(guild_id, False))
-            return
-
-        ffmpeg_options = {
-            "before_options": "-nostdin -hide_banner -reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 20",
-            "options": "-vn",
-        }
-        base_audio = discord.FFmpegPCMAudio(
-            audio_url,
-            **ffmpeg_options,
-            executable=FFMPEG_EXECUTABLE,
-            stderr=subprocess.DEVNULL,
-        )
-        volume = volume_settings.get(guild_id, 1.0)
-        source = discord.PCMVolumeTransformer(base_audio, volume=volume)
-
-        def after_play(error):
-            if error:
-                logging.error(f"Error playing {title}: {error}")
-            asyncio.run_coroutine_threadsafe(play_next_song(voice_client, guild_id, channel), bot.loop)
-
-        voice_client.play(source, after=after_play)
-        await channel.send(f"🎶 Now playing: **{title}**")
-    except asyncio.CancelledError:
-        logging.info("Playback task cancelled.")
-        return
-    except Exception as e:
-        logging.error(f"Error in play_next_song: {e}")
-        await channel.send("An error occurred while playing the next song.")
-
-@bot.event
-async def on_ready():
-    await bot.tree.sync()
-    logging.info(f"{bot.user} is online!")
+def memory_counts():
+    _, rss = read_proc_usage(os.getpid())
+    return {
+        "rss": f"{rss / 1048576:.1f} MiB" if rss else "unknown",
+        "SONG_QUEUES": f"{len(SONG_QUEUES)} guilds, {sum(map(len, SONG_QUEUES.values()))} tracks, "
+        f"~{sum(q.nbytes() for q in SONG_QUEUES.values()) // 1024} KiB",
+        "guild dicts": ", ".join(
+            f"{name} {len(table)}"
+            for name, table in (
+                ("current_songs", current_songs),
+                ("volume_settings", volume_settings),
+                ("loop_mode", loop_mode),
+                ("autoplay_mode", autoplay_mode),
+                ("is_24_7", is_24_7),
+                ("radio_stations", radio_stations),
+                ("radio_tasks", radio_tasks),
+            )
+        ),
+        "caches": f"search {len(search_cache)}, candidates {len(search_candidates)}, "
+        f"queue pages {len(queue_pages)}, titles {len(title_index)}",
+        "discord.py": f"{len(bot.guilds)} guilds, {len(bot.users)} users, "
+        f"{len(bot.cached_messages)} messages, {len(bot.voice_clients)} voice clients",
+    }
 
-async def connect_to_voice(voice_channel, voice_client):
-    max_retries = 4
-    base_delay = 5
-    for attempt in range(max_retries):
-        try:
-            if voice_client is None:
-                voice_client = await voice_channel.connect(timeout=60.0, reconnect=True)
-            elif voice_channel != voice_client.channel:
-                await voice_client.move_to(voice_channel)
-            return voice_client
-        except discord.errors.ConnectionClosed as e:
-            logging.error(f"ConnectionClosed (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt < max_retries - 1:
-                delay = base_delay * (2 ** attempt)
-                await asyncio.sleep(delay)
-            else:
-                raise
-        except Exception as e:
-            logging.error(f"Join error (attempt {attempt + 1}/{max_retries}): {e}")
-            raise
 
-@bot.tree.command(name="play", description="Play a song from YouTube link or search query.")
-@app_commands.describe(song_query="YouTube link or search term")
-async def play(interaction: discord.Interaction, song_query: str):
-    await interaction.response.defer()
+async def memory_profile_step():
+    # First call starts tracing and takes the baseline; later calls snapshot and diff.
+    if not memory_profiler.active:
+        await asyncio.to_thread(memory_profiler.start)
+        logging.info("tracemalloc started, baseline taken")
+        return "tracemalloc started and baseline taken. Run it again to diff against it."
+    report, _ = await asyncio.to_thread(memory_profiler.snapshot, memory_counts())
+    logging.info("Memory snapshot:\n%s", report)
+    return report
 
-    if not (interaction.user.voice and interaction.user.voice.channel):
-        return await interaction.followup.send("You must be in a voice channel.")
 
-    voice_channel = interaction.user.voice.channel
-    voice_client = interaction.guild.voice_client
+def memprofile_signal_handler(sig, frame):
+    loop = bot.loop
+    if loop and loop.is_running():
+        asyncio.run_coroutine_threadsafe(memory_profile_step(), loop)
+
+FFMPEG_EXECUTABLE = None
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "0"))
+audio_pool = None
+# FFmpegPCMAudio only hands stderr to Popen when it has a fileno(); subprocess.DEVNULL
+# does not, and makes discord.py spin up a pipe reader that fails on every write.
+FFMPEG_STDERR = open(os.devnull, "wb")
+extraction_breaker = CircuitBreaker(
+    failure_rate=float(os.getenv("BREAKER_FAILURE_RATE", "0.5")),
+    min_calls=int(os.getenv("BREAKER_MIN_CALLS", "8")),
+)
+search_cache = TTLCache(max_entries=2000)
+search_candidates = TTLCache(max_entries=1000)
+# Rendered /queue pages keyed by (guild, queue version, page): any queue mutation
+# bumps the version, so stale pages are never served and simply expire.
+queue_pages = TTLCache(max_entries=500)
+# Empty until the persisted file has loaded in the background; see load_title_index().
+title_index = TitleIndex(_TITLE_INDEX_PATH)
+title_index_task = None
+# Opened in main(); stays None when CATALOG_PATH is empty.
+track_catalog = None
+# Opened in main() when MEDIA_LIBRARY_DIRS is set.
+media_library = None
+media_library_task = None
+# /play rate limits as "count/seconds"; "0" disables one. PLAY_RATE_GLOBAL caps the whole
+# process and is off by default, since any fixed cap rejects most plays once enough
+# guilds share it; set it from the process's expected peak if extraction needs shielding.
+play_admission = AdmissionControl(
+    user=parse_rate(os.getenv("PLAY_RATE_USER", "3/10"), "PLAY_RATE_USER"),
+    guild=parse_rate(os.getenv("PLAY_RATE_GUILD", "10/30"), "PLAY_RATE_GUILD"),
+    overall=parse_rate(os.getenv("PLAY_RATE_GLOBAL", "0"), "PLAY_RATE_GLOBAL"),
+)
+ffmpeg_supervisor = FFmpegSupervisor(
+    max_processes=int(os.getenv("FFMPEG_MAX_PROCESSES", "0")),
+    cpu_limit=float(os.getenv("FFMPEG_CPU_LIMIT", "80")),
+    rss_limit=int(os.getenv("FFMPEG_RSS_LIMIT_MB", "200")) * 1048576,
+    stall_timeout=float(os.getenv("FFMPEG_STALL_SECONDS", "30")),
+)
+startup_timings = {}
+
+
+def collect_local_stats():
+    return {
+        "cluster_id": CLUSTER_ID,
+        "shard_ids": SHARD_IDS or list(range(SHARD_COUNT or 1)),
+        "pid": os.getpid(),
+        "guilds": len(bot.guilds),
+        "voice_clients": len(bot.voice_clients),
+        "playing": sum(1 for vc in bot.voice_clients if vc.is_playing()),
+        "queued_songs": sum(len(q) for q in SONG_QUEUES.values()),
+        "latency_ms": None if math.isnan(bot.latency) else round(bot.latency * 1000, 1),
+        "extraction": extraction_breaker.snapshot(),
+    }
 
-    try:
-        voice_client = await connect_to_voice(voice_channel, voice_client)
-        volume_settings[str(interaction.guild_id)] = 1.0
-    except Exception as e:
-        logging.error(f"Failed to connect: {e}")
-        return await interaction.followup.send("Unable to connect to your voice channel.")
 
-    if "youtube.com/watch" in song_query or "youtu.be/" in song_query:
-        query = song_query
-    else:
-        query = "ytsearch:" + song_query
+async def push_stats_loop():
+    while True:
+        await ipc_client.push_stats(collect_local_stats())
+        await asyncio.sleep(STATS_PUSH_INTERVAL)
 
-    ydl_options = _ytdlp_opts()
 
-    try:
-        results = await search_ytdlp_async(query, ydl_options)
-        if not results:
-            return await interaction.followup.send("Failed to fetch song data.")
-    except Exception as e:
-        logging.error(f"yt_dlp error: {e}")
-        return await interaction.followup.send("Failed to fetch song data.")
-
-    if "entries" in results:
-        tracks = results.get("entries") or []
-        if not tracks:
-            return await interaction.followup.send("No results found for your query.")
-        first = tracks[0]
-    else:
-        first = results
+def count_ffmpeg_processes():
+    if audio_pool:
+        return audio_pool.active_streams()
+    return ffmpeg_supervisor.active_count()
 
-    audio_url = first["url"]
-    title = first.get("title", "Untitled")
 
-    guild_id = str(interaction.guild_id)
-    if SONG_QUEUES.get(guild_id) is None:
-        SONG_QUEUES[guild_id] = deque()
-    SONG_QUEUES[guild_id].append((audio_url, title))
+def register_metrics():
+    metrics.register_gauge("eva_voice_clients", "Connected voice clients", lambda: len(bot.voice_clients))
+    metrics.register_gauge(
+        "eva_extraction_breaker_state",
+        "Extraction circuit breaker state (0 closed, 1 half-open, 2 open)",
+        lambda: ("closed", "half_open", "open").index(extraction_breaker.state),
+    )
+    metrics.register_counter(
+        "eva_play_admission_rejected_total", "/play requests rejected by rate limits", lambda: play_admission.rejected
+    )
+    metrics.register_counter(
+        "eva_extraction_breaker_rejected_total",
+        "Extractions failed fast by the breaker",
+        lambda: extraction_breaker.rejected,
+    )
+    metrics.register_gauge(
+        "eva_extraction_breaker_window_calls",
+        "Extractions in the breaker's sliding window",
+        lambda: extraction_breaker.snapshot()["window_calls"],
+    )
+    metrics.register_gauge(
+        "eva_extraction_breaker_window_failures",
+        "Upstream failures in the breaker's sliding window",
+        lambda: extraction_breaker.snapshot()["window_failures"],
+    )
+    metrics.register_gauge(
+        "eva_extraction_breaker_retry_after_seconds",
+        "Seconds until an open breaker lets a probe through",
+        lambda: extraction_breaker.snapshot()["retry_after"],
+    )
+    metrics.register_gauge(
+        "eva_extraction_breaker_opened_timestamp_seconds",
+        "Unix time the breaker last opened (0 if it never has)",
+        lambda: extraction_breaker.opened_at or 0,
+    )
+    metrics.register_gauge(
+        "eva_queue_length_sum", "Queued tracks across all guilds", lambda: sum(map(len, SONG_QUEUES.values()))
+    )
+    metrics.register_gauge(
+        "eva_queue_length_max", "Longest guild queue", lambda: max(map(len, SONG_QUEUES.values()), default=0)
+    )
+    metrics.register_gauge("eva_ffmpeg_processes", "Live FFmpeg processes", count_ffmpeg_processes)
+    metrics.register_gauge(
+        "eva_ffmpeg_admission_waiting", "Tracks waiting for an FFmpeg slot", lambda: ffmpeg_supervisor.waiting
+    )
+    metrics.register_gauge(
+        "eva_ffmpeg_cpu_percent",
+        "FFmpeg CPU use summed over all guilds",
+        lambda: round(sum(u["cpu_percent"] for u in ffmpeg_supervisor.usage().values()), 1),
+    )
+    metrics.register_gauge(
+        "eva_ffmpeg_rss_bytes",
+        "FFmpeg RSS summed over all guilds",
+        lambda: sum(u["rss"] for u in ffmpeg_supervisor.usage().values()),
+    )
+    if track_catalog:
+        metrics.register_counter(
+            "eva_catalog_rows_written_total", "Rows written to the track catalog", lambda: track_catalog.written
+        )
+        metrics.register_counter(
+            "eva_catalog_rows_dropped_total",
+            "Catalog rows dropped because the writer queue was full",
+            lambda: track_catalog.dropped,
+        )
+    metrics.register_gauge(
+        "eva_message_cleanup_rest_calls_saved",
+        "REST calls saved by bulk-deleting command messages",
+        lambda: message_cleanup.stats()["saved"],
+    )
 
-    if voice_client.is_playing() or voice_client.is_paused():
-        await interaction.followup.send(f"Added to queue: **{title}**")
-    else:
-        await interaction.followup.send(f"🎵 Starting playback: **{title}**")
-        await play_next_song(voice_client, guild_id, interaction.channel)
-
-@bot.tree.command(name="pause", description="Pause the currently playing song.")
-async def pause(interaction: discord.Interaction):
-    vc = interaction.guild.voice_client
-    if vc and vc.is_playing():
-        vc.pause()
-        await interaction.response.send_message("⏸️ Playback paused.")
-        if not SONG_QUEUES.get(str(interaction.guild_id)):
-            await check_for_inactivity(interaction.channel, bot, is_24_7.get(str(interaction.guild_id), False))
-    else:
-        await interaction.response.send_message("Nothing is currently playing.")
-
-@bot.tree.command(name="resume", description="Resume the currently paused song.")
-async def resume(interaction: discord.Interaction):
-    vc = interaction.guild.voice_client
-    if vc and vc.is_paused():
-        vc.resume()
-        await interaction.response.send_message("▶️ Playback resumed.")
-    else:
-        await interaction.response.send_message("I’m not paused right now.")
-        if vc and not vc.is_playing() and not SONG_QUEUES.get(str(interaction.guild_id)):
-            await check_for_inactivity(interaction.channel, bot, is_24_7.get(str(interaction.guild_id), False))
-
-@bot.tree.command(name="skip", description="Skips the current playing song.")
-async def skip(interaction: discord.Interaction):
-    vc = interaction.guild.voice_client
-    if vc and (vc.is_playing() or vc.is_paused()):
-        vc.stop()
-        await interaction.response.send_message("⏭️ Skipped the current song.")
-    else:
-        await interaction.response.send_message("Not playing anything to skip.")
-        if vc and not vc.is_playing() and not SONG_QUEUES.get(str(interaction.guild_id)):
-            await check_for_inactivity(interaction.channel, bot, is_24_7.get(str(interaction.guild_id), False))
-
-@bot.tree.command(name="disconnect", description="Stop playback and disconnect.")
-async def disconnect(interaction: discord.Interaction):
-    vc = interaction.guild.voice_client
-    if vc:
-        guild_id = str(interaction.guild_id)
-        SONG_QUEUES[guild_id] = deque()
-        volume_settings.pop(guild_id, None)
-        is_24_7.pop(guild_id, None)
-        current_songs.pop(guild_id, None)
-        await vc.disconnect()
-        await interaction.response.send_message("👋 Disconnected and cleared the queue.")
-    else:
-        await interaction.response.send_message("I'm not connected to any voice channel.")
 
-@bot.tree.command(name="join", description="Make the bot join your voice channel.")
-async def join(interaction: discord.Interaction):
-    if not (interaction.user.voice and interaction.user.voice.channel):
-        await interaction.response.send_message("❌ You must be in a voice channel.")
-        return
+def command_tree_hash():
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands()]
+    payload.sort(key=lambda command: command["name"])
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    return f"{bot.application_id}:{digest}"
 
-    try:
-        vc = await connect_to_voice(interaction.user.voice.channel, interaction.guild.voice_client)
-        volume_settings[str(interaction.guild_id)] = 1.0
-        bitrate = interaction.user.voice.channel.bitrate // 1000
-        if bitrate < 128:
-            await interaction.response.send_message(
-                f"✅ Joined your voice channel. ⚠️ Low bitrate ({bitrate} kbps) detected. Boost server for better audio (128+ kbps)."
-            )
-        else:
-            await interaction.response.send_message("✅ Joined your voice channel.")
-        if not vc.is_playing() and not SONG_QUEUES.get(str(interaction.guild_id)):
-            await check_for_inactivity(interaction.channel, bot, is_24_7.get(str(interaction.guild_id), False))
-    except Exception as e:
-        logging.error(f"Join command error: {e}")
-        await interaction.response.send_message("❌ Failed to join voice channel.")
-
-@bot.tree.command(name="queue", description="View current song queue.")
-async def view_queue(interaction: discord.Interaction):
-    q = SONG_QUEUES.get(str(interaction.guild_id), [])
-    if not q:
-        await interaction.response.send_message("📭 The queue is currently empty.")
-        vc = interaction.guild.voice_client
-        if vc and not vc.is_playing():
-            await check_for_inactivity(interaction.channel, bot, is_24_7.get(str(interaction.guild_id), False))
-    else:
-        lines = [f"{i+1}. {t}" for i, (_, t) in enumerate(q)]
-        await interaction.response.send_message("🎶 Queue:\n" + "\n".join(lines))
-
-@bot.tree.command(name="cleanqueue", description="Clear the entire queue.")
-async def cleanqueue(interaction: discord.Interaction):
-    gid = str(interaction.guild_id)
-    if gid in SONG_QUEUES:
-        SONG_QUEUES[gid].clear()
-    await interaction.response.send_message("🧹 Queue has been cleared!")
-    vc = interaction.guild.voice_client
-    if vc and not vc.is_playing():
-        await check_for_inactivity(interaction.channel, bot, is_24_7.get(gid, False))
-
-@bot.tree.command(name="volume", description="Set volume between 0 and 200.")
-@app_commands.describe(amount="Volume percentage 0-200")
-async def volume(interaction: discord.Interaction, amount: int):
-    if not (0 <= amount <= 200):
-        return await interaction.response.send_message("❌ Volume must be between 0 and 200.")
-    vid = str(interaction.guild_id)
-    volume_settings[vid] = min(amount / 100, 2.0)
-    vc = interaction.guild.voice_client
-    if vc and isinstance(vc.source, discord.PCMVolumeTransformer):
-        vc.source.volume = volume_settings[vid]
-    await interaction.response.send_message(f"🔊 Volume set to {amount}%.")
-    if vc and not vc.is_playing() and not SONG_QUEUES.get(vid):
-        await check_for_inactivity(interaction.channel, bot, is_24_7.get(vid, False))
-
-@bot.tree.command(name="loop", description="Toggle loop (repeat current song).")
-async def loop(interaction: discord.Interaction):
-    gid = str(interaction.guild_id)
-    loop_mode[gid] = not loop_mode.get(gid, False)
-    await interaction.response.send_message("🔁 Loop enabled." if loop_mode[gid] else "➡️ Loop disabled.")
-    vc = interaction.guild.voice_client
-    if vc and not vc.is_playing() and not SONG_QUEUES.get(gid):
-        await check_for_inactivity(interaction.channel, bot, is_24_7.get(gid, False))
-
-@bot.tree.command(name="nowplaying", description="Show current playing song.")
-async def nowplaying(interaction: discord.Interaction):
-    vc = interaction.guild.voice_client
-    guild_id = str(interaction.guild_id)
-    if not vc or not vc.is_playing():
-        await interaction.response.send_message("Nothing is currently playing.")
-        if vc and not SONG_QUEUES.get(guild_id):
-            await check_for_inactivity(interaction.channel, bot, is_24_7.get(guild_id, False))
-    else:
-        title = current_songs.get(guild_id, {}).get("title", "Unknown")
-        await interaction.response.send_message(f"🎵 Currently playing: **{title}**")
-
-@bot.tree.command(name="247", description="Toggle 24/7 mode to keep bot in VC.")
-async def toggle_247(interaction: discord.Interaction):
-    gid = str(interaction.guild_id)
-    is_24_7[gid] = not is_24_7.get(gid, False)
-    await interaction.response.send_message(
-        "🔄 24/7 mode enabled." if is_24_7[gid] else "🔄 24/7 mode disabled."
-    )
-    if not is_24_7.get(gid) and not SONG_QUEUES.get(gid) and interaction.guild.voice_client:
-        await check_for_inactivity(interaction.channel, bot, is_24_7.get(gid, False))
 
-async def volume_prefix(ctx, amount: int):
-    try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        await ctx.send("⚠️ I don’t have permission to delete your message.")
-    if not (0 <= amount <= 200):
-        return await ctx.send("❌ Volume must be between 0 and 200.")
-    vid = str(ctx.guild.id)
-    volume_settings[vid] = min(amount / 100, 2.0)
-    vc = ctx.voice_client
-    if vc and isinstance(vc.source, discord.PCMVolumeTransformer):
-        vc.source.volume = volume_settings[vid]
-    await ctx.send(f"🔊 Volume set to {amount}%.")
-    if vc and not vc.is_playing() and not SONG_QUEUES.get(vid):
-        await check_for_inactivity(ctx.channel, bot, is_24_7.get(vid, False))
-
-async def play_prefix(ctx, query):
+async def sync_command_tree():
+    tree_hash = command_tree_hash()
     try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        await ctx.send("⚠️ I don’t have permission to delete your message.")
-    if not ctx.author.voice or not ctx.author.voice.channel:
-        return await ctx.send("You must be in a voice channel.")
-
-    voice_channel = ctx.author.voice.channel
-    voice_client = ctx.voice_client
+        with open(_TREE_HASH_PATH, encoding="utf-8") as f:
+            if f.read().strip() == tree_hash:
+                return False
+    except OSError:
+        pass
 
+    await bot.tree.sync()
     try:
-        voice_client = await connect_to_voice(voice_channel, voice_client)
-        volume_settings[str(ctx.guild.id)] = 1.0
-    except Exception as e:
-        logging.error(f"Failed to connect: {e}")
-        return await ctx.send("Unable to connect to your voice channel.")
+        with open(_TREE_HASH_PATH, "w", encoding="utf-8") as f:
+            f.write(tree_hash)
+    except OSError as e:
+        logging.warning("Could not persist command tree hash: %s", e)
+    return True
 
-    if "youtube.com/watch" in query or "youtu.be/" in query:
-        search = query
-    else:
-        search = "ytsearch:" + query
 
-    ydl_options = _ytdlp_opts()
+def log_startup_timings():
+    stages = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_timings.items())
+    logging.info("Startup timings: %s, total %.2fs", stages, time.perf_counter() - _STARTED_AT)
 
-    try:
-        results = await search_ytdlp_async(search, ydl_options)
-        if not results:
-            return await ctx.send("Failed to fetch song data.")
-    except Exception as e:
-        logging.error(f"yt_dlp error: {e}")
-        return await ctx.send("Failed to fetch song data.")
-
-    if "entries" in results:
-        tracks = results.get("entries") or []
-        if not tracks:
-            return await ctx.send("No results found.")
-        first = tracks[0]
-    else:
-        first = results
 
-    audio_url = first["url"]
-    title = first.get("title", "Untitled")
-    gid = str(ctx.guild.id)
-    if SONG_QUEUES.get(gid) is None:
-        SONG_QUEUES[gid] = deque()
-    SONG_QUEUES[gid].append((audio_url, title))
+# Command handlers, the playback engine and the yt-dlp options; see cogs/__init__.py.
+EXTENSION = "cogs"
+reload_lock = asyncio.Lock()
 
-    if voice_client.is_playing() or voice_client.is_paused():
-        await ctx.send(f"Added to queue: **{title}**")
-    else:
-        await play_next_song(voice_client, gid, ctx.channel)
 
-async def pause_prefix(ctx):
-    try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        await ctx.send("⚠️ I don’t have permission to delete your message.")
-    vc = ctx.voice_client
-    if vc and vc.is_playing():
-        vc.pause()
-        await ctx.send("⏸️ Playback paused.")
-        if not SONG_QUEUES.get(str(ctx.guild.id)):
-            await check_for_inactivity(ctx.channel, bot, is_24_7.get(str(ctx.guild.id), False))
-    else:
-        await ctx.send("Nothing is currently playing.")
-
-async def resume_prefix(ctx):
-    try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        await ctx.send("⚠️ I don’t have permission to delete your message.")
-    vc = ctx.voice_client
-    if vc and vc.is_paused():
-        vc.resume()
-        await ctx.send("▶️ Playback resumed.")
-    else:
-        await ctx.send("I’m not paused right now.")
-        if vc and not vc.is_playing() and not SONG_QUEUES.get(str(ctx.guild.id)):
-            await check_for_inactivity(ctx.channel, bot, is_24_7.get(str(ctx.guild.id), False))
+# Swaps in the current code on disk without touching the gateway connection, voice
+# clients or queues. Returns (seconds, whether the command tree had to be synced).
+async def reload_commands():
+    async with reload_lock:
+        started = time.perf_counter()
+        try:
+            await bot.reload_extension(EXTENSION)
+        except commands.ExtensionError:
+            # reload_extension has already put the previous modules and cogs back.
+            logging.error(
+                "Reload failed after %.2fs, still running the previous code",
+                time.perf_counter() - started,
+                exc_info=True,
+            )
+            raise
+        elapsed = time.perf_counter() - started
+        # The stored tree hash makes this a no-op unless a command's signature changed.
+        synced = CLUSTER_ID == 0 and bot.is_ready() and await sync_command_tree()
+        logging.info("Reloaded %s in %.3fs%s", EXTENSION, elapsed, ", command tree synced" if synced else "")
+        return elapsed, synced
 
-async def skip_prefix(ctx):
-    try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        await ctx.send("⚠️ I don’t have permission to delete your message.")
-    vc = ctx.voice_client
-    if vc and (vc.is_playing() or vc.is_paused()):
-        vc.stop()
-        await ctx.send("⏭️ Skipped the current song.")
-    else:
-        await ctx.send("Not playing anything to skip.")
-        if vc and not vc.is_playing() and not SONG_QUEUES.get(str(ctx.guild.id)):
-            await check_for_inactivity(ctx.channel, bot, is_24_7.get(str(ctx.guild.id), False))
 
-async def disconnect_prefix(ctx):
-    try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        await ctx.send("⚠️ I don’t have permission to delete your message.")
-    vc = ctx.voice_client
-    if vc:
-        guild_id = str(ctx.guild.id)
-        SONG_QUEUES[guild_id] = deque()
-        volume_settings.pop(guild_id, None)
-        is_24_7.pop(guild_id, None)
-        current_songs.pop(guild_id, None)
-        await vc.disconnect()
-        await ctx.send("👋 Disconnected and cleared the queue.")
-    else:
-        await ctx.send("I'm not connected to any voice channel.")
+def reload_signal_handler(sig, frame):
+    loop = bot.loop
+    if loop and loop.is_running():
+        asyncio.run_coroutine_threadsafe(reload_commands(), loop)
 
-async def join_prefix(ctx):
-    try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        await ctx.send("⚠️ I don’t have permission to delete your message.")
-    if not ctx.author.voice or not ctx.author.voice.channel:
-        return await ctx.send("You must be in a voice channel.")
-    try:
-        vc = await connect_to_voice(ctx.author.voice.channel, ctx.voice_client)
-        volume_settings[str(ctx.guild.id)] = 1.0
-        bitrate = ctx.author.voice.channel.bitrate // 1000
-        if bitrate < 128:
-            await ctx.send(
-                f"✅ Joined your voice channel. ⚠️ Low bitrate ({bitrate} kbps) detected. Boost server for better audio (128+ kbps)."
-            )
-        else:
-            await ctx.send("✅ Joined your voice channel.")
-        if not vc.is_playing() and not SONG_QUEUES.get(str(ctx.guild.id)):
-            await check_for_inactivity(ctx.channel, bot, is_24_7.get(str(ctx.guild.id), False))
-    except Exception as e:
-        logging.error(f"Join command error: {e}")
-        await ctx.send("❌ Failed to join voice channel.")
 
-async def queue_prefix(ctx):
-    try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        await ctx.send("⚠️ I don’t have permission to delete your message.")
-    q = SONG_QUEUES.get(str(ctx.guild.id), [])
-    if not q:
-        await ctx.send("📭 The queue is currently empty.")
-        vc = ctx.voice_client
-        if vc and not vc.is_playing():
-            await check_for_inactivity(ctx.channel, bot, is_24_7.get(str(ctx.guild.id), False))
-    else:
-        lines = [f"{i+1}. {t}" for i, (_, t) in enumerate(q)]
-        await ctx.send("🎶 Queue:\n" + "\n".join(lines))
+stats_task = None
 
-async def cleanqueue_prefix(ctx):
-    try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        await ctx.send("⚠️ I don’t have permission to delete your message.")
-    gid = str(ctx.guild.id)
-    if gid in SONG_QUEUES:
-        SONG_QUEUES[gid].clear()
-    await ctx.send("🧹 Queue has been cleared!")
-    vc = ctx.voice_client
-    if vc and not vc.is_playing():
-        await check_for_inactivity(ctx.channel, bot, is_24_7.get(gid, False))
-
-async def nowplaying_prefix(ctx):
-    try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        await ctx.send("⚠️ I don’t have permission to delete your message.")
-    vc = ctx.voice_client
-    guild_id = str(ctx.guild.id)
-    if not vc or not vc.is_playing():
-        await ctx.send("Nothing is currently playing.")
-        if vc and not SONG_QUEUES.get(guild_id):
-            await check_for_inactivity(ctx.channel, bot, is_24_7.get(guild_id, False))
-    else:
-        title = current_songs.get(guild_id, {}).get("title", "Unknown")
-        await ctx.send(f"🎵 Currently playing: **{title}**")
+@bot.event
+async def on_ready():
+    global stats_task
+    first_ready = "ready" not in startup_timings
+    if first_ready:
+        startup_timings["ready"] = time.perf_counter() - startup_timings.pop("_login_started")
+    if CLUSTER_ID == 0 and first_ready:
+        sync_started = time.perf_counter()
+        synced = await sync_command_tree()
+        startup_timings["tree sync" if synced else "tree sync (unchanged)"] = time.perf_counter() - sync_started
+    if ipc_client and (stats_task is None or stats_task.done()):
+        stats_task = asyncio.create_task(push_stats_loop())
+    logging.info("%s is online!", bot.user)
+    if first_ready:
+        log_startup_timings()
 
-async def loop_prefix(ctx):
-    try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        await ctx.send("⚠️ I don’t have permission to delete your message.")
-    gid = str(ctx.guild.id)
-    loop_mode[gid] = not loop_mode.get(gid, False)
-    await ctx.send("🔁 Loop enabled." if loop_mode[gid] else "➡️ Loop disabled.")
-    vc = ctx.voice_client
-    if vc and not vc.is_playing() and not SONG_QUEUES.get(gid):
-        await check_for_inactivity(ctx.channel, bot, is_24_7.get(gid, False))
-
-async def toggle_247_prefix(ctx):
-    try:
-        await ctx.message.delete()
-    except discord.Forbidden:
-        await ctx.send("⚠️ I don’t have permission to delete your message.")
-    gid = str(ctx.guild.id)
-    is_24_7[gid] = not is_24_7.get(gid, False)
-    await ctx.send("🔄 24/7 mode enabled." if is_24_7[gid] else "🔄 24/7 mode disabled.")
-    if not is_24_7.get(gid) and not SONG_QUEUES.get(gid) and ctx.voice_client:
-        await check_for_inactivity(ctx.channel, bot, is_24_7.get(gid, False))
 
 @bot.event
 async def on_message(message):
-    if message.author.bot or not message.content.startswith("`"):
-        return
-
-    ctx = await bot.get_context(message)
-    parts = message.content[1:].strip().split(maxsplit=1)
-    command = parts[0].lower()
-    arg = parts[1] if len(parts) > 1 else ""
-
-    if command == "play":
-        await play_prefix(ctx, arg)
-    elif command == "pause":
-        await pause_prefix(ctx)
-    elif command == "resume":
-        await resume_prefix(ctx)
-    elif command == "skip":
-        await skip_prefix(ctx)
-    elif command == "disconnect":
-        await disconnect_prefix(ctx)
-    elif command == "join":
-        await join_prefix(ctx)
-    elif command == "queue":
-        await queue_prefix(ctx)
-    elif command == "cleanqueue":
-        await cleanqueue_prefix(ctx)
-    elif command == "volume":
-        try:
-            await volume_prefix(ctx, int(arg))
-        except:
-            await ctx.send("❌ Provide a number between 0 and 200.")
-    elif command == "nowplaying":
-        await nowplaying_prefix(ctx)
-    elif command == "loop":
-        await loop_prefix(ctx)
-    elif command == "247":
-        await toggle_247_prefix(ctx)
-
-if not TOKEN:
-    logging.error(
-        "DISCORD_TOKEN is missing. Set it in .env (same folder as main.py) or in the environment."
+    # Overrides Bot.on_message so discord.ext's own command parser stays out of the way;
+    # ` prefix commands are dispatched by the Music cog's listener.
+    pass
+
+# Only cluster 0 walks the directories and writes the index; the other clusters
+# re-read the file it writes on the same interval.
+async def scan_media_library():
+    await asyncio.to_thread(media_library.load)
+    logging.info("Loaded media index with %d files", len(media_library))
+    while True:
+        if CLUSTER_ID == 0:
+            try:
+                await asyncio.to_thread(media_library.scan)
+            except Exception as e:
+                logging.error("Media library scan failed: %s", e)
+        if MEDIA_LIBRARY_RESCAN <= 0:
+            return
+        await asyncio.sleep(MEDIA_LIBRARY_RESCAN)
+        if CLUSTER_ID:
+            await asyncio.to_thread(media_library.load)
+
+
+async def load_title_index():
+    global title_index
+    started = time.perf_counter()
+    loaded = await asyncio.to_thread(TitleIndex.read, _TITLE_INDEX_PATH)
+    loaded.absorb(title_index)
+    title_index = loaded
+    logging.info("Loaded %d autocomplete titles in %.2fs", len(loaded), time.perf_counter() - started)
+
+    while True:
+        await asyncio.sleep(TITLE_INDEX_FLUSH_INTERVAL)
+        if title_index.dirty:
+            title_index.dirty = False
+            try:
+                await asyncio.to_thread(save_snapshot, title_index.path, title_index.snapshot())
+            except OSError as e:
+                logging.warning("Could not save title index: %s", e)
+
+
+def warm_ytdlp():
+    started = time.perf_counter()
+    importlib.import_module("yt_dlp")
+    logging.info("yt-dlp imported in background in %.2fs", time.perf_counter() - started)
+
+
+async def run_startup_checks():
+    global FFMPEG_EXECUTABLE, YTDLP_JS_RUNTIMES, audio_pool
+    FFMPEG_EXECUTABLE, YTDLP_JS_RUNTIMES, _ = await asyncio.gather(
+        asyncio.to_thread(resolve_ffmpeg_executable),
+        asyncio.to_thread(resolve_ytdlp_js_runtimes),
+        asyncio.to_thread(validate_voice_dependencies),
     )
-    sys.exit(1)
+    await validate_ffmpeg_dependency()
+    validate_ytdlp_js_runtime()
+    if AUDIO_WORKERS > 0:
+        audio_pool = AudioWorkerPool(AUDIO_WORKERS, FFMPEG_EXECUTABLE)
+
+
+async def main():
+    global title_index_task, track_catalog, media_library, media_library_task
+    startup_timings["imports"] = time.perf_counter() - _STARTED_AT
+    if loop_watchdog:
+        loop_watchdog.start(asyncio.get_running_loop())
+    checks_started = time.perf_counter()
+    await run_startup_checks()
+    startup_timings["checks"] = time.perf_counter() - checks_started
+
+    ffmpeg_supervisor.start()
+    if CATALOG_PATH:
+        track_catalog = TrackCatalog(CATALOG_PATH)
+    if MEDIA_LIBRARY_DIRS:
+        media_library = MediaLibrary(MEDIA_LIBRARY_DIRS, _MEDIA_INDEX_PATH, resolve_ffprobe(FFMPEG_EXECUTABLE))
+        media_library_task = asyncio.create_task(scan_media_library())
+    if METRICS_PORT:
+        register_metrics()
+        await metrics.start_metrics_server(METRICS_HOST, METRICS_PORT, sample_lag=loop_watchdog is None)
+
+    asyncio.get_running_loop().run_in_executor(None, warm_ytdlp)
+    title_index_task = asyncio.create_task(load_title_index())
+    extensions_started = time.perf_counter()
+    await bot.load_extension(EXTENSION)
+    startup_timings["extensions"] = time.perf_counter() - extensions_started
+    startup_timings["_login_started"] = time.perf_counter()
+    async with bot:
+        await bot.start(TOKEN)
+
+
+if __name__ == "__main__":
+    if not TOKEN:
+        logging.error(
+            "DISCORD_TOKEN is missing. Set it in .env (same folder as main.py) or in the environment."
+        )
+        sys.exit(1)
 
-validate_voice_dependencies()
-validate_ffmpeg_dependency()
-validate_ytdlp_js_runtime()
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, memprofile_signal_handler)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, reload_signal_handler)
 
-try:
-    bot.run(TOKEN)
-except Exception as e:
-    logging.error(f"Bot failed to start: {e}")
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        logging.error("Bot failed to start: %s", e)
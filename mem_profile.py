@@ -0,0 +1,97 @@
+import itertools
+import linecache
+import os
+import threading
+import time
+import tracemalloc
+
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_STDLIB_DIR = os.path.dirname(os.__file__)
+TRACE_FRAMES = 10
+TOP_N = 15
+# Allocations made by the profiler itself would otherwise top every diff.
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def _site(frame):
+    filename = frame.filename
+    if filename.startswith(_BASE_DIR):
+        filename = os.path.relpath(filename, _BASE_DIR)
+    elif filename.startswith(_STDLIB_DIR) and "site-packages" not in filename:
+        filename = "stdlib/" + os.path.relpath(filename, _STDLIB_DIR)
+    else:
+        # Keep just enough of site-packages paths to tell discord/ from yt_dlp/.
+        parts = filename.replace("\\", "/").split("/")
+        if "site-packages" in parts:
+            filename = "/".join(parts[parts.index("site-packages") + 1:])
+    return f"{filename}:{frame.lineno}"
+
+
+# tracemalloc stays off until start(), so there is no cost while nobody is profiling.
+# start() records a baseline; every snapshot() is written to disk and diffed against it.
+class MemoryProfiler:
+    def __init__(self, directory, frames=TRACE_FRAMES, top_n=TOP_N):
+        self.directory = directory
+        self.frames = frames
+        self.top_n = top_n
+        self.baseline = None
+        self.started_at = None
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+
+    @property
+    def active(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            self.baseline = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+            self.started_at = time.time()
+
+    def stop(self):
+        with self._lock:
+            tracemalloc.stop()
+            self.baseline = None
+            self.started_at = None
+
+    # Blocking: snapshotting and diffing a large heap takes a while, run it in a thread.
+    # Returns (report text, path of the dumped snapshot).
+    def snapshot(self, counts=None):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is not running")
+            snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+            os.makedirs(self.directory, exist_ok=True)
+            # Milliseconds plus a per-process sequence, so two snapshots in the same second
+            # (SIGUSR1 and /memprofile, say) never overwrite each other.
+            now = time.time()
+            name = f"snapshot-{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now % 1 * 1000):03d}"
+            path = os.path.join(self.directory, f"{name}-{next(self._sequence)}.tracemalloc")
+            snapshot.dump(path)
+            current, peak = tracemalloc.get_traced_memory()
+            diff = snapshot.compare_to(self.baseline, "lineno")
+
+        lines = [
+            f"traced {current / 1048576:.1f} MiB (peak {peak / 1048576:.1f} MiB), "
+            f"baseline {(time.time() - self.started_at) / 60:.0f} min ago",
+            f"top {self.top_n} allocation sites by growth since baseline:",
+        ]
+        for stat in diff[: self.top_n]:
+            lines.append(
+                f"  {stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  "
+                f"{_site(stat.traceback[0])}"
+            )
+        if counts:
+            lines.append("bot structures:")
+            lines.extend(f"  {name}: {value}" for name, value in counts.items())
+        lines.append(f"snapshot: {path}")
+        return "\n".join(lines), path
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+
+import discord
+
+
+BULK_DELETE_LIMIT = 100
+PERMISSION_CACHE_TTL = 300.0
+
+
+class MessageCleanup:
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self.deleted = 0
+        self.rest_calls = 0
+        # channel id -> (channel, messages); swapped out whole by flush().
+        self._pending = {}
+        self._permissions = {}
+        self._task = None
+
+    def queue(self, message):
+        channel = message.channel
+        if not self._can_delete(channel):
+            return
+
+        self._pending.setdefault(channel.id, (channel, []))[1].append(message)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _can_delete(self, channel):
+        guild = getattr(channel, "guild", None)
+        if guild is None:
+            return False
+
+        now = time.monotonic()
+        cached = self._permissions.get(channel.id)
+        if cached and now - cached[1] < PERMISSION_CACHE_TTL:
+            return cached[0]
+
+        allowed = channel.permissions_for(guild.me).manage_messages
+        self._permissions[channel.id] = (allowed, now)
+        if not allowed and cached is None:
+            logging.warning("Missing Manage Messages in channel %s; command messages will not be deleted.", channel.id)
+        return allowed
+
+    async def _run(self):
+        while self._pending:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        for channel, messages in pending.values():
+            for start in range(0, len(messages), BULK_DELETE_LIMIT):
+                await self._delete_batch(channel, messages[start:start + BULK_DELETE_LIMIT])
+
+    async def _delete_batch(self, channel, messages):
+        try:
+            self.rest_calls += 1
+            if len(messages) == 1:
+                await messages[0].delete()
+            else:
+                await channel.delete_messages(messages)
+            self.deleted += len(messages)
+        except discord.Forbidden:
+            self._permissions[channel.id] = (False, time.monotonic())
+            logging.warning("Lost Manage Messages in channel %s; dropping %d pending deletions.", channel.id, len(messages))
+        except discord.NotFound:
+            # Bulk delete fails as a whole if any message is already gone.
+            for message in messages:
+                try:
+                    self.rest_calls += 1
+                    await message.delete()
+                    self.deleted += 1
+                except discord.HTTPException:
+                    pass
+        except discord.HTTPException as e:
+            logging.error("Bulk delete failed in channel %s: %s", channel.id, e)
+
+    def stats(self):
+        return {
+            "deleted": self.deleted,
+            "rest_calls": self.rest_calls,
+            "saved": max(self.deleted - self.rest_calls, 0),
+        }
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        await self.flush()
+        stats = self.stats()
+        logging.info(
+            "Message cleanup deleted %d messages with %d REST calls (%d saved).",
+            stats["deleted"],
+            stats["rest_calls"],
+            stats["saved"],
+        )
@@ -0,0 +1,191 @@
+import asyncio
+import bisect
+import logging
+import time
+from collections import deque
+
+
+# Hot-path updates are plain attribute/dict increments on the event loop thread and
+# deque appends from player threads; all formatting happens at scrape time.
+class Counter:
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.values = {}
+
+    def inc(self, label_value=None, amount=1):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        if not self.values and self.label is None:
+            yield f"{self.name} 0"
+        for label_value, value in self.values.items():
+            if self.label is None:
+                yield f"{self.name} {value}"
+            else:
+                yield f'{self.name}{{{self.label}="{label_value}"}} {value}'
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help_text, collect):
+        self.name = name
+        self.help = help_text
+        self.collect = collect
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield f"{self.name} {self.collect()}"
+
+
+# A running total some component already keeps, read at scrape time like a gauge.
+class CollectedCounter(Gauge):
+    kind = "counter"
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound}"}} {cumulative}'
+        cumulative += self.counts[-1]
+        yield f'{self.name}_bucket{{le="+Inf"}} {cumulative}'
+        yield f"{self.name}_sum {self.sum}"
+        yield f"{self.name}_count {cumulative}"
+
+
+class EventRate:
+    def __init__(self, name, help_text, window=60.0):
+        self.name = name
+        self.help = help_text
+        self.window = window
+        self.total = 0
+        self._events = deque()
+
+    def record(self):
+        # deque.append is atomic, so player threads can call this directly.
+        self._events.append(time.monotonic())
+
+    def render(self):
+        cutoff = time.monotonic() - self.window
+        events = self._events
+        while events and events[0] < cutoff:
+            events.popleft()
+            self.total += 1
+        yield f"# HELP {self.name}_total {self.help}"
+        yield f"# TYPE {self.name}_total counter"
+        yield f"{self.name}_total {self.total + len(events)}"
+        yield f"# HELP {self.name}_per_minute {self.help} in the last minute"
+        yield f"# TYPE {self.name}_per_minute gauge"
+        yield f"{self.name}_per_minute {len(events) * 60.0 / self.window}"
+
+
+EXTRACTION_SECONDS = Histogram(
+    "eva_extraction_seconds",
+    "yt-dlp extraction latency",
+    (0.25, 0.5, 1, 2, 3, 5, 8, 13, 21),
+)
+EXTRACTION_FAILURES = Counter("eva_extraction_failures_total", "yt-dlp extraction failures", label="error")
+TRACK_TRANSITIONS = EventRate("eva_track_transitions", "after_play track transitions")
+EVENT_LOOP_LAG = Histogram(
+    "eva_event_loop_lag_seconds",
+    "Event loop scheduling delay",
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+FFMPEG_RESTARTS = Counter("eva_ffmpeg_restarts_total", "FFmpeg pipes killed and restarted", label="reason")
+CATALOG_LOOKUPS = Counter("eva_catalog_lookups_total", "Track catalog lookups for search queries", label="result")
+VOICE_RECONNECT_SECONDS = Histogram(
+    "eva_voice_reconnect_seconds",
+    "Time from a dropped voice connection to playback resuming",
+    (0.5, 1, 2, 5, 10, 20, 40, 60),
+)
+VOICE_RECONNECTS = Counter("eva_voice_reconnects_total", "Voice reconnects after a dropped connection", label="result")
+
+REGISTRY = [
+    EXTRACTION_SECONDS,
+    EXTRACTION_FAILURES,
+    TRACK_TRANSITIONS,
+    EVENT_LOOP_LAG,
+    FFMPEG_RESTARTS,
+    CATALOG_LOOKUPS,
+    VOICE_RECONNECT_SECONDS,
+    VOICE_RECONNECTS,
+]
+
+
+def register_gauge(name, help_text, collect):
+    REGISTRY.append(Gauge(name, help_text, collect))
+
+
+def register_counter(name, help_text, collect):
+    REGISTRY.append(CollectedCounter(name, help_text, collect))
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            logging.error("Metric %s failed to render: %s", metric.name, e)
+    return "\n".join(lines) + "\n"
+
+
+async def sample_event_loop_lag(interval=0.5):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+async def _handle_request(reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, content_type, body = "200 OK", "text/plain; version=0.0.4", render().encode()
+        else:
+            status, content_type, body = "404 Not Found", "text/plain", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+_lag_task = None
+
+
+# Pass sample_lag=False when something else (the loop watchdog) already feeds EVENT_LOOP_LAG.
+async def start_metrics_server(host, port, sample_lag=True):
+    global _lag_task
+    server = await asyncio.start_server(_handle_request, host, port)
+    if sample_lag:
+        _lag_task = asyncio.create_task(sample_event_loop_lag())
+    logging.info("Metrics endpoint listening on http://%s:%d/metrics", host, port)
+    return server
@@ -0,0 +1,80 @@
+from collections import deque
+
+from title_index import normalize
+from track_queue import Track, youtube_id
+
+
+BUFFER_SIZE = 5
+LOW_WATER = 2
+HISTORY_SIZE = 50
+
+
+def video_id_of(page_url):
+    if page_url and "youtube.com/watch?v=" in page_url:
+        return youtube_id(page_url.rsplit("v=", 1)[1].split("&", 1)[0])
+    return None
+
+
+def related_query(page_url, title):
+    # YouTube's own radio mix for a video is the best source of related tracks;
+    # anything else (local files, other sites) falls back to a search on the title.
+    video_id = video_id_of(page_url)
+    if video_id:
+        return f"https://www.youtube.com/watch?v={video_id}&list=RD{video_id}"
+    return f"ytsearch{BUFFER_SIZE * 2}:{title}"
+
+
+# Autoplay state for one guild: a short buffer of related tracks to fall back on when
+# the user queue runs dry, and the recent history they are deduplicated against. Both
+# YouTube IDs and normalized titles count, so re-uploads of a song are skipped too.
+class RadioStation:
+    def __init__(self):
+        self.buffer = deque()
+        self.seed = None
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._seen = set()
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def _keys(self, page_url, title):
+        return [key for key in (video_id_of(page_url), normalize(title or "")) if key]
+
+    def played(self, page_url, title):
+        self.seed = (page_url, title)
+        for key in self._keys(page_url, title):
+            evicted = self._history[0] if len(self._history) == self._history.maxlen else None
+            self._history.append(key)
+            self._seen.add(key)
+            if evicted is not None and evicted not in self._history:
+                self._seen.discard(evicted)
+
+    def needs_refill(self):
+        return len(self.buffer) < LOW_WATER
+
+    # Adds (title, duration, page_url) candidates that are neither recent nor already
+    # buffered; returns how many were taken.
+    def offer(self, candidates):
+        buffered = {key for track in self.buffer for key in self._keys(track.page_url, track.title)}
+        added = 0
+        for title, duration, page_url in candidates:
+            if len(self.buffer) >= BUFFER_SIZE:
+                break
+            keys = self._keys(page_url, title)
+            if not keys or any(key in self._seen or key in buffered for key in keys):
+                continue
+            self.buffer.append(Track(None, title, page_url, int(duration or 0)))
+            buffered.update(keys)
+            added += 1
+        return added
+
+    def peek(self):
+        return self.buffer[0] if self.buffer else None
+
+    def prefetched(self, track, url):
+        # The head may have been popped while its URL was resolving.
+        if self.buffer and self.buffer[0] is track:
+            self.buffer[0] = track._replace(url=url)
+
+    def pop(self):
+        return self.buffer.popleft() if self.buffer else None
@@ -0,0 +1,92 @@
+import math
+import time
+from collections import OrderedDict
+
+
+def parse_rate(text, name="rate"):
+    # "3/10" is three requests per ten seconds, also the burst size; "0" disables the limit.
+    # name is the setting the text came from, for the error message.
+    count, _, seconds = (text or "0").partition("/")
+    try:
+        count, seconds = float(count), float(seconds or 1)
+    except ValueError:
+        count = seconds = math.nan
+    if not (math.isfinite(count) and math.isfinite(seconds) and seconds > 0):
+        raise ValueError(f"{name} must look like 3/10 (count/seconds, seconds > 0) or 0 to disable it, not {text!r}")
+    return (count, seconds) if count > 0 else None
+
+
+# Buckets refill lazily on access, so an idle bucket costs nothing until it is touched
+# again. Once a bucket has been idle long enough to refill completely it is
+# indistinguishable from a missing one and gets evicted from the LRU end.
+class TokenBuckets:
+    def __init__(self, count, seconds, max_keys=50000):
+        self.burst = count
+        self.rate = count / seconds
+        self.max_keys = max_keys
+        self.refill_time = seconds
+        self._buckets = OrderedDict()
+
+    def retry_after(self, key, now, cost=1):
+        bucket = self._buckets.get(key)
+        tokens = self.burst if bucket is None else min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        return 0.0 if tokens >= cost else (cost - tokens) / self.rate
+
+    def take(self, key, now, cost=1):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = [self.burst - cost, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate) - cost
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        self._evict(now)
+
+    def _evict(self, now):
+        buckets = self._buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if len(buckets) <= self.max_keys and now - bucket[1] < self.refill_time:
+                break
+            del buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class AdmissionControl:
+    def __init__(self, user=None, guild=None, overall=None, max_keys=50000):
+        self.user = TokenBuckets(*user, max_keys=max_keys) if user else None
+        self.guild = TokenBuckets(*guild, max_keys=max_keys) if guild else None
+        self.overall = TokenBuckets(*overall, max_keys=1) if overall else None
+        self.rejected = 0
+        # (buckets, index into the per-call key tuple) for the enabled tiers.
+        self._tiers = [
+            (buckets, index) for index, buckets in enumerate((self.user, self.guild, self.overall)) if buckets is not None
+        ]
+
+    # Returns 0.0 and charges every tier, or the seconds until all tiers have room.
+    # All tiers are checked before any is charged, so a rejection never burns user tokens.
+    def admit(self, user_id, guild_id, cost=1, now=None):
+        if now is None:
+            now = time.monotonic()
+        keys = (user_id, guild_id, None)
+        retry_after = 0.0
+        for buckets, index in self._tiers:
+            wait = buckets.retry_after(keys[index], now, cost)
+            if wait > retry_after:
+                retry_after = wait
+        if retry_after:
+            self.rejected += 1
+            return retry_after
+        for buckets, index in self._tiers:
+            buckets.take(keys[index], now, cost)
+        return 0.0
+
+    # The largest cost admit() can ever accept: the smallest burst of the enabled tiers.
+    @property
+    def max_cost(self):
+        return min((buckets.burst for buckets, _ in self._tiers), default=None)
+
+    def tracked_keys(self):
+        return sum(len(buckets) for buckets in (self.user, self.guild, self.overall) if buckets is not None)
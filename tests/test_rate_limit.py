@@ -0,0 +1,26 @@
+import pytest
+
+from rate_limit import AdmissionControl, parse_rate
+
+
+def test_batch_larger_than_bucket_is_rejected_without_charging():
+    admission = AdmissionControl(user=(3, 10), guild=(10, 30))
+
+    assert admission.admit(1, 1, cost=25, now=0.0) > 0
+    assert admission.rejected == 1
+    # Nothing was charged, so a batch that fits still goes through.
+    assert admission.admit(1, 1, cost=3, now=0.0) == 0.0
+    assert admission.admit(1, 1, now=0.0) > 0
+
+
+def test_max_cost_is_the_smallest_burst():
+    assert AdmissionControl(user=(3, 10), guild=(10, 30)).max_cost == 3
+    assert AdmissionControl().max_cost is None
+
+
+def test_parse_rate_rejects_settings_that_cannot_work():
+    assert parse_rate("3/10", "PLAY_RATE_USER") == (3.0, 10.0)
+    assert parse_rate("0", "PLAY_RATE_GLOBAL") is None
+    for text in ("3/0", "3/-5", "three/10", "3/inf"):
+        with pytest.raises(ValueError, match="PLAY_RATE_USER"):
+            parse_rate(text, "PLAY_RATE_USER")
@@ -0,0 +1,27 @@
+from track_queue import TrackQueue
+
+
+def test_replacement_queue_never_reuses_a_version():
+    old = TrackQueue()
+    for i in range(3):
+        old.append(f"url{i}", f"title {i}")
+    new = TrackQueue()
+    for i in range(3):
+        new.append(f"url{i}", f"title {i}")
+
+    assert new.version != old.version
+
+
+def test_every_mutation_changes_the_version():
+    queue = TrackQueue()
+    seen = {queue.version}
+    queue.append("url", "title")
+    seen.add(queue.version)
+    queue.append_lazy("lazy title")
+    seen.add(queue.version)
+    queue.popleft()
+    seen.add(queue.version)
+    queue.clear()
+    seen.add(queue.version)
+
+    assert len(seen) == 5
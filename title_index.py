@@ -0,0 +1,146 @@
+import bisect
+import heapq
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+
+
+MAX_TITLES = 5000
+MAX_WORDS = 8
+SCAN_LIMIT = 200
+HALF_LIFE = 7 * 86400
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text):
+    return _NON_WORD.sub(" ", text.casefold()).strip()
+
+
+# Titles the bot has played, searchable by the prefix of any of their first MAX_WORDS
+# words. Keys are kept in one sorted list so a lookup is a bisect plus a short scan;
+# ranking uses play counts that decay with a one-week half-life.
+class TitleIndex:
+    def __init__(self, path):
+        self.path = path
+        self.loaded = False
+        self.dirty = False
+        self._entries = {}
+        self._keys = []
+        # Answer for an empty prefix, the most common autocomplete request; reset on any write.
+        self._top = None
+
+    def _score(self, entry, now):
+        return entry["score"] * 0.5 ** ((now - entry["last_played"]) / HALF_LIFE)
+
+    def _index(self, key, entry):
+        words = entry["norm"].split(" ")
+        for i in range(min(len(words), MAX_WORDS)):
+            bisect.insort(self._keys, (" ".join(words[i:]), key))
+
+    def _unindex(self, key, entry):
+        words = entry["norm"].split(" ")
+        for i in range(min(len(words), MAX_WORDS)):
+            position = bisect.bisect_left(self._keys, (" ".join(words[i:]), key))
+            if position < len(self._keys) and self._keys[position][1] == key:
+                del self._keys[position]
+
+    def record(self, title, page_url=None, now=None):
+        norm = normalize(title or "")
+        if not norm:
+            return
+        now = now or time.time()
+        key = page_url or norm
+        self._add(key, title, norm, page_url, 1.0, now)
+
+    def _add(self, key, title, norm, page_url, score, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            if len(self._entries) >= MAX_TITLES:
+                self._evict(now)
+            entry = {"title": title, "norm": norm, "page_url": page_url, "score": 0.0, "last_played": now}
+            self._entries[key] = entry
+            self._index(key, entry)
+        entry["score"] = self._score(entry, now) + score
+        entry["last_played"] = max(entry["last_played"], now)
+        self.dirty = True
+        self._top = None
+
+    def _evict(self, now):
+        key = min(self._entries, key=lambda k: self._score(self._entries[k], now))
+        self._unindex(key, self._entries.pop(key))
+
+    def search(self, prefix, limit=25, now=None):
+        now = now or time.time()
+        prefix = normalize(prefix)
+        if not prefix:
+            if self._top is None or len(self._top) < limit:
+                self._top = heapq.nlargest(limit, self._entries.values(), key=lambda entry: self._score(entry, now))
+            return self._top[:limit]
+        candidates = {}
+        position = bisect.bisect_left(self._keys, (prefix,))
+        for text, key in self._keys[position:position + SCAN_LIMIT]:
+            if not text.startswith(prefix):
+                break
+            candidates[key] = self._entries[key]
+        return heapq.nlargest(limit, candidates.values(), key=lambda entry: self._score(entry, now))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def snapshot(self):
+        return [
+            [entry["title"], entry["page_url"], round(entry["score"], 3), entry["last_played"]]
+            for entry in self._entries.values()
+        ]
+
+    @classmethod
+    def read(cls, path):
+        index = cls(path)
+        try:
+            with open(path, encoding="utf-8") as f:
+                rows = json.load(f)
+        except FileNotFoundError:
+            rows = []
+        except (OSError, ValueError) as e:
+            logging.warning("Could not load title index from %s: %s", path, e)
+            rows = []
+        for title, page_url, score, last_played in rows[-MAX_TITLES:]:
+            norm = normalize(title)
+            if norm:
+                index._entries[page_url or norm] = {
+                    "title": title,
+                    "norm": norm,
+                    "page_url": page_url,
+                    "score": score,
+                    "last_played": last_played,
+                }
+        # One sort instead of an insort per key.
+        index._keys = sorted(
+            (" ".join(words[i:]), key)
+            for key, words in ((key, entry["norm"].split(" ")) for key, entry in index._entries.items())
+            for i in range(min(len(words), MAX_WORDS))
+        )
+        index.loaded = True
+        return index
+
+    # Folds in plays recorded while the file was still loading.
+    def absorb(self, other):
+        for key, entry in other._entries.items():
+            self._add(key, entry["title"], entry["norm"], entry["page_url"], entry["score"], entry["last_played"])
+        self.dirty = self.dirty or other.dirty
+
+
+# The temp name is unique per write, so concurrent writers never share a half-written file.
+def save_snapshot(path, rows):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
@@ -0,0 +1,205 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+
+TRACE_FILE = os.getenv("TRACE_FILE")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+FLUSH_INTERVAL = 5.0
+MAX_BUFFERED_SPANS = 100000
+
+_current = contextvars.ContextVar("eva_current_span", default=None)
+_exporter = None
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "attributes", "_token")
+
+    def __init__(self, name, trace_id, parent_id, attributes, start=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start = start or time.time_ns()
+        self.end = None
+        self.attributes = attributes
+        self._token = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def child(self, name, **attributes):
+        attributes["guild_id"] = self.attributes.get("guild_id")
+        attributes["request_id"] = self.attributes.get("request_id")
+        return Span(name, self.trace_id, self.span_id, attributes)
+
+    def finish(self, end=None):
+        self.end = end or time.time_ns()
+        _exporter.add(self)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        _current.reset(self._token)
+        self.finish()
+        return False
+
+
+class _NoopSpan:
+    def set(self, key, value):
+        pass
+
+    def child(self, name, **attributes):
+        return self
+
+    def finish(self, end=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class _UnsampledTrace(_NoopSpan):
+    def __enter__(self):
+        self._token = _current.set(NOOP_SPAN)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def start_trace(name, guild_id, request_id, **attributes):
+    if _exporter is None or random.random() >= TRACE_SAMPLE_RATE:
+        return _UnsampledTrace()
+    attributes["guild_id"] = str(guild_id)
+    attributes["request_id"] = str(request_id)
+    return Span(name, os.urandom(16).hex(), None, attributes)
+
+
+def span(name, **attributes):
+    parent = _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    return parent.child(name, **attributes)
+
+
+def span_or_trace(name, guild_id, request_id=None):
+    if _current.get() is None:
+        return start_trace(name, guild_id, request_id or os.urandom(8).hex())
+    return span(name)
+
+
+def trace_first_read(source, parent):
+    # Wraps only the first read(); later frames go straight to the source.
+    if not isinstance(parent, Span):
+        return
+    child = parent.child("audio.first_read")
+    original = source.read
+
+    def first_read():
+        del source.read
+        data = original()
+        child.set("bytes", len(data))
+        child.finish()
+        return data
+
+    source.read = first_read
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class FileExporter:
+    def __init__(self, path, interval=FLUSH_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.dropped = 0
+        self._spans = deque()
+        self._lock = threading.Lock()
+        self._resource = [
+            _attribute("service.name", "eva-music-bot"),
+            _attribute("process.pid", os.getpid()),
+        ]
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def add(self, span):
+        if len(self._spans) >= MAX_BUFFERED_SPANS:
+            self.dropped += 1
+            return
+        self._spans.append(span)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        spans = []
+        while self._spans:
+            spans.append(self._spans.popleft())
+        if not spans:
+            return
+
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": self._resource},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "eva_music_bot"},
+                            "spans": [
+                                {
+                                    "traceId": s.trace_id,
+                                    "spanId": s.span_id,
+                                    "parentSpanId": s.parent_id or "",
+                                    "name": s.name,
+                                    "kind": 1,
+                                    "startTimeUnixNano": str(s.start),
+                                    "endTimeUnixNano": str(s.end),
+                                    "attributes": [
+                                        _attribute(k, v) for k, v in s.attributes.items() if v is not None
+                                    ],
+                                    "status": {"code": 2 if "error" in s.attributes else 0},
+                                }
+                                for s in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(request, separators=(",", ":")) + "\n")
+        except OSError as e:
+            logging.warning("Could not write %d spans to %s: %s", len(spans), self.path, e)
+
+
+if TRACE_FILE:
+    _exporter = FileExporter(TRACE_FILE)
@@ -0,0 +1,138 @@
+import itertools
+import sys
+from array import array
+from collections import namedtuple
+
+
+Track = namedtuple("Track", ("url", "title", "page_url", "duration"))
+
+_ID_SIZE = 11
+_NO_ID = b"\0" * _ID_SIZE
+_COMPACT_AFTER = 1024
+# Shared by every queue, so a queue that replaces another never reuses its versions.
+_versions = itertools.count(1)
+
+
+def youtube_id(value):
+    if value and len(value) == _ID_SIZE and value.isascii():
+        return value
+    return None
+
+
+# Guild song queue. Entries live in flat arrays (fixed-width YouTube IDs, UTF-8
+# titles with end offsets, durations); only stream URLs that are already resolved
+# and non-YouTube page URLs are kept as Python strings, keyed by sequence number.
+# version changes on every mutation and is never shared with another queue, so views of
+# the queue can be cached against it.
+class TrackQueue:
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.version = next(_versions)
+        self._head = 0
+        self._base = 0
+        self._ids = bytearray()
+        self._titles = bytearray()
+        self._title_ends = array("I")
+        self._durations = array("I")
+        self._urls = {}
+        self._page_urls = {}
+        self.total_duration = 0
+
+    def __len__(self):
+        return len(self._durations) - self._head
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        for index in range(self._head, len(self._durations)):
+            yield self._entry(index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._entry(self._head + i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("queue index out of range")
+        return self._entry(self._head + index)
+
+    def append(self, url, title, page_url=None, duration=0):
+        seq = self._push(title, duration, page_url)
+        self._urls[seq] = url
+
+    def append_lazy(self, title, duration=0, page_url=None):
+        self._push(title, duration, page_url)
+
+    def popleft(self):
+        if not self:
+            raise IndexError("pop from an empty queue")
+        track = self._entry(self._head)
+        seq = self._base + self._head
+        self._urls.pop(seq, None)
+        self._page_urls.pop(seq, None)
+        self.total_duration -= track.duration
+        self._head += 1
+        self.version = next(_versions)
+
+        if not self:
+            self.clear()
+        elif self._head >= _COMPACT_AFTER and self._head * 2 >= len(self._durations):
+            self._compact()
+        return track
+
+    def _push(self, title, duration, page_url):
+        seq = self._base + len(self._durations)
+        video_id = None
+        if page_url and "youtube.com/watch?v=" in page_url:
+            video_id = youtube_id(page_url.rsplit("v=", 1)[1])
+        if video_id:
+            self._ids += video_id.encode("ascii")
+        else:
+            self._ids += _NO_ID
+            if page_url:
+                self._page_urls[seq] = page_url
+
+        self._titles += (title or "Untitled").encode("utf-8")
+        self._title_ends.append(len(self._titles))
+        duration = int(duration or 0)
+        self._durations.append(duration)
+        self.total_duration += duration
+        self.version = next(_versions)
+        return seq
+
+    def _entry(self, index):
+        seq = self._base + index
+        start = self._title_ends[index - 1] if index else 0
+        title = self._titles[start:self._title_ends[index]].decode("utf-8")
+
+        raw_id = self._ids[index * _ID_SIZE:(index + 1) * _ID_SIZE]
+        if raw_id != _NO_ID:
+            page_url = "https://www.youtube.com/watch?v=" + raw_id.decode("ascii")
+        else:
+            page_url = self._page_urls.get(seq)
+        return Track(self._urls.get(seq), title, page_url, self._durations[index])
+
+    def _compact(self):
+        head = self._head
+        title_start = self._title_ends[head - 1]
+        self._ids = self._ids[head * _ID_SIZE:]
+        self._titles = self._titles[title_start:]
+        self._title_ends = array("I", (end - title_start for end in self._title_ends[head:]))
+        self._durations = self._durations[head:]
+        self._base += head
+        self._head = 0
+
+    def nbytes(self):
+        return (
+            sys.getsizeof(self._ids)
+            + sys.getsizeof(self._titles)
+            + sys.getsizeof(self._title_ends)
+            + sys.getsizeof(self._durations)
+            + sys.getsizeof(self._urls)
+            + sum(sys.getsizeof(url) for url in self._urls.values())
+            + sys.getsizeof(self._page_urls)
+            + sum(sys.getsizeof(url) for url in self._page_urls.values())
+        )